@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Chess-LLM 題庫評測
+並行送出 EPD/FEN 測試局面，統計各模型的解題率、吞吐量、延遲與 token 用量
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from colorama import init, Fore, Style
+
+import chess
+
+from llm_inference import AsyncLLMInferenceCore, LLMInferenceCore, close_shared_async_client
+from local_backend import MOVE_POLICIES, create_local_client
+from latency import PERCENTILES, percentile
+import config
+
+# 初始化 colorama
+init()
+
+
+class BenchmarkPosition(NamedTuple):
+    """題庫中的單一測試局面"""
+    position_id: str
+    fen: str
+    best_moves: Tuple[str, ...]
+    avoid_moves: Tuple[str, ...]
+
+
+def parse_position_line(line: str, line_number: int) -> Optional[BenchmarkPosition]:
+    """
+    解析一行 EPD 或 FEN
+
+    支援 EPD（4 個欄位加上 bm / am / id 等操作碼），以及 6 個欄位的 FEN 後接相同的操作碼。
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    fields = line.split()
+    if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+        # 完整 FEN：去掉半回合與回合數後以 EPD 解析操作碼，再補回計數
+        board, operations = chess.Board.from_epd(" ".join(fields[:4] + fields[6:]))
+        board.halfmove_clock = int(fields[4])
+        board.fullmove_number = int(fields[5])
+    else:
+        board, operations = chess.Board.from_epd(line)
+
+    return BenchmarkPosition(
+        position_id=str(operations.get("id", f"line-{line_number}")),
+        fen=board.fen(),
+        best_moves=tuple(move.uci() for move in operations.get("bm", [])),
+        avoid_moves=tuple(move.uci() for move in operations.get("am", []))
+    )
+
+
+def load_positions(paths: List[str]) -> List[BenchmarkPosition]:
+    """讀取一或多個題庫檔案"""
+    positions = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                position = parse_position_line(line, line_number)
+                if position is not None:
+                    positions.append(position)
+    return positions
+
+
+def is_solved(position: BenchmarkPosition, move: Optional[str]) -> bool:
+    """移動符合最佳解（且不是應避免的移動）即為解題成功"""
+    if not move or move in position.avoid_moves:
+        return False
+    if position.best_moves:
+        return move in position.best_moves
+    return bool(position.avoid_moves)
+
+
+class Benchmark:
+    """題庫評測執行器"""
+
+    def __init__(self,
+                 positions: List[BenchmarkPosition],
+                 models: List[str],
+                 concurrency: int = config.BENCHMARK_CONCURRENCY,
+                 personality: str = config.WHITE_PERSONALITY,
+                 llm_core_factory: Optional[Callable[[], LLMInferenceCore]] = None):
+        """
+        Args:
+            positions: 測試局面
+            models: 要評測的模型
+            concurrency: 同時進行的最大請求數
+            personality: 提示詞使用的個性
+            llm_core_factory: 推理核心工廠，預設使用共用連線池的 AsyncLLMInferenceCore
+        """
+        self.positions = positions
+        self.models = models
+        self.concurrency = max(1, concurrency)
+        self.personality = personality
+        self.llm_core_factory = llm_core_factory or AsyncLLMInferenceCore
+        self.start_time = datetime.now()
+
+    async def _run_position(self,
+                            llm_core: LLMInferenceCore,
+                            model: str,
+                            position: BenchmarkPosition,
+                            semaphore: asyncio.Semaphore) -> dict:
+        """在並行上限內評測單一局面"""
+        async with semaphore:
+            board = chess.Board(position.fen)
+            legal_moves = [move.uci() for move in board.legal_moves]
+            position_analysis = {
+                "move_count": 0,
+                "status": "Check" if board.is_check() else "Active",
+                "is_check": board.is_check(),
+                "material_balance": 0
+            }
+            player_color = "White" if board.turn == chess.WHITE else "Black"
+
+            start = time.perf_counter()
+            if asyncio.iscoroutinefunction(llm_core.think_and_move):
+                move, _ = await llm_core.think_and_move(
+                    model, position.fen, legal_moves, [], player_color, self.personality, position_analysis
+                )
+            else:
+                move, _ = await asyncio.to_thread(
+                    llm_core.think_and_move,
+                    model, position.fen, legal_moves, [], player_color, self.personality, position_analysis
+                )
+            latency = time.perf_counter() - start
+
+            return {
+                "model": model,
+                "position_id": position.position_id,
+                "move": move,
+                "best_moves": list(position.best_moves),
+                "solved": is_solved(position, move),
+                "legal": move in legal_moves,
+                "latency": latency
+            }
+
+    async def _run_model(self, model: str) -> Tuple[dict, List[dict]]:
+        """評測單一模型的所有局面"""
+        llm_core = self.llm_core_factory()
+        llm_core.log_to_file = False
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            self._run_position(llm_core, model, position, semaphore) for position in self.positions
+        ))
+        elapsed = time.perf_counter() - start
+
+        thinking_logs = llm_core.get_thinking_logs()
+        return self._summarize_model(results, thinking_logs, elapsed), list(results)
+
+    @staticmethod
+    def _summarize_model(results: List[dict], thinking_logs: List[dict], elapsed: float) -> dict:
+        """彙整單一模型的評測結果"""
+        latencies = sorted(result["latency"] for result in results)
+        count = len(results)
+        solved = sum(result["solved"] for result in results)
+        return {
+            "positions": count,
+            "solved": solved,
+            "solve_rate": solved / count if count else 0.0,
+            "illegal_moves": sum(not result["legal"] for result in results),
+            "elapsed": elapsed,
+            "positions_per_sec": count / elapsed if elapsed else 0.0,
+            "latency": dict(
+                {f"p{pct}": percentile(latencies, pct) for pct in PERCENTILES},
+                mean=sum(latencies) / count if count else 0.0
+            ),
+            "tokens": {
+                "input": sum(log.get("input_tokens", 0) for log in thinking_logs),
+                "output": sum(log.get("output_tokens", 0) for log in thinking_logs),
+                "estimated": any(
+                    log.get("input_tokens_estimated") or log.get("output_tokens_estimated") for log in thinking_logs
+                )
+            },
+            "fallbacks": sum(1 for log in thinking_logs if log.get("fallback"))
+        }
+
+    async def run(self) -> dict:
+        """依序評測每個模型（同一模型內的局面並行送出）"""
+        models: Dict[str, dict] = {}
+        positions: List[dict] = []
+        try:
+            for model in self.models:
+                models[model], results = await self._run_model(model)
+                positions.extend(results)
+        finally:
+            await close_shared_async_client()
+
+        return {
+            "start_time": self.start_time.isoformat(),
+            "concurrency": self.concurrency,
+            "num_positions": len(self.positions),
+            "settings": {
+                "prompt_layout": config.PROMPT_LAYOUT,
+                "move_encoding": config.PROMPT_MOVE_ENCODING,
+                "temperature": config.LLM_TEMPERATURE,
+                "with_thinking": config.RESPONSE_WITH_THINKING
+            },
+            "models": models,
+            "positions": positions
+        }
+
+
+def print_summary(summary: dict):
+    """印出評測摘要"""
+    print(f"\n{Fore.CYAN}{'='*60}")
+    print(f"                題庫評測結束")
+    print(f"{'='*60}{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}局面數: {summary['num_positions']} (並行 {summary['concurrency']}){Style.RESET_ALL}")
+    for model, stats in summary["models"].items():
+        latency = stats["latency"]
+        tokens = stats["tokens"]
+        print(f"\n  {model}")
+        print(f"    解題率: {stats['solve_rate']:.1%} ({stats['solved']}/{stats['positions']})  "
+              f"非法移動: {stats['illegal_moves']}  回退: {stats['fallbacks']}")
+        print(f"    吞吐量: {stats['positions_per_sec']:.2f} 局面/秒  延遲: " + "  ".join(
+            f"p{pct} {latency[f'p{pct}']:.2f}s" for pct in PERCENTILES
+        ))
+        print(f"    Token: 輸入 {tokens['input']:,} / 輸出 {tokens['output']:,}"
+              f"{' (估計)' if tokens['estimated'] else ''}")
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 題庫評測")
+    parser.add_argument("suites", nargs="+", help="EPD/FEN 題庫檔案")
+    parser.add_argument("--models", nargs="+", default=[config.WHITE_MODEL], help="要評測的模型")
+    parser.add_argument("--concurrency", type=int, default=config.BENCHMARK_CONCURRENCY, help="同時進行的最大請求數")
+    parser.add_argument("--limit", type=int, default=None, help="只評測前 N 個局面")
+    parser.add_argument("--output", default=None, help="評測結果 JSON 檔案路徑")
+    parser.add_argument("--offline", action="store_true", help="使用本機替代後端，不需網路與 API 金鑰")
+    parser.add_argument("--policy", choices=sorted(MOVE_POLICIES), default="greedy", help="本機替代後端的移動策略")
+    parser.add_argument("--latency", type=float, default=0.0, help="本機替代後端的模擬延遲（秒）")
+    args = parser.parse_args()
+
+    llm_core_factory = None
+    if args.offline:
+        # 本機替代後端不支援串流回應
+        config.LLM_STREAMING = False
+        llm_core_factory = lambda: AsyncLLMInferenceCore(
+            client=create_local_client(args.policy, args.latency)
+        )
+    elif not config.OPENROUTER_API_KEY:
+        print(f"{Fore.RED}錯誤: 未設定 OPENROUTER_API_KEY 環境變數{Style.RESET_ALL}")
+        print("請在 .env 檔案中設定你的 OpenRouter API 金鑰，或使用 --offline 以本機替代後端執行")
+        exit(1)
+
+    positions = load_positions(args.suites)[:args.limit]
+    benchmark = Benchmark(positions, args.models, args.concurrency, llm_core_factory=llm_core_factory)
+
+    try:
+        summary = asyncio.run(benchmark.run())
+    except KeyboardInterrupt:
+        print(f"\n{Fore.YELLOW}評測被使用者中斷{Style.RESET_ALL}")
+        return
+
+    output = args.output or os.path.join(
+        config.BENCHMARK_OUTPUT_DIR, f"benchmark_{benchmark.start_time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print_summary(summary)
+    print(f"\n{Fore.GREEN}評測結果已保存: {output}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
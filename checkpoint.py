@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+對局檢查點
+每步以原子寫入保存對局狀態（棋步、思考記錄位置、設定與推理核心的亂數狀態），中斷後可從最後一步繼續
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+from chess_core import ChessCore
+import config
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+# 影響後續棋步的設定，繼續對局時還原
+CHECKPOINT_CONFIG_KEYS = (
+    "WHITE_MODEL", "BLACK_MODEL", "WHITE_PERSONALITY", "BLACK_PERSONALITY", "MAX_MOVES",
+    "LLM_TEMPERATURE", "LLM_STREAMING", "RESPONSE_WITH_THINKING", "PROMPT_LAYOUT", "PROMPT_MOVE_ENCODING",
+    "MOVE_REPAIR_ENABLED", "MOVE_REPAIR_REPROMPTS"
+)
+
+
+def atomic_write_json(path: str, data: dict, fsync: Optional[bool] = None):
+    """寫入暫存檔後以 os.replace 原子替換，中途當機時舊檔案仍完整（fsync 預設依設定）"""
+    if fsync is None:
+        fsync = config.CHECKPOINT_FSYNC
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if fsync:
+        # 同步目錄項目，確保替換本身已寫入磁碟
+        try:
+            dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+def encode_rng_state(state: tuple) -> list:
+    """將 random.Random.getstate() 轉為可存成 JSON 的格式"""
+    version, internal_state, gauss_next = state
+    return [version, list(internal_state), gauss_next]
+
+
+def decode_rng_state(data: list) -> tuple:
+    """還原 encode_rng_state 的結果"""
+    version, internal_state, gauss_next = data
+    return version, tuple(internal_state), gauss_next
+
+
+class GameCheckpointer:
+    """單盤對局的逐步檢查點"""
+
+    def __init__(self,
+                 path: str,
+                 game_id: Union[int, str],
+                 white_model: str,
+                 black_model: str,
+                 white_personality: str,
+                 black_personality: str,
+                 pgn_file: str,
+                 thinking_log_file: Optional[str] = None,
+                 text_log_file: Optional[str] = None,
+                 extra: Optional[dict] = None,
+                 started: Optional[str] = None):
+        """
+        Args:
+            path: 檢查點檔案路徑（以 .checkpoint.json 結尾）
+            game_id: 對局編號
+            pgn_file: 棋譜檔案
+            thinking_log_file: 思考記錄檔案
+            text_log_file: 文字日誌檔案
+            extra: 其他要一併保存的資訊（例如錦標賽的輸出目錄與總盤數）
+            started: 對局開始時間（ISO 格式，預設為現在），應與檔名中的時間一致
+        """
+        self.path = path
+        self.started = started or datetime.now().isoformat()
+        self.state = {
+            "version": CHECKPOINT_VERSION,
+            "game_id": game_id,
+            "white_model": white_model,
+            "black_model": black_model,
+            "white_personality": white_personality,
+            "black_personality": black_personality,
+            "pgn_file": pgn_file,
+            "thinking_log_file": thinking_log_file,
+            "text_log_file": text_log_file,
+            "extra": extra or {}
+        }
+
+    def save(self,
+             chess_core: ChessCore,
+             log_sink=None,
+             finished: bool = False,
+             game_result: Optional[dict] = None,
+             rng: Optional[random.Random] = None):
+        """
+        保存目前狀態（每步移動後呼叫）
+
+        Args:
+            chess_core: 對局的西洋棋核心
+            log_sink: 思考記錄串流，記錄寫入後保存各日誌檔案的位元組位置
+            finished: 對局是否已結束
+            game_result: 對局結束時的結果摘要
+            rng: 本盤推理核心的亂數產生器（回退移動等），其狀態一併保存
+        """
+        offsets: Dict[str, int] = {}
+        if log_sink is not None:
+            log_sink.flush()
+            for kind, path in (("jsonl", log_sink.jsonl_path), ("text", log_sink.text_log_path)):
+                if path and os.path.exists(path):
+                    offsets[kind] = os.path.getsize(path)
+
+        state = dict(
+            self.state,
+            started=self.started,
+            updated=datetime.now().isoformat(),
+            moves=[move.uci() for move in chess_core.move_history],
+            fen=chess_core.get_current_position(),
+            thinking_log_offsets=offsets,
+            config={key: getattr(config, key) for key in CHECKPOINT_CONFIG_KEYS},
+            rng_state=encode_rng_state(rng.getstate()) if rng is not None else None,
+            finished=finished,
+            game_result=game_result
+        )
+        atomic_write_json(self.path, state)
+
+    @classmethod
+    def from_state(cls, path: str, state: dict) -> "GameCheckpointer":
+        """由已載入的檢查點建立（繼續對局時沿用原本的檔案與開始時間）"""
+        return cls(
+            path, state["game_id"], state["white_model"], state["black_model"],
+            state["white_personality"], state["black_personality"], state["pgn_file"],
+            state.get("thinking_log_file"), state.get("text_log_file"), state.get("extra"), state.get("started")
+        )
+
+
+def load_checkpoint(path: str) -> dict:
+    """讀取檢查點"""
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"不支援的檢查點版本: {state.get('version')} ({path})")
+    state["path"] = path
+    return state
+
+
+def find_checkpoints(directory: str, unfinished_only: bool = False) -> List[dict]:
+    """遞迴尋找目錄中的檢查點，依對局編號排序"""
+    states = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*" + CHECKPOINT_SUFFIX), recursive=True)):
+        try:
+            state = load_checkpoint(path)
+        except (OSError, ValueError) as e:
+            print(f"略過無法讀取的檢查點 {path}: {e}")
+            continue
+        if not (unfinished_only and state["finished"]):
+            states.append(state)
+    return states
+
+
+def restore_chess(state: dict, pgn_stream_path: Optional[str] = None) -> ChessCore:
+    """重播檢查點中的棋步，重建 ChessCore（串流棋譜會一併重寫）"""
+    chess_core = ChessCore(pgn_stream_path=pgn_stream_path)
+    for move in state["moves"]:
+        if not chess_core.make_move(move):
+            raise ValueError(f"檢查點中的棋步不合法: {move} ({state.get('path')})")
+    return chess_core
+
+
+def log_truncation(state: Optional[dict], jsonl_path: str, text_log_path: Optional[str]) -> Optional[Dict[str, int]]:
+    """繼續對局時各日誌檔案應保留的位元組數（供 ThinkingLogSink 的 truncate_to 使用）"""
+    if not state:
+        return None
+    offsets = state.get("thinking_log_offsets", {})
+    paths = {"jsonl": jsonl_path, "text": text_log_path}
+    return {paths[kind]: offset for kind, offset in offsets.items() if paths.get(kind)}
+
+
+def apply_checkpoint_config(state: dict):
+    """還原檢查點保存的設定"""
+    for key, value in state["config"].items():
+        setattr(config, key, value)
+
+
+def restore_rng(state: dict, rng: Optional[random.Random]):
+    """將檢查點保存的亂數狀態還原到本盤的亂數產生器（各盤互不影響）"""
+    if rng is not None and state.get("rng_state"):
+        rng.setstate(decode_rng_state(state["rng_state"]))
+
+
+def main():
+    """主函數：列出目錄中的檢查點"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 對局檢查點")
+    parser.add_argument("directory", nargs="?", default=config.CHECKPOINT_DIR, help="檢查點目錄")
+    parser.add_argument("--unfinished", action="store_true", help="只列出未完成的對局")
+    args = parser.parse_args()
+
+    states = find_checkpoints(args.directory, args.unfinished)
+    for state in states:
+        status = "已完成" if state["finished"] else "未完成"
+        print(f"{state['game_id']}\t{status}\t{len(state['moves'])} 步\t"
+              f"{state['white_model']} vs {state['black_model']}\t{state['updated']}\t{state['path']}")
+    print(f"共 {len(states)} 個檢查點，{sum(not state['finished'] for state in states)} 盤未完成")
+
+
+if __name__ == "__main__":
+    main()
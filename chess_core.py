@@ -1,29 +1,144 @@
 import chess
-import chess.pgn
-from typing import List, Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime
 
+from pgn_writer import IncrementalPgnWriter
+import config
+
+# 棋子價值
+PIECE_VALUES = {
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 5,
+    chess.QUEEN: 9,
+    chess.KING: 0
+}
+
+
+class PositionSnapshot(NamedTuple):
+    """單一回合的局面快照，每步只計算一次，供所有使用者共用"""
+    fen: str
+    turn: str
+    move_count: int
+    legal_moves: Tuple[str, ...]
+    status: str
+    is_check: bool
+    is_game_over: bool
+    result: str
+    material_balance: int
+
 
 class ChessCore:
     """西洋棋核心類別，處理棋盤狀態、移動驗證和遊戲規則"""
     
-    def __init__(self):
+    def __init__(self,
+                 verify_material: bool = config.VERIFY_MATERIAL_COUNTS,
+                 pgn_stream_path: Optional[str] = None):
         self.board = chess.Board()
         self.move_history: List[chess.Move] = []
         self.game_start_time = datetime.now()
         self.current_turn = "White"
+        self._snapshot: Optional[PositionSnapshot] = None
+        
+        # 增量 PGN，每步附加一次，可選擇同步寫入磁碟
+        self.pgn = IncrementalPgnWriter({
+            "Event": "LLM Chess Battle",
+            "Site": "?",
+            "Date": self.game_start_time.strftime("%Y.%m.%d"),
+            "Round": "?",
+            "White": "LLM White",
+            "Black": "LLM Black",
+            "Result": "*"
+        }, stream_path=pgn_stream_path)
+        
+        # 各方各類棋子數量與材料總值，於 make_move 中增量更新
+        self.verify_material = verify_material
+        self.piece_counts: Dict[bool, List[int]] = self._count_pieces(self.board)
+        self.material: Dict[bool, int] = self._sum_material(self.piece_counts)
+        
+    def get_snapshot(self) -> PositionSnapshot:
+        """獲取當前局面快照，只在 make_move 後重新計算"""
+        if self._snapshot is None:
+            self._snapshot = self._build_snapshot()
+        return self._snapshot
+    
+    def _build_snapshot(self) -> PositionSnapshot:
+        """計算局面快照，合法移動只生成一次並共用於各項狀態判斷"""
+        board = self.board
+        legal_moves = tuple(move.uci() for move in board.legal_moves)
+        is_check = board.is_check()
+        is_checkmate = is_check and not legal_moves
+        is_stalemate = not is_check and not legal_moves
+        is_insufficient_material = board.is_insufficient_material()
         
+        # 狀態判斷順序與 get_game_status 原有規則一致
+        if is_checkmate:
+            status = "Checkmate"
+        elif is_stalemate:
+            status = "Stalemate"
+        elif is_check:
+            status = "Check"
+        elif is_insufficient_material:
+            status = "Insufficient material"
+        elif board.is_fifty_moves():
+            status = "Fifty-move rule"
+        elif board.is_repetition():
+            status = "Threefold repetition"
+        else:
+            status = "Active"
+        
+        # 與 board.is_game_over() 相同的判斷（不含可宣告的和棋）
+        is_game_over = (
+            not legal_moves
+            or is_insufficient_material
+            or board.is_seventyfive_moves()
+            or board.is_fivefold_repetition()
+        )
+        if is_checkmate:
+            result = "0-1" if board.turn == chess.WHITE else "1-0"
+        elif is_game_over:
+            result = "1/2-1/2"
+        else:
+            result = "*"
+        
+        return PositionSnapshot(
+            fen=board.fen(),
+            turn="White" if board.turn == chess.WHITE else "Black",
+            move_count=len(self.move_history),
+            legal_moves=legal_moves,
+            status=status,
+            is_check=is_check,
+            is_game_over=is_game_over,
+            result=result,
+            material_balance=self._calculate_material_balance()
+        )
+    
     def get_current_position(self) -> str:
         """獲取當前棋盤的 FEN 表示"""
-        return self.board.fen()
+        return self.get_snapshot().fen
     
     def get_board_ascii(self) -> str:
         """獲取棋盤的 ASCII 表示"""
         return str(self.board)
     
+    def copy(self) -> "ChessCore":
+        """複製目前的遊戲狀態（用於推測局面）"""
+        clone = ChessCore()
+        clone.board = self.board.copy()
+        clone.move_history = list(self.move_history)
+        clone.game_start_time = self.game_start_time
+        clone.current_turn = self.current_turn
+        clone._snapshot = self._snapshot
+        clone.pgn = self.pgn.copy()
+        clone.verify_material = self.verify_material
+        clone.piece_counts = {color: list(counts) for color, counts in self.piece_counts.items()}
+        clone.material = dict(self.material)
+        return clone
+    
     def get_legal_moves(self) -> List[str]:
         """獲取當前位置所有合法移動"""
-        return [move.uci() for move in self.board.legal_moves]
+        return list(self.get_snapshot().legal_moves)
     
     def make_move(self, move_uci: str) -> bool:
         """
@@ -37,10 +152,15 @@ class ChessCore:
         """
         try:
             move = chess.Move.from_uci(move_uci)
-            if move in self.board.legal_moves:
+            if self.board.is_legal(move):
+                self._update_material(move)
+                self.pgn.add_move(self.board, move)
                 self.board.push(move)
                 self.move_history.append(move)
+                self._snapshot = None
                 self.current_turn = "Black" if self.board.turn == chess.BLACK else "White"
+                if self.verify_material:
+                    self._verify_material()
                 return True
             else:
                 return False
@@ -49,14 +169,14 @@ class ChessCore:
     
     def is_game_over(self) -> bool:
         """檢查遊戲是否結束"""
-        return self.board.is_game_over()
+        return self.get_snapshot().is_game_over
     
     def get_game_result(self) -> str:
         """獲取遊戲結果"""
         if not self.is_game_over():
             return "Game in progress"
         
-        result = self.board.result()
+        result = self.get_snapshot().result
         if result == "1-0":
             return "White wins"
         elif result == "0-1":
@@ -66,20 +186,7 @@ class ChessCore:
     
     def get_game_status(self) -> str:
         """獲取當前遊戲狀態描述"""
-        if self.board.is_checkmate():
-            return "Checkmate"
-        elif self.board.is_stalemate():
-            return "Stalemate"
-        elif self.board.is_check():
-            return "Check"
-        elif self.board.is_insufficient_material():
-            return "Insufficient material"
-        elif self.board.is_fifty_moves():
-            return "Fifty-move rule"
-        elif self.board.is_repetition():
-            return "Threefold repetition"
-        else:
-            return "Active"
+        return self.get_snapshot().status
     
     def get_move_count(self) -> int:
         """獲取總移動數"""
@@ -91,54 +198,82 @@ class ChessCore:
     
     def export_pgn(self) -> str:
         """匯出 PGN 格式的遊戲記錄"""
-        game = chess.pgn.Game()
-        game.headers["Event"] = "LLM Chess Battle"
-        game.headers["Date"] = self.game_start_time.strftime("%Y.%m.%d")
-        game.headers["White"] = "LLM White"
-        game.headers["Black"] = "LLM Black"
-        game.headers["Result"] = self.board.result()
-        
-        # 建立移動樹
-        node = game
-        board = chess.Board()
-        for move in self.move_history:
-            node = node.add_variation(move)
-            board.push(move)
-        
-        return str(game)
+        return self.pgn.export(self.get_snapshot().result)
+    
+    def finalize_pgn(self) -> str:
+        """寫入最終結果並關閉 PGN 串流，回傳完整 PGN"""
+        return self.pgn.finalize(self.get_snapshot().result)
     
     def get_position_analysis(self) -> dict:
         """獲取當前位置的基本分析"""
+        snapshot = self.get_snapshot()
         return {
-            "turn": self.get_current_player(),
-            "move_count": self.get_move_count(),
-            "status": self.get_game_status(),
-            "legal_moves_count": len(list(self.board.legal_moves)),
-            "is_check": self.board.is_check(),
-            "material_balance": self._calculate_material_balance()
+            "turn": snapshot.turn,
+            "move_count": snapshot.move_count,
+            "status": snapshot.status,
+            "legal_moves_count": len(snapshot.legal_moves),
+            "is_check": snapshot.is_check,
+            "material_balance": snapshot.material_balance
+        }
+    
+    def get_piece_counts(self) -> Dict[str, Dict[str, int]]:
+        """獲取雙方各類棋子數量"""
+        return {
+            color_name: {
+                chess.piece_name(piece_type): self.piece_counts[color][piece_type]
+                for piece_type in chess.PIECE_TYPES
+            }
+            for color, color_name in ((chess.WHITE, "White"), (chess.BLACK, "Black"))
         }
     
     def _calculate_material_balance(self) -> int:
         """計算材料平衡（正數表示白棋優勢）"""
-        piece_values = {
-            chess.PAWN: 1,
-            chess.KNIGHT: 3,
-            chess.BISHOP: 3,
-            chess.ROOK: 5,
-            chess.QUEEN: 9,
-            chess.KING: 0
-        }
+        return self.material[chess.WHITE] - self.material[chess.BLACK]
+    
+    def _update_material(self, move: chess.Move):
+        """在移動執行前增量更新棋子數量與材料（處理吃子、吃過路兵與升變）"""
+        mover = self.board.turn
+        opponent = not mover
         
-        white_material = 0
-        black_material = 0
+        if self.board.is_en_passant(move):
+            captured_type = chess.PAWN
+        else:
+            captured = self.board.piece_at(move.to_square)
+            # 王車易位在部分表示法中以王吃己方車表示，需排除
+            captured_type = captured.piece_type if captured and captured.color == opponent else None
         
-        for square in chess.SQUARES:
-            piece = self.board.piece_at(square)
-            if piece:
-                value = piece_values[piece.piece_type]
-                if piece.color == chess.WHITE:
-                    white_material += value
-                else:
-                    black_material += value
+        if captured_type is not None:
+            self.piece_counts[opponent][captured_type] -= 1
+            self.material[opponent] -= PIECE_VALUES[captured_type]
         
-        return white_material - black_material
+        if move.promotion:
+            self.piece_counts[mover][chess.PAWN] -= 1
+            self.piece_counts[mover][move.promotion] += 1
+            self.material[mover] += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+    
+    def _verify_material(self):
+        """一致性檢查：比對增量計數與重新計算的結果"""
+        expected = self._count_pieces(self.board)
+        if expected != self.piece_counts or self._sum_material(expected) != self.material:
+            raise RuntimeError(
+                f"材料計數不一致: 增量 {self.piece_counts}, 實際 {expected} (FEN: {self.board.fen()})"
+            )
+    
+    @staticmethod
+    def _count_pieces(board: chess.Board) -> Dict[bool, List[int]]:
+        """以位元盤與 popcount 計算各方各類棋子數量（索引為棋子類型）"""
+        counts = {}
+        for color in chess.COLORS:
+            counts[color] = [0] + [
+                chess.popcount(board.pieces_mask(piece_type, color))
+                for piece_type in chess.PIECE_TYPES
+            ]
+        return counts
+    
+    @staticmethod
+    def _sum_material(piece_counts: Dict[bool, List[int]]) -> Dict[bool, int]:
+        """由棋子數量計算各方材料總值"""
+        return {
+            color: sum(PIECE_VALUES[piece_type] * counts[piece_type] for piece_type in chess.PIECE_TYPES)
+            for color, counts in piece_counts.items()
+        }
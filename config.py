@@ -1,11 +1,23 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+# OpenRouter API 設定（第一次讀取時才載入 .env，不需要 API 的程式不必匯入 python-dotenv）
+# OPENROUTER_API_KEY: API 金鑰
+# OPENROUTER_BASE_URL: API 位址，可指向 mock_server.py 做本機負載測試
+_ENV_SETTINGS = {
+    "OPENROUTER_API_KEY": None,
+    "OPENROUTER_BASE_URL": "https://openrouter.ai/api/v1"
+}
 
-# OpenRouter API 設定
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+def __getattr__(name):
+    if name not in _ENV_SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from dotenv import load_dotenv
+    load_dotenv()
+    for key, default in _ENV_SETTINGS.items():
+        # 已在程式中設定的值不覆寫
+        globals().setdefault(key, os.getenv(key, default))
+    return globals()[name]
 
 # 模型設定
 WHITE_MODEL = "anthropic/claude-3.5-haiku"  # white 
@@ -17,9 +29,109 @@ BLACK_PERSONALITY = "Defensive. Focus on counterattacks and solid positioning."
 
 # 遊戲設定
 MAX_MOVES = 200  # 最大回合數
+VERIFY_MATERIAL_COUNTS = False  # 每步比對增量材料計數與完整重算結果（測試用）
 THINKING_TIMEOUT = 30  # 思考超時時間（秒）
+LLM_TEMPERATURE = 0.7  # 取樣溫度
+LLM_STREAMING = False  # 串流接收回應，解析出合法 chosen_move 後立即中止
+STREAM_FINISH_IN_BACKGROUND = False  # 中止後是否在背景繼續接收剩餘內容並補齊思考記錄
+
+# 連線池設定（非同步推理核心）
+LLM_POOL_SIZE = 32  # 所有對局共用的最大連線數
+LLM_POOL_KEEPALIVE = 30.0  # 閒置連線保留時間（秒）
 
 # 日誌設定
 LOG_THINKING_PROCESS = True
 GAME_LOG_FILE = "game_log.txt"
-RESPONSE_WITH_THINKING = True  # 是否在回應中包含思考過程
\ No newline at end of file
+THINKING_LOG_STREAMING = True  # 以背景執行緒逐筆寫入 JSON Lines 思考記錄（False 時於對局結束後一次寫入同樣格式）
+THINKING_LOG_BUFFER_SIZE = 50  # 串流模式下記憶體中保留的最近記錄數
+THINKING_LOG_BATCH_SIZE = 64  # 背景寫入執行緒每批最多寫入的筆數
+THINKING_LOG_FSYNC = "batch"  # fsync 策略: "never"、"batch"（每批）或 "close"（對局結束時）
+RESPONSE_WITH_THINKING = True  # 是否在回應中包含思考過程
+PROMPT_LAYOUT = "legacy"  # 提示詞版面: "legacy"（原始版面）或 "lean"（靜態前綴在前，便於前綴快取）
+PROMPT_MOVE_ENCODING = "uci"  # lean 版面的合法移動編碼: "uci"、"grouped"（依起始格分組）或 "san"
+PGN_STREAM_ENABLED = True  # 每步移動即時寫入 PGN 檔案，程式中斷也不遺失棋譜
+PGN_STREAM_FSYNC = False  # 每步寫入後是否強制同步到磁碟
+
+# 顯示設定
+HEADLESS = False  # 無介面模式：每步之間不暫停，也不在終端顯示棋盤與思考過程
+RENDERER = "console"  # 進度顯示: "console"（完整顯示）、"progress"（節流的彙整進度）或 "none"
+RENDER_INTERVAL = 1.0  # progress 顯示的最短輸出間隔（秒）
+RENDER_QUEUE_SIZE = 1000  # 顯示事件佇列上限，progress 顯示在佇列滿時捨棄事件
+MOVE_DELAY = 0.1  # 非無介面模式下每步之間的暫停（秒），讓輸出更易讀
+
+# 用量與費用設定
+TOKEN_PRICES = {}  # 每百萬 token 的美元價格，例如 {"anthropic/claude-3.5-haiku": {"input": 0.8, "output": 4.0}}，"*" 為預設
+USAGE_BUDGET_USD = 0.0  # 累計費用上限，達到後對局於下一步前停止（0 表示不限制）
+USAGE_BUDGET_TOKENS = 0  # 累計 token 數上限（0 表示不限制）
+
+# 延遲量測設定
+LATENCY_METRICS_ENABLED = True  # 記錄推理與對局迴圈各階段的耗時（思考記錄、對局摘要與直方圖）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # 直方圖邊界（秒）
+LATENCY_PROMETHEUS_FILE = "output/metrics/chess_llm.prom"  # Prometheus 文字檔路徑（空字串表示不匯出）
+LATENCY_EXPORT_INTERVAL = 15.0  # 匯出間隔（秒）
+
+# 檢查點設定（中斷後繼續對局）
+CHECKPOINT_ENABLED = True  # 每步移動後以原子寫入保存對局狀態
+CHECKPOINT_DIR = "output/checkpoints"  # main.py 的檢查點目錄（錦標賽保存在輸出目錄的 checkpoints 子目錄）
+CHECKPOINT_FSYNC = True  # 檢查點寫入後是否強制同步到磁碟
+
+# 請求策略設定（重試與對沖）
+REQUEST_POLICY_ENABLED = True  # 由請求策略處理重試（停用時使用 OpenAI 客戶端內建的重試）
+REQUEST_MAX_RETRIES = 2  # 可重試錯誤（連線、逾時、429、5xx）的最多重試次數
+REQUEST_BACKOFF_BASE = 0.5  # 指數退避基準秒數（加上隨機抖動）
+REQUEST_BACKOFF_MAX = 8.0  # 單次退避上限秒數
+REQUEST_HEDGE_ENABLED = False  # 慢請求超過延遲門檻時送出對沖請求，取先回傳者
+REQUEST_HEDGE_QUANTILE = 90  # 對沖門檻使用的該模型延遲分位數
+REQUEST_HEDGE_MIN_DELAY = 1.0  # 對沖門檻下限（秒）
+REQUEST_HEDGE_DEFAULT_DELAY = 15.0  # 延遲樣本不足時的對沖門檻（秒）
+REQUEST_HEDGE_MIN_SAMPLES = 20  # 使用分位數前所需的延遲樣本數
+REQUEST_MAX_EXTRA_RATIO = 0.1  # 重試與對沖的額外請求數上限（相對主要請求數）
+REQUEST_EXTRA_BURST = 5  # 額外請求的固定額度
+
+# 速率限制設定（每個模型，所有對局共用）
+RATE_LIMIT_ENABLED = True  # 依每分鐘上限排隊送出請求，並依伺服器的速率限制標頭暫停
+RATE_LIMIT_RPM = 0  # 每個模型的每分鐘請求數上限（0 表示只依伺服器標頭調整）
+RATE_LIMIT_TPM = 0  # 每個模型的每分鐘 token 數上限（0 表示不限制）
+RATE_LIMIT_BURST = 0.05  # 可瞬間使用的額度佔每分鐘上限的比例
+RATE_LIMIT_DEFAULT_PAUSE = 1.0  # 429 回應沒有 retry-after 時暫停的秒數
+RATE_LIMIT_MODELS = {}  # 個別模型的上限，例如 {"openai/gpt-4o": {"rpm": 500, "tpm": 200000}}
+
+# 移動修復設定（非法或無法解析的移動）
+MOVE_REPAIR_ENABLED = True  # 先在本機修復（SAN/LAN/UCI 變體、掃描原始回應），再以簡短提示詞要求重新回答
+MOVE_REPAIR_REPROMPTS = 1  # 本機修復失敗時最多重新詢問的次數
+MOVE_REPAIR_MAX_TOKENS = 60  # 重新詢問的回應 token 上限
+
+# 回應快取設定
+RESPONSE_CACHE_ENABLED = False  # 是否啟用磁碟回應快取
+RESPONSE_CACHE_PATH = "output/cache/responses.sqlite3"  # 快取檔案路徑
+RESPONSE_CACHE_MAX_ENTRIES = 50000  # 快取保留的最大回應數（LRU 淘汰）
+RESPONSE_CACHE_SAMPLES = 3  # temperature > 0 時每個鍵累積的回應數，達到後從中抽樣
+
+# 批次推理設定（離線分析與題庫評測）
+BATCH_SIZE = 8  # 每次請求合併的局面數
+BATCH_MAX_TOKENS_PER_POSITION = 300  # 批次請求中每個局面的回應 token 上限
+
+# 題庫評測設定
+BENCHMARK_CONCURRENCY = 8  # 評測時同時進行的最大請求數
+BENCHMARK_OUTPUT_DIR = "output/benchmarks"  # 評測結果輸出目錄
+REPLAY_OUTPUT_DIR = "output/replays"  # 對局重播輸出目錄
+
+# 日誌分析設定
+LOG_ANALYTICS_DIR = "output/logs"  # 預設分析的思考記錄目錄（含子目錄）
+LOG_INDEX_PATH = "output/cache/log_index.sqlite3"  # 增量索引檔案路徑
+
+# 錦標賽設定
+TOURNAMENT_GAMES = 10  # 每組模型對戰的總盤數
+TOURNAMENT_CONCURRENCY = 4  # 同時進行的最大盤數
+TOURNAMENT_OUTPUT_DIR = "output/tournaments"  # 錦標賽輸出目錄
+
+# 多行程對局農場設定
+GAME_FARM_WORKERS = 0  # 工作行程數（0 表示使用 CPU 核心數）
+GAME_FARM_CONCURRENCY = 8  # 每個工作行程同時進行的盤數
+GAME_FARM_SHUTDOWN = "checkpoint"  # 中斷時: "finish"（下完進行中的對局）或 "checkpoint"（於下一步前中止並保存棋譜）
+GAME_FARM_START_METHOD = "spawn"  # 工作行程啟動方式（spawn 不繼承主行程的執行緒與連線）
+
+# 推測思考（pondering）設定
+PONDER_ENABLED = False  # 對手思考時預先計算己方對其可能回應的下一步
+PONDER_MAX_REPLIES = 2  # 每步推測的對手回應數
+PONDER_BUDGET = 40  # 每盤推測呼叫次數上限
@@ -4,12 +4,16 @@ Chess-LLM 示範模式
 不需要真實的 API 金鑰，使用模擬的 LLM 回應進行西洋棋對弈示範
 """
 
+import argparse
 import time
 import random
 from datetime import datetime
+from typing import Optional
 from colorama import init, Fore, Style
 
 from chess_core import ChessCore
+from renderer import Renderer, create_renderer
+import config
 
 # 初始化 colorama
 init()
@@ -18,8 +22,15 @@ init()
 class DemoLLMCore:
     """示範用的 LLM 核心，模擬 LLM 回應"""
     
-    def __init__(self):
+    def __init__(self, think_time: tuple = (1, 3), seed: Optional[int] = None):
+        """
+        Args:
+            think_time: 模擬思考時間的範圍（秒），(0, 0) 表示不等待
+            seed: 移動選擇的亂數種子（每個核心使用自己的亂數產生器）
+        """
         self.thinking_logs = []
+        self.think_time = think_time
+        self.rng = random.Random(seed)
         
         # 預設的開局移動
         self.white_opening_moves = ["e2e4", "d2d4", "g1f3", "c2c4"]
@@ -32,7 +43,8 @@ class DemoLLMCore:
         thinking_start = datetime.now()
         
         # 模擬思考時間
-        time.sleep(random.uniform(1, 3))
+        if self.think_time[1] > 0:
+            time.sleep(self.rng.uniform(*self.think_time))
         
         # 選擇移動策略
         if len(move_history) < 6:  # 開局階段
@@ -70,9 +82,9 @@ class DemoLLMCore:
             preferred = [move for move in self.black_opening_moves if move in legal_moves]
         
         if preferred:
-            return random.choice(preferred)
+            return self.rng.choice(preferred)
         else:
-            return random.choice(legal_moves)
+            return self.rng.choice(legal_moves)
     
     def _choose_strategic_move(self, legal_moves, position_analysis):
         """選擇戰略性移動"""
@@ -80,16 +92,16 @@ class DemoLLMCore:
         # 優先考慮吃子、將軍等
         
         # 這裡可以添加更複雜的邏輯，但為了示範，我們隨機選擇
-        return random.choice(legal_moves)
+        return self.rng.choice(legal_moves)
     
     def _generate_thinking_process(self, chosen_move, legal_moves, position_analysis, player_color):
         """生成模擬的思考過程"""
         
         thinking_templates = [
-            f"局面分析: 當前是{player_color}的回合，棋盤上的局勢看起來{'有利' if random.choice([True, False]) else '需要謹慎'}。",
-            f"候選移動考慮:\n  - {chosen_move}: 這個移動可以{'改善棋子位置' if random.choice([True, False]) else '控制關鍵格子'}",
-            f"  - {random.choice(legal_moves)}: 另一個選擇，但{'風險較高' if random.choice([True, False]) else '效果不如第一選擇'}",
-            f"最終選擇理由: 選擇 {chosen_move} 是因為它能夠{'鞏固陣地' if random.choice([True, False]) else '增加攻擊機會'}，符合當前的戰略目標。"
+            f"局面分析: 當前是{player_color}的回合，棋盤上的局勢看起來{'有利' if self.rng.choice([True, False]) else '需要謹慎'}。",
+            f"候選移動考慮:\n  - {chosen_move}: 這個移動可以{'改善棋子位置' if self.rng.choice([True, False]) else '控制關鍵格子'}",
+            f"  - {self.rng.choice(legal_moves)}: 另一個選擇，但{'風險較高' if self.rng.choice([True, False]) else '效果不如第一選擇'}",
+            f"最終選擇理由: 選擇 {chosen_move} 是因為它能夠{'鞏固陣地' if self.rng.choice([True, False]) else '增加攻擊機會'}，符合當前的戰略目標。"
         ]
         
         # 根據局面添加特殊考量
@@ -111,54 +123,72 @@ class DemoLLMCore:
 class ChessLLMDemo:
     """西洋棋 LLM 對弈示範系統"""
     
-    def __init__(self):
+    def __init__(self,
+                 headless: Optional[bool] = None,
+                 renderer: Optional[Renderer] = None,
+                 renderer_kind: Optional[str] = None):
+        """
+        可作為 context manager 使用，結束時關閉自行建立的顯示器（見 close）
+
+        Args:
+            headless: 無介面模式（不模擬思考時間、每步之間不暫停、不顯示棋盤），預設依設定
+            renderer: 接收對局事件的顯示器（由呼叫端關閉），預設自行建立
+            renderer_kind: 自行建立顯示器時的顯示方式，預設依設定
+        """
+        self.headless = config.HEADLESS if headless is None else headless
         self.chess = ChessCore()
-        self.llm_core = DemoLLMCore()
+        self.llm_core = DemoLLMCore(think_time=(0, 0) if self.headless else (1, 3))
         self.game_start_time = datetime.now()
+        self.move_delay = 0.0 if self.headless else 0.5
+        self._owns_renderer = renderer is None
+        self.renderer = renderer if renderer is not None else create_renderer(renderer_kind, self.headless)
         
         # 示範用的模型名稱
         self.white_model = "Demo-GPT-White"
         self.black_model = "Demo-Claude-Black"
     
+    def __enter__(self) -> "ChessLLMDemo":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """顯示完剩餘事件後關閉自行建立的顯示器（呼叫端傳入的顯示器不關閉）"""
+        if self._owns_renderer and self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+    
+    def emit(self, kind: str, **data):
+        """送出對局事件給顯示器"""
+        if self.renderer is not None:
+            self.renderer.emit("demo", kind, **data)
+    
+    @property
+    def verbose(self) -> bool:
+        """顯示器是否需要逐步的棋盤與思考過程"""
+        return self.renderer is not None and self.renderer.verbose
+    
     def print_header(self):
         """印出遊戲標題"""
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print(f"           西洋棋 LLM 對弈示範系統")
-        print(f"             (模擬模式 - 無需 API 金鑰)")
-        print(f"{'='*60}{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}白棋模型: {self.white_model}")
-        print(f"黑棋模型: {self.black_model}")
-        print(f"遊戲開始時間: {self.game_start_time.strftime('%Y-%m-%d %H:%M:%S')}{Style.RESET_ALL}")
-        print()
+        self.emit("start", title="西洋棋 LLM 對弈示範系統", subtitle="(模擬模式 - 無需 API 金鑰)",
+                  white_model=self.white_model, black_model=self.black_model, start_time=self.game_start_time)
     
     def print_board(self):
         """印出當前棋盤"""
-        print(f"\n{Fore.GREEN}當前棋盤:{Style.RESET_ALL}")
-        print(self.chess.get_board_ascii())
-        
-        analysis = self.chess.get_position_analysis()
-        print(f"\n{Fore.BLUE}局面資訊:{Style.RESET_ALL}")
-        print(f"  輪到: {analysis['turn']}")
-        print(f"  移動次數: {analysis['move_count']}")
-        print(f"  狀態: {analysis['status']}")
-        print(f"  材料平衡: {analysis['material_balance']}")
-        if analysis['is_check']:
-            print(f"  {Fore.RED}將軍!{Style.RESET_ALL}")
-        print()
+        if self.verbose:
+            self.emit("board", ascii=self.chess.get_board_ascii(), analysis=self.chess.get_position_analysis())
     
     def play_turn(self, player_color, model_name):
         """執行一回合"""
-        print(f"{Fore.MAGENTA}{'='*40}")
-        print(f"  {player_color} 的回合 ({model_name})")
-        print(f"{'='*40}{Style.RESET_ALL}")
+        if self.verbose:
+            self.emit("turn", player=player_color, model=model_name)
         
         # 獲取當前遊戲狀態
         board_state = self.chess.get_current_position()
         legal_moves = self.chess.get_legal_moves()
         position_analysis = self.chess.get_position_analysis()
         
-        print(f"{Fore.YELLOW}正在思考...{Style.RESET_ALL}")
-        
         # 模擬 LLM 思考
         move, thinking_process = self.llm_core.think_and_move(
             model_name=model_name,
@@ -170,17 +200,15 @@ class ChessLLMDemo:
         )
         
         # 顯示思考過程
-        if thinking_process:
-            print(f"\n{Fore.CYAN}思考過程:{Style.RESET_ALL}")
-            print(thinking_process)
-            print()
+        if thinking_process and self.verbose:
+            self.emit("thinking", text=thinking_process)
         
         # 執行移動
         if move and self.chess.make_move(move):
-            print(f"{Fore.GREEN}✓ {player_color} 移動: {move}{Style.RESET_ALL}")
+            self.emit("move", player=player_color, move=move, ply=self.chess.get_move_count())
             return True
         else:
-            print(f"{Fore.RED}✗ 移動失敗: {move}{Style.RESET_ALL}")
+            self.emit("invalid", player=player_color, move=move, legal_moves=legal_moves)
             return False
     
     def run_demo(self, max_moves=20):
@@ -200,13 +228,14 @@ class ChessLLMDemo:
                 success = self.play_turn("Black", self.black_model)
             
             if not success:
-                print(f"{Fore.RED}移動失敗，示範結束{Style.RESET_ALL}")
+                self.emit("message", color=Fore.RED, text="移動失敗，示範結束")
                 break
             
             move_count += 1
             
-            # 暫停讓使用者觀看
-            time.sleep(0.5)
+            # 暫停讓使用者觀看（無介面模式不暫停）
+            if self.move_delay:
+                time.sleep(self.move_delay)
         
         # 示範結束
         self.print_game_result()
@@ -215,33 +244,30 @@ class ChessLLMDemo:
         """印出遊戲結果"""
         self.print_board()
         
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print(f"                示範結束")
-        print(f"{'='*60}{Style.RESET_ALL}")
-        
         if self.chess.is_game_over():
             result = self.chess.get_game_result()
             status = self.chess.get_game_status()
-            print(f"{Fore.YELLOW}結果: {result}")
-            print(f"狀態: {status}")
         else:
-            print(f"{Fore.YELLOW}示範已完成 (遊戲未結束)")
+            result = "*"
+            status = "示範已完成 (遊戲未結束)"
         
-        print(f"總移動數: {self.chess.get_move_count()}")
-        
-        game_duration = datetime.now() - self.game_start_time
-        print(f"示範時長: {game_duration}{Style.RESET_ALL}")
-        
-        # 顯示 PGN
-        print(f"\n{Fore.GREEN}PGN 記錄:{Style.RESET_ALL}")
-        print(self.chess.export_pgn())
+        self.emit("end", title="示範結束", result=result, status=status, move_count=self.chess.get_move_count(),
+                  duration=datetime.now() - self.game_start_time, pgn=self.chess.export_pgn() if self.verbose else None)
 
 
 def main():
     """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 示範模式")
+    parser.add_argument("--headless", action="store_true", default=config.HEADLESS,
+                        help="無介面模式：不模擬思考時間、每步之間不暫停、不顯示棋盤")
+    parser.add_argument("--renderer", choices=["console", "progress", "none"], default=None,
+                        help="進度顯示方式（預設依設定，無介面模式下不使用 console）")
+    parser.add_argument("--moves", type=int, default=20, help="示範的步數")
+    args = parser.parse_args()
+
     try:
-        demo = ChessLLMDemo()
-        demo.run_demo()
+        with ChessLLMDemo(headless=args.headless, renderer_kind=args.renderer) as demo:
+            demo.run_demo(args.moves)
         
         print(f"\n{Fore.CYAN}示範完成！{Style.RESET_ALL}")
         print("要使用真實的 LLM 模型，請：")
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Chess-LLM 多行程對局農場
+將對局分散到多個工作行程，每個行程以自己的事件迴圈同時進行多盤對局，
+結果即時回傳主行程，由主行程寫入合併的棋譜與思考記錄
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import signal
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from colorama import init, Fore, Style
+
+from latency import get_latency_histograms
+from llm_inference import AsyncLLMInferenceCore, close_shared_async_client
+from local_backend import MOVE_POLICIES, create_local_client
+from move_repair import get_repair_stats
+from rate_limiter import get_default_rate_limiter
+from response_cache import get_default_response_cache
+from tournament import Tournament, print_summary
+from usage import UsageTracker, budget_exceeded
+import config
+
+# 初始化 colorama
+init()
+
+SHUTDOWN_MODES = ("finish", "checkpoint")
+
+
+def _raise_interrupt(signum, frame):
+    """SIGTERM 比照 Ctrl+C 收尾"""
+    raise KeyboardInterrupt
+
+
+def _config_snapshot() -> dict:
+    """主行程目前的設定（含命令列覆寫），傳給以 spawn 啟動的工作行程"""
+    return {name: value for name, value in vars(config).items() if name.isupper()}
+
+
+def _apply_worker_config(settings: dict, workers: int):
+    """套用主行程設定；每個行程各有速率限制器，額度由所有工作行程平分"""
+    for name, value in settings.items():
+        setattr(config, name, value)
+    config.RATE_LIMIT_RPM = settings["RATE_LIMIT_RPM"] / workers
+    config.RATE_LIMIT_TPM = settings["RATE_LIMIT_TPM"] / workers
+    config.RATE_LIMIT_MODELS = {
+        model: {kind: limit / workers for kind, limit in limits.items()}
+        for model, limits in settings["RATE_LIMIT_MODELS"].items()
+    }
+    # 用量預算由主行程依所有工作行程回傳的結果檢查
+    config.USAGE_BUDGET_USD = 0.0
+    config.USAGE_BUDGET_TOKENS = 0
+
+
+def _worker_stats(worker_id: int, games: int) -> dict:
+    """工作行程結束時回傳的統計"""
+    response_cache = get_default_response_cache()
+    rate_limiter = get_default_rate_limiter()
+    return {
+        "worker_id": worker_id,
+        "pid": os.getpid(),
+        "games": games,
+        "move_repairs": get_repair_stats().get_stats(),
+        "rate_limit": rate_limiter.get_stats() if rate_limiter else None,
+        "response_cache": response_cache.get_stats() if response_cache else None,
+        "latency": get_latency_histograms().get_stats()
+    }
+
+
+async def _run_worker(worker_id: int, options: dict, tasks, results, stop_event) -> int:
+    """在工作行程的事件迴圈中同時進行多盤對局，每盤結束即回傳結果"""
+    concurrency = options["concurrency"]
+    if options["offline_policy"]:
+        llm_core_factory = lambda: AsyncLLMInferenceCore(
+            client=create_local_client(options["offline_policy"], options["offline_latency"])
+        )
+    else:
+        llm_core_factory = None
+
+    # 主行程結束時（例如被強制終止）視同收到停止要求，不留下孤兒行程
+    parent = multiprocessing.parent_process()
+    stopping = lambda: stop_event.is_set() or (parent is not None and not parent.is_alive())
+    # checkpoint 模式下進行中的對局於下一步前中止；finish 模式只停止領取新對局
+    should_stop = stopping if options["shutdown"] == "checkpoint" else None
+    tournament = Tournament(
+        num_games=options["num_games"],
+        concurrency=concurrency,
+        white_model=options["white_model"],
+        black_model=options["black_model"],
+        alternate_colors=options["alternate_colors"],
+        output_dir=options["output_dir"],
+        llm_core_factory=llm_core_factory,
+        max_moves=options["max_moves"],
+        pool_size=options["pool_size"],
+        ponder=options["ponder"],
+        should_stop=should_stop
+    )
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency + 1)
+    loop.set_default_executor(executor)
+    semaphore = asyncio.Semaphore(concurrency)
+    played = 0
+
+    async def slot():
+        nonlocal played
+        while not stopping():
+            game_id = await loop.run_in_executor(None, tasks.get)
+            if game_id is None:
+                break
+            result = await tournament._run_game(game_id, semaphore)
+            with open(result["pgn_file"], encoding="utf-8") as f:
+                result["pgn"] = f.read()
+            results.put(("result", worker_id, result))
+            played += 1
+
+    try:
+        await asyncio.gather(*(slot() for _ in range(concurrency)))
+    finally:
+        executor.shutdown(wait=False)
+        await close_shared_async_client()
+    return played
+
+
+def _worker_main(worker_id: int, settings: dict, options: dict, tasks, results, stop_event):
+    """工作行程進入點"""
+    # 中斷由主行程統一處理（設定 stop_event），工作行程忽略 Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _apply_worker_config(settings, options["workers"])
+
+    played = 0
+    try:
+        played = asyncio.run(_run_worker(worker_id, options, tasks, results, stop_event))
+    except Exception as e:
+        results.put(("error", worker_id, f"工作行程 {worker_id} 發生錯誤: {e}"))
+    results.put(("done", worker_id, _worker_stats(worker_id, played)))
+
+
+class GameFarm:
+    """多行程對局農場，工作行程從共用佇列領取對局，主行程彙整結果"""
+
+    def __init__(self,
+                 num_games: int = config.TOURNAMENT_GAMES,
+                 workers: int = config.GAME_FARM_WORKERS,
+                 concurrency: int = config.GAME_FARM_CONCURRENCY,
+                 white_model: str = config.WHITE_MODEL,
+                 black_model: str = config.BLACK_MODEL,
+                 alternate_colors: bool = False,
+                 output_dir: Optional[str] = None,
+                 max_moves: int = config.MAX_MOVES,
+                 pool_size: int = config.LLM_POOL_SIZE,
+                 ponder: bool = config.PONDER_ENABLED,
+                 shutdown: str = config.GAME_FARM_SHUTDOWN,
+                 offline_policy: Optional[str] = None,
+                 offline_latency: float = 0.0):
+        """
+        Args:
+            num_games: 對局總數
+            workers: 工作行程數（0 表示使用 CPU 核心數）
+            concurrency: 每個工作行程同時進行的盤數
+            shutdown: 中斷時的處理方式，"finish" 或 "checkpoint"
+            offline_policy: 使用本機替代後端時的移動策略（None 表示呼叫 API）
+            offline_latency: 本機替代後端的模擬延遲（秒）
+            其餘參數同 Tournament
+        """
+        if shutdown not in SHUTDOWN_MODES:
+            raise ValueError(f"未知的中斷處理方式: {shutdown}")
+        self.num_games = num_games
+        self.workers = max(1, min(workers or os.cpu_count() or 1, num_games or 1))
+        self.concurrency = max(1, concurrency)
+        self.start_time = datetime.now()
+        if output_dir is None:
+            output_dir = os.path.join(config.TOURNAMENT_OUTPUT_DIR, "farm_" + self.start_time.strftime("%Y%m%d_%H%M%S"))
+        self.output_dir = output_dir
+        self.options = {
+            "num_games": num_games,
+            "workers": self.workers,
+            "concurrency": self.concurrency,
+            "white_model": white_model,
+            "black_model": black_model,
+            "alternate_colors": alternate_colors,
+            "output_dir": output_dir,
+            "max_moves": max_moves,
+            "pool_size": pool_size,
+            "ponder": ponder,
+            "shutdown": shutdown,
+            "offline_policy": offline_policy,
+            "offline_latency": offline_latency
+        }
+        self.results: List[dict] = []
+        self.worker_stats: List[dict] = []
+        self.errors: List[str] = []
+        self.usage = UsageTracker()
+        self.budget_stop: Optional[str] = None
+
+    def _collect(self, result: dict, pgn_file, log_file):
+        """寫入合併的棋譜與思考記錄"""
+        pgn_file.write(result.pop("pgn").rstrip() + "\n\n")
+        pgn_file.flush()
+
+        thinking_filename = result["thinking_log_file"]
+        if os.path.exists(thinking_filename):
+            with open(thinking_filename, encoding="utf-8") as f:
+                if thinking_filename.endswith(".jsonl"):
+                    log_file.writelines(line if line.endswith("\n") else line + "\n" for line in f if line.strip())
+                else:
+                    for thinking_log in json.load(f):
+                        log_file.write(json.dumps(thinking_log, ensure_ascii=False) + "\n")
+            log_file.flush()
+
+        self.results.append(result)
+        print(f"{Fore.CYAN}[{len(self.results)}/{self.num_games}] 第 {result['game_id']} 盤 -> {result['result']}"
+              f"{' (已中斷)' if result.get('interrupted') else ''}{Style.RESET_ALL}")
+
+    def run(self) -> dict:
+        """啟動工作行程並彙整結果；第一次 Ctrl+C 依 shutdown 設定收尾，第二次強制結束"""
+        os.makedirs(os.path.join(self.output_dir, "pgn"), exist_ok=True)
+        os.makedirs(os.path.join(self.output_dir, "logs"), exist_ok=True)
+        # 與錦標賽相同的參數檔，中斷後可用 tournament.py --resume 繼續
+        Tournament(
+            num_games=self.num_games,
+            white_model=self.options["white_model"],
+            black_model=self.options["black_model"],
+            alternate_colors=self.options["alternate_colors"],
+            output_dir=self.output_dir,
+            max_moves=self.options["max_moves"],
+            ponder=self.options["ponder"]
+        )._write_metadata()
+
+        context = multiprocessing.get_context(config.GAME_FARM_START_METHOD)
+        tasks, results, stop_event = context.Queue(), context.Queue(), context.Event()
+        for game_id in range(self.num_games):
+            tasks.put(game_id)
+        for _ in range(self.workers * self.concurrency):
+            tasks.put(None)
+
+        settings = _config_snapshot()
+        processes = [
+            context.Process(target=_worker_main, args=(worker_id, settings, self.options, tasks, results, stop_event),
+                            name=f"game-farm-{worker_id}")
+            for worker_id in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+
+        running = set(range(self.workers))
+        interrupts = 0
+        with open(os.path.join(self.output_dir, "games.pgn"), "w", encoding="utf-8") as pgn_file, \
+                open(os.path.join(self.output_dir, "combined_thinking_logs.jsonl"), "w", encoding="utf-8") as log_file:
+            while running:
+                try:
+                    kind, worker_id, payload = results.get(timeout=0.5)
+                except queue.Empty:
+                    # 工作行程結束前會送出 done；已結束卻沒有送出表示行程異常終止
+                    for worker_id in list(running):
+                        if not processes[worker_id].is_alive():
+                            running.discard(worker_id)
+                            self.errors.append(f"工作行程 {worker_id} 異常結束 (exit code {processes[worker_id].exitcode})")
+                    continue
+                except KeyboardInterrupt:
+                    interrupts += 1
+                    stop_event.set()
+                    if interrupts == 1:
+                        print(f"\n{Fore.YELLOW}收到中斷，停止新對局並以 {self.options['shutdown']} 模式收尾"
+                              f"（再按一次強制結束）{Style.RESET_ALL}")
+                        continue
+                    for process in processes:
+                        process.terminate()
+                    break
+
+                if kind == "result":
+                    self._collect(payload, pgn_file, log_file)
+                    # 達到用量預算時依 shutdown 設定停止（與 Ctrl+C 相同）
+                    self.usage.merge(payload.get("usage"))
+                    if self.budget_stop is None:
+                        self.budget_stop = budget_exceeded(self.usage.totals())
+                        if self.budget_stop:
+                            stop_event.set()
+                            print(f"{Fore.YELLOW}{self.budget_stop}，停止新對局並以 {self.options['shutdown']} "
+                                  f"模式收尾{Style.RESET_ALL}")
+                elif kind == "error":
+                    self.errors.append(payload)
+                    print(f"{Fore.RED}{payload}{Style.RESET_ALL}")
+                elif kind == "done":
+                    self.worker_stats.append(payload)
+                    running.discard(worker_id)
+
+        for process in processes:
+            process.join()
+
+        summary = self.build_summary(interrupted=stop_event.is_set())
+        with open(os.path.join(self.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+    def build_summary(self, interrupted: bool = False) -> dict:
+        """以錦標賽摘要格式彙整，統計改為合併各工作行程的數值"""
+        tournament = Tournament(
+            num_games=self.num_games,
+            concurrency=self.workers * self.concurrency,
+            white_model=self.options["white_model"],
+            black_model=self.options["black_model"],
+            output_dir=self.output_dir
+        )
+        tournament.start_time = self.start_time
+        tournament.results = sorted(self.results, key=lambda result: result["game_id"])
+        summary = tournament.build_summary()
+
+        move_repairs: Dict[str, Counter] = {}
+        for stats in self.worker_stats:
+            for model, repairs in stats["move_repairs"].items():
+                move_repairs.setdefault(model, Counter()).update(repairs)
+        summary.update(
+            workers=self.workers,
+            concurrency_per_worker=self.concurrency,
+            completed_games=len(self.results),
+            interrupted=interrupted,
+            budget_stop=self.budget_stop,
+            errors=self.errors,
+            # 快取、速率限制與延遲直方圖屬於各工作行程，分別列於 worker_stats（每盤的延遲列於 games）
+            response_cache=None,
+            rate_limit=None,
+            latency=None,
+            move_repairs={model: dict(counts) for model, counts in move_repairs.items()},
+            worker_stats=sorted(self.worker_stats, key=lambda stats: stats["worker_id"])
+        )
+        return summary
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 多行程對局農場")
+    parser.add_argument("--games", type=int, default=config.TOURNAMENT_GAMES, help="對局總數")
+    parser.add_argument("--workers", type=int, default=config.GAME_FARM_WORKERS, help="工作行程數（0 表示 CPU 核心數）")
+    parser.add_argument("--concurrency", type=int, default=config.GAME_FARM_CONCURRENCY, help="每個工作行程同時進行的盤數")
+    parser.add_argument("--white", default=config.WHITE_MODEL, help="白棋模型")
+    parser.add_argument("--black", default=config.BLACK_MODEL, help="黑棋模型")
+    parser.add_argument("--alternate-colors", action="store_true", help="每盤交換黑白方")
+    parser.add_argument("--output-dir", default=None, help="輸出目錄")
+    parser.add_argument("--max-moves", type=int, default=config.MAX_MOVES, help="每盤最大步數")
+    parser.add_argument("--shutdown", choices=SHUTDOWN_MODES, default=config.GAME_FARM_SHUTDOWN,
+                        help="中斷時下完進行中的對局 (finish) 或於下一步前中止並保存棋譜 (checkpoint)")
+    parser.add_argument("--offline", action="store_true", help="使用本機替代後端，不需網路與 API 金鑰")
+    parser.add_argument("--policy", choices=sorted(MOVE_POLICIES), default="random", help="本機替代後端的移動策略")
+    parser.add_argument("--latency", type=float, default=0.0, help="本機替代後端的模擬延遲（秒）")
+    parser.add_argument("--budget-usd", type=float, default=config.USAGE_BUDGET_USD,
+                        help="累計費用上限（美元，依 TOKEN_PRICES 或 API 回報的費用），達到後停止（0 表示不限制）")
+    parser.add_argument("--budget-tokens", type=int, default=config.USAGE_BUDGET_TOKENS,
+                        help="累計 token 數上限，達到後停止（0 表示不限制）")
+    args = parser.parse_args()
+    config.USAGE_BUDGET_USD = args.budget_usd
+    config.USAGE_BUDGET_TOKENS = args.budget_tokens
+
+    if args.offline:
+        # 本機替代後端不支援串流回應
+        config.LLM_STREAMING = False
+    elif not config.OPENROUTER_API_KEY:
+        print(f"{Fore.RED}錯誤: 未設定 OPENROUTER_API_KEY 環境變數{Style.RESET_ALL}")
+        print("請在 .env 檔案中設定你的 OpenRouter API 金鑰，或使用 --offline 以本機替代後端執行")
+        exit(1)
+
+    farm = GameFarm(
+        num_games=args.games,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        white_model=args.white,
+        black_model=args.black,
+        alternate_colors=args.alternate_colors,
+        output_dir=args.output_dir,
+        max_moves=args.max_moves,
+        shutdown=args.shutdown,
+        offline_policy=args.policy if args.offline else None,
+        offline_latency=args.latency
+    )
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    summary = farm.run()
+    print_summary(summary)
+    print(f"{Fore.YELLOW}工作行程: {summary['workers']} x {summary['concurrency_per_worker']} 盤，"
+          f"完成 {summary['completed_games']}/{summary['num_games']} 盤{Style.RESET_ALL}")
+    print(f"\n{Fore.GREEN}合併棋譜與摘要已保存: {farm.output_dir}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+各階段延遲量測
+在推理與對局迴圈的熱路徑上以具名區段（span）計時，彙整為每個模型、每個階段的直方圖，
+並可定期匯出為 Prometheus 文字檔（node_exporter textfile collector 格式）
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config
+
+# 推理核心的階段
+#   prompt: 建構提示詞        cache: 計算快取鍵與查詢快取   queue: 速率限制排隊
+#   request: 整個 API 呼叫（含重試、退避與對沖）             ttfb: 送出請求到收到回應標頭
+#   generation: 回應標頭到讀完內容（串流模式為讀到合法移動）   parse: 解析、解碼與修復移動
+#   log: 建立並寫入思考記錄   reprompt: 重新詢問移動
+# 對局迴圈的階段
+#   think: think_and_move 整體   apply: 執行移動（含棋譜串流寫入）   checkpoint: 保存檢查點   turn: 整個回合
+CORE_PHASES = ("prompt", "cache", "queue", "request", "ttfb", "generation", "parse", "log", "reprompt")
+GAME_PHASES = ("think", "apply", "checkpoint", "turn")
+# 摘要輸出列出的階段
+SUMMARY_PHASES = ("think", "queue", "ttfb", "generation", "parse", "apply", "checkpoint")
+
+METRIC_NAME = "chess_llm_phase_duration_seconds"
+
+# 延遲報表列出的百分位數（思考記錄分析、題庫評測與速率限制統計共用）
+PERCENTILES = (50, 90, 95, 99)
+
+_current_timer: "contextvars.ContextVar[Optional[PhaseTimer]]" = contextvars.ContextVar("phase_timer", default=None)
+_current_attempt: "contextvars.ContextVar[Optional[_Attempt]]" = contextvars.ContextVar("request_attempt", default=None)
+
+
+class _Attempt:
+    """單次實際送出的請求（重試與對沖各自一個），由 httpx 回應掛鉤標記收到標頭的時間"""
+
+    __slots__ = ("sent", "first_byte")
+
+    def __init__(self):
+        self.sent = time.perf_counter()
+        self.first_byte: Optional[float] = None
+
+
+class PhaseTimer:
+    """
+    單次推理的各階段耗時（秒），同一階段多次進入時累加
+
+    對沖請求可能在其他執行緒同時寫入，因此以鎖保護。
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        """累加一個階段的耗時"""
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        """計時一個具名區段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    @contextmanager
+    def attempt(self) -> Iterator[None]:
+        """
+        計時一次請求，拆分為 ttfb 與 generation
+
+        客戶端沒有回應掛鉤（例如重播或本機後端）時無法得知收到標頭的時間，整段計入 ttfb。
+        """
+        attempt = _Attempt()
+        token = _current_attempt.set(attempt)
+        try:
+            yield
+        finally:
+            _current_attempt.reset(token)
+            end = time.perf_counter()
+            first_byte = attempt.first_byte if attempt.first_byte is not None else end
+            self.add("ttfb", first_byte - attempt.sent)
+            if attempt.first_byte is not None:
+                self.add("generation", end - first_byte)
+
+    def snapshot(self) -> Dict[str, float]:
+        """目前各階段耗時的副本"""
+        with self._lock:
+            return dict(self.phases)
+
+
+def current_timer() -> Optional[PhaseTimer]:
+    """目前執行緒或非同步工作中進行的推理計時器（未量測時為 None）"""
+    return _current_timer.get()
+
+
+@contextmanager
+def timed() -> Iterator[Optional[PhaseTimer]]:
+    """開始一次推理的量測，期間的 span() 都記錄到同一個計時器；停用量測時產生 None"""
+    if not config.LATENCY_METRICS_ENABLED:
+        yield None
+        return
+    timer = PhaseTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def span(phase: str, timer: Optional[PhaseTimer] = None) -> Iterator[None]:
+    """
+    計時目前推理中的一個具名區段；沒有進行中的量測時不做任何事
+
+    在其他執行緒（例如請求策略的執行緒池）中執行時需明確傳入 timer。
+    """
+    timer = timer or _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.span(phase):
+        yield
+
+
+@contextmanager
+def attempt(timer: Optional[PhaseTimer] = None) -> Iterator[None]:
+    """計時一次實際送出的請求（見 PhaseTimer.attempt）；沒有進行中的量測時不做任何事"""
+    timer = timer or _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.attempt():
+        yield
+
+
+def mark_first_byte(response=None):
+    """httpx 回應事件掛鉤：記錄目前請求收到回應標頭的時間"""
+    attempt = _current_attempt.get()
+    if attempt is not None and attempt.first_byte is None:
+        attempt.first_byte = time.perf_counter()
+
+
+async def mark_first_byte_async(response=None):
+    """非同步 httpx 用戶端的回應事件掛鉤"""
+    mark_first_byte(response)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位數（輸入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Histogram:
+    """固定邊界的累積直方圖（Prometheus 格式），另記錄總和、次數與最大值"""
+
+    __slots__ = ("bounds", "counts", "sum", "count", "max")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """由各桶次數以線性內插估計分位數（落在 +Inf 桶時回傳最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.bounds):
+                    return self.max
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = min(self.bounds[index], self.max)
+                return lower + (max(upper, lower) - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+    def get_stats(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max
+        }
+
+
+class LatencyHistograms:
+    """
+    每個模型、每個階段的延遲直方圖
+
+    每盤對局可建立自己的實例並以 parent 指向行程內共用的實例，
+    記錄時同時寫入兩者：對局摘要使用前者，Prometheus 匯出使用後者。
+    """
+
+    def __init__(self, bounds: Optional[Tuple[float, ...]] = None, parent: Optional["LatencyHistograms"] = None):
+        self.bounds = tuple(sorted(bounds if bounds is not None else config.LATENCY_BUCKETS))
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, model: str, phase: str, seconds: float):
+        """記錄一次階段耗時"""
+        with self._lock:
+            histogram = self._histograms.get((model, phase))
+            if histogram is None:
+                histogram = self._histograms[(model, phase)] = Histogram(self.bounds)
+            histogram.observe(seconds)
+        if self.parent is not None:
+            self.parent.observe(model, phase, seconds)
+
+    def observe_phases(self, model: str, phases: Dict[str, float]):
+        """記錄一次推理的所有階段"""
+        for phase, seconds in phases.items():
+            self.observe(model, phase, seconds)
+
+    @contextmanager
+    def time(self, model: str, phase: str) -> Iterator[None]:
+        """計時一個區段並直接記錄（停用量測時不計時）"""
+        if not config.LATENCY_METRICS_ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(model, phase, time.perf_counter() - start)
+
+    def get_stats(self) -> Dict[str, Dict[str, dict]]:
+        """各模型各階段的次數、總和、平均、估計分位數與最大值（秒）"""
+        with self._lock:
+            stats: Dict[str, Dict[str, dict]] = {}
+            for (model, phase), histogram in sorted(self._histograms.items()):
+                stats.setdefault(model, {})[phase] = histogram.get_stats()
+            return stats
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文字格式的直方圖"""
+        lines = [
+            f"# HELP {METRIC_NAME} Chess-LLM per-phase latency in seconds.",
+            f"# TYPE {METRIC_NAME} histogram"
+        ]
+        with self._lock:
+            for (model, phase), histogram in sorted(self._histograms.items()):
+                labels = f'model="{_escape_label(model)}",phase="{_escape_label(phase)}"'
+                cumulative = 0
+                for bound, count in zip(self.bounds + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram.sum!r}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """寫入暫存檔後原子替換，收集器不會讀到寫到一半的檔案"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_latency_stats(stats: Dict[str, Dict[str, dict]], phases: Tuple[str, ...] = SUMMARY_PHASES) -> List[str]:
+    """將 get_stats() 的結果格式化為每個模型一行的摘要（p50 / p90，毫秒）"""
+    lines = []
+    for model, model_stats in stats.items():
+        parts = [
+            f"{phase} {model_stats[phase]['p50'] * 1000:.0f}/{model_stats[phase]['p90'] * 1000:.0f}ms"
+            for phase in phases if phase in model_stats
+        ]
+        if parts:
+            lines.append(f"{model}: " + ", ".join(parts))
+    return lines
+
+
+class PrometheusExporter:
+    """背景執行緒定期將直方圖寫入 Prometheus 文字檔，停止時再寫入一次"""
+
+    def __init__(self, histograms: "LatencyHistograms", path: str, interval: float = config.LATENCY_EXPORT_INTERVAL):
+        self.histograms = histograms
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="PrometheusExporter", daemon=True)
+
+    def start(self) -> "PrometheusExporter":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            self.histograms.write_prometheus(self.path)
+        except OSError as e:
+            print(f"寫入延遲指標時發生錯誤: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.export()
+
+
+_latency_histograms: Optional[LatencyHistograms] = None
+_latency_histograms_lock = threading.Lock()
+
+
+def get_latency_histograms() -> LatencyHistograms:
+    """取得行程內共用的延遲直方圖"""
+    global _latency_histograms
+    with _latency_histograms_lock:
+        if _latency_histograms is None:
+            _latency_histograms = LatencyHistograms()
+        return _latency_histograms
+
+
+def start_prometheus_export(path: Optional[str] = None) -> Optional[PrometheusExporter]:
+    """依設定開始定期匯出共用直方圖（未啟用量測或未設定檔案路徑時為 None）"""
+    path = config.LATENCY_PROMETHEUS_FILE if path is None else path
+    if not config.LATENCY_METRICS_ENABLED or not path:
+        return None
+    return PrometheusExporter(get_latency_histograms(), path).start()
@@ -1,21 +1,143 @@
-import openai
+import asyncio
 import json
+import random
+import threading
 import time
-from typing import Dict, Any, Optional, Tuple
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, NamedTuple, Optional, Tuple
 from datetime import datetime
-from prompt_lib import RESPONSE_FORMAT_THINK, RESPONSE_FORMAT_WITHOUT_THINK
+from latency import (LatencyHistograms, attempt, current_timer, get_latency_histograms, mark_first_byte,
+                     mark_first_byte_async, span, timed)
+from prompt_lib import (build_batch_prompt, build_lean_prompt, build_legacy_prompt, build_repair_prompt,
+                        count_tokens, decode_move)
+from log_sink import ThinkingLogSink, format_thinking_log
+from move_repair import MoveRepairStats, get_repair_stats, repair_move
+from rate_limiter import (RateLimiter, estimate_request_tokens, get_default_rate_limiter, observe_response,
+                          observe_response_async, tag_request)
+from request_policy import RequestPolicy, get_default_request_policy
+from response_cache import ResponseCache, get_default_response_cache
+from stream_parser import ChosenMoveDetector, extract_delta_text, extract_json_strings
+from usage import UsageTracker, call_cost, get_usage_tracker, response_usage
 import config
 
+# openai 與 httpx 載入較慢，於第一次建立客戶端時才匯入（重播、評測與測試不需要）
+if TYPE_CHECKING:
+    import openai
 
-class LLMInferenceCore:
-    """LLM 推理核心類別，處理與 OpenRouter API 的溝通"""
+
+# 每個事件迴圈共用一個非同步客戶端（連線池綁定於建立它的事件迴圈）
+_shared_async_clients: Dict[int, "openai.AsyncOpenAI"] = {}
+
+
+def get_shared_async_client(pool_size: int = config.LLM_POOL_SIZE) -> "openai.AsyncOpenAI":
+    """
+    取得目前事件迴圈共用的非同步 OpenAI 客戶端
+    
+    所有對局與黑白雙方共用同一個 keep-alive 連線池，以重複使用 TLS 連線。
     
-    def __init__(self):
-        self.client = openai.OpenAI(
+    Args:
+        pool_size: 連線池大小（最大連線數），僅在首次建立時生效
+        
+    Returns:
+        openai.AsyncOpenAI: 共用客戶端
+    """
+    loop_id = id(asyncio.get_running_loop())
+    client = _shared_async_clients.get(loop_id)
+    if client is None:
+        import httpx
+        import openai
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=config.LLM_POOL_KEEPALIVE
+            ),
+            event_hooks={"response": [observe_response_async, mark_first_byte_async]}
+        )
+        client = openai.AsyncOpenAI(
             api_key=config.OPENROUTER_API_KEY,
-            base_url=config.OPENROUTER_BASE_URL
+            base_url=config.OPENROUTER_BASE_URL,
+            http_client=http_client,
+            max_retries=client_max_retries()
         )
+        _shared_async_clients[loop_id] = client
+    return client
+
+
+async def close_shared_async_client():
+    """關閉目前事件迴圈的共用客戶端並釋放連線池"""
+    client = _shared_async_clients.pop(id(asyncio.get_running_loop()), None)
+    if client is not None:
+        await client.close()
+
+
+def client_max_retries() -> int:
+    """OpenAI 客戶端內建的重試次數；啟用請求策略時由策略負責重試"""
+    import openai
+    return 0 if config.REQUEST_POLICY_ENABLED else openai.DEFAULT_MAX_RETRIES
+
+
+def create_sync_client() -> "openai.OpenAI":
+    """建立連線到 OpenRouter 的同步 OpenAI 客戶端"""
+    import openai
+    return openai.OpenAI(
+        api_key=config.OPENROUTER_API_KEY,
+        base_url=config.OPENROUTER_BASE_URL,
+        http_client=openai.DefaultHttpxClient(event_hooks={"response": [observe_response, mark_first_byte]}),
+        max_retries=client_max_retries()
+    )
+
+
+def prompt_move_encoding() -> str:
+    """目前提示詞中合法移動的編碼（原始版面固定為 UCI）"""
+    return config.PROMPT_MOVE_ENCODING if config.PROMPT_LAYOUT == "lean" else "uci"
+
+
+def _used_tokens(response) -> Optional[int]:
+    """API 回報的總 token 數（串流回應或未回報時為 None）"""
+    total_tokens = getattr(getattr(response, "usage", None), "total_tokens", None)
+    return total_tokens if isinstance(total_tokens, int) else None
+
+
+class BatchPosition(NamedTuple):
+    """批次推理中的單一局面"""
+    position_id: str
+    board_state: str
+    legal_moves: List[str]
+    player_color: str
+    position_analysis: Optional[dict] = None
+
+
+class LLMInferenceCore:
+    """LLM 推理核心類別，處理與 OpenRouter API 的溝通"""
+    
+    def __init__(self, response_cache: Optional[ResponseCache] = None, client=None):
+        """
+        Args:
+            response_cache: 回應快取，預設依設定使用共用快取
+            client: 自訂的同步客戶端（例如重播後端），預設於第一次使用時連線到 OpenRouter
+        """
+        self._client = client
         self.thinking_logs: list = []
+        self.response_cache = response_cache if response_cache is not None else get_default_response_cache()
+        self.log_to_file = True
+        self.log_sink: Optional[ThinkingLogSink] = None
+        self._background_streams: list = []
+        self.batch_stats = {"positions": 0, "batches": 0, "batch_answered": 0, "single_calls": 0, "elapsed": 0.0}
+        self.request_policy: Optional[RequestPolicy] = get_default_request_policy()
+        self.repair_stats: MoveRepairStats = get_repair_stats()
+        self.rate_limiter: Optional[RateLimiter] = get_default_rate_limiter()
+        self.latency: LatencyHistograms = get_latency_histograms()
+        self.usage: UsageTracker = get_usage_tracker()
+        # 回退移動使用的亂數產生器，每個推理核心各自一個，可由檢查點保存與還原
+        self.rng = random.Random()
+    
+    @property
+    def client(self) -> "openai.OpenAI":
+        """自訂客戶端，或第一次使用時建立的 OpenRouter 客戶端"""
+        if self._client is None:
+            self._client = create_sync_client()
+        return self._client
     
     def think_and_move(self, 
                       model_name: str,
@@ -39,70 +161,586 @@ class LLMInferenceCore:
         Returns:
             Tuple[str, str]: (選擇的移動, 思考過程)
         """
-        
-        # 建構提示詞
-        prompt = self._build_chess_prompt(
-            board_state, legal_moves, move_history, 
-            player_color, position_analysis
+        with timed() as timer:
+            move, thinking_process = self._think(
+                model_name, board_state, legal_moves, move_history,
+                player_color, personality, position_analysis
+            )
+            if move not in legal_moves and legal_moves and config.MOVE_REPAIR_ENABLED:
+                with span("reprompt"):
+                    move = self._reprompt_move(model_name, board_state, legal_moves, player_color, personality, move)
+        if timer is not None:
+            self.latency.observe_phases(model_name, timer.phases)
+        return move, thinking_process
+    
+    def _think(self,
+               model_name: str,
+               board_state: str,
+               legal_moves: list,
+               move_history: list,
+               player_color: str,
+               personality: str,
+               position_analysis: dict) -> Tuple[str, str]:
+        """呼叫 LLM 並解析移動（含本機修復），參數與回傳值同 think_and_move"""
+        prompt, thinking_start_time, cache_key, cached = self._prepare_think(
+            model_name, board_state, legal_moves, move_history, player_color, personality, position_analysis
         )
-        
-        thinking_start_time = datetime.now()
+        if cached is not None:
+            return cached
         
         try:
-            # 呼叫 LLM API
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are a {personality} professional chess master. respond in JSON format."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=1000,
-                timeout=config.THINKING_TIMEOUT
-            )
+            if config.LLM_STREAMING:
+                # 串流模式：解析出合法移動後立即返回
+                response_content, early_move, stream = self._stream_completion(
+                    model_name, prompt, personality, board_state, legal_moves, player_color
+                )
+                if stream is not None:
+                    thinking_log = self._begin_truncated_log(
+                        response_content, early_move, model_name, board_state, legal_moves, player_color,
+                        thinking_start_time, self._token_usage(prompt, personality, response_content=response_content)
+                    )
+                    if config.STREAM_FINISH_IN_BACKGROUND:
+                        thread = threading.Thread(
+                            target=self._finish_stream,
+                            args=(stream, thinking_log, legal_moves, cache_key),
+                            daemon=True
+                        )
+                        thread.start()
+                        self._background_streams.append(thread)
+                    else:
+                        stream.close()
+                        self._write_thinking_log_file(thinking_log)
+                    return early_move, thinking_log["thinking_process"]
+                usage = self._token_usage(prompt, personality, response_content=response_content)
+            else:
+                # 呼叫 LLM API
+                response_content, usage = self._read_completion(prompt, personality, *self._create_completion(
+                    model_name, player_color=player_color, **self._chat_kwargs(prompt, personality, 1000)
+                ))
             
-            thinking_end_time = datetime.now()
-            thinking_duration = (thinking_end_time - thinking_start_time).total_seconds()
-            
-            # 解析回應
-            response_content = response.choices[0].message.content
-            move, thinking_process = self._parse_llm_response(response_content)
+            return self._handle_response(
+                response_content, model_name, board_state, legal_moves,
+                player_color, thinking_start_time, cache_key=cache_key,
+                usage=usage
+            )
             
-            # 記錄思考過程
-            thinking_log = {
-                "timestamp": thinking_start_time.isoformat(),
-                "model": model_name,
-                "player": player_color,
-                "thinking_duration": thinking_duration,
-                "board_state": board_state,
-                "legal_moves": legal_moves,
-                "thinking_process": thinking_process,
-                "chosen_move": move,
-                "raw_response": response_content
+        except Exception as e:
+            return self._fallback_move(
+                legal_moves, e, model_name, board_state, player_color, thinking_start_time
+            )
+    
+    def _reprompt_move(self,
+                       model_name: str,
+                       board_state: str,
+                       legal_moves: list,
+                       player_color: str,
+                       personality: str,
+                       move: str) -> str:
+        """
+        本機修復失敗時，以只含 FEN 與合法移動的簡短提示詞要求模型重新選擇
+        
+        最多詢問 MOVE_REPAIR_REPROMPTS 次；仍無法得到合法移動時回傳原本的移動，由呼叫端處理。
+        """
+        for _ in range(config.MOVE_REPAIR_REPROMPTS):
+            prompt = build_repair_prompt(board_state, legal_moves, move, prompt_move_encoding())
+            thinking_start_time = datetime.now()
+            try:
+                response_content, usage = self._read_completion(prompt, personality, *self._create_completion(
+                    model_name, player_color=player_color,
+                    **self._chat_kwargs(prompt, personality, config.MOVE_REPAIR_MAX_TOKENS)
+                ))
+            except Exception as e:
+                print(f"重新詢問移動時發生錯誤: {e}")
+                break
+            move, _ = self._handle_response(
+                response_content, model_name, board_state, legal_moves,
+                player_color, thinking_start_time, usage=usage, reprompt=True
+            )
+            if move in legal_moves:
+                return move
+        
+        self.repair_stats.record(model_name, "failed")
+        return move
+    
+    def _create_completion(self,
+                           model_name: str,
+                           hedge: bool = True,
+                           player_color: Optional[str] = None,
+                           **kwargs) -> Tuple[Any, dict]:
+        """
+        送出 chat completion 請求，依請求策略重試與對沖
+        
+        每次實際送出（含重試與對沖）的 token 用量都依模型與執行方記錄；串流請求由呼叫端記錄。
+        
+        Returns:
+            Tuple[Any, dict]: (API 回應, 嘗試資訊: attempts / retries / hedged)
+        """
+        tokens = estimate_request_tokens(kwargs.get("messages", []), kwargs.get("max_tokens", 0))
+        # 請求可能在請求策略的執行緒池中送出，計時器需明確傳入
+        timer = current_timer()
+        
+        def request():
+            # 每次實際送出（含重試與對沖）都先向速率限制器預約額度
+            if self.rate_limiter is not None:
+                with span("queue", timer):
+                    self.rate_limiter.acquire(model_name, tokens)
+            start = time.perf_counter()
+            with self._sent_request(model_name, player_color, timer):
+                response = self.client.chat.completions.create(model=model_name, **kwargs)
+            return self._settle_request(model_name, player_color, tokens, kwargs, response, start)
+        
+        with span("request", timer):
+            if self.request_policy is None:
+                return request(), {"attempts": 1, "retries": 0, "hedged": False}
+            return self.request_policy.call(model_name, request, hedge=hedge)
+    
+    @contextmanager
+    def _sent_request(self, model_name: str, player_color: Optional[str], timer) -> Iterator[None]:
+        """計時並標記一次實際送出的請求，失敗時記錄錯誤（同步與非同步版本共用）"""
+        try:
+            with attempt(timer), tag_request(model_name):
+                yield
+        except Exception:
+            self.usage.record_error(model_name, player_color)
+            raise
+    
+    def _settle_request(self,
+                        model_name: str,
+                        player_color: Optional[str],
+                        tokens: int,
+                        kwargs: dict,
+                        response,
+                        start: float):
+        """以實際用量結算速率限制額度並記錄用量（串流請求由呼叫端記錄），回傳 response"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(model_name, tokens, _used_tokens(response))
+        if not kwargs.get("stream"):
+            self._record_usage(model_name, player_color, kwargs.get("messages", []), response,
+                               time.perf_counter() - start)
+        return response
+    
+    def _prepare_think(self,
+                       model_name: str,
+                       board_state: str,
+                       legal_moves: list,
+                       move_history: list,
+                       player_color: str,
+                       personality: str,
+                       position_analysis: dict) -> Tuple[str, datetime, Optional[str], Optional[Tuple[str, str]]]:
+        """
+        建構提示詞並查詢回應快取（同步與非同步版本共用）
+        
+        Returns:
+            Tuple: (提示詞, 開始思考時間, 快取鍵, 快取命中時的 (移動, 思考過程)，未命中為 None)
+        """
+        with span("prompt"):
+            prompt = self._build_chess_prompt(
+                board_state, legal_moves, move_history, 
+                player_color, position_analysis
+            )
+        
+        thinking_start_time = datetime.now()
+        
+        with span("cache"):
+            cache_key = self._get_cache_key(model_name, board_state, personality, prompt)
+            cached_response = self._lookup_cache(cache_key)
+        if cached_response is None:
+            return prompt, thinking_start_time, cache_key, None
+        self.usage.record_cache_hit(model_name, player_color)
+        return prompt, thinking_start_time, cache_key, self._handle_response(
+            cached_response, model_name, board_state, legal_moves,
+            player_color, thinking_start_time, cache_hit=True
+        )
+    
+    def _chat_kwargs(self, prompt: str, personality: str, max_tokens: int) -> dict:
+        """chat completion 請求的共用參數"""
+        return {
+            "messages": self._build_messages(prompt, personality),
+            "temperature": config.LLM_TEMPERATURE,
+            "max_tokens": max_tokens,
+            "timeout": config.THINKING_TIMEOUT
+        }
+    
+    def _read_completion(self, prompt: str, personality: str, response, request_info: dict) -> Tuple[str, dict]:
+        """取出回應內容與記錄用的用量資訊（含嘗試次數）"""
+        response_content = response.choices[0].message.content
+        usage = self._token_usage(prompt, personality, response, response_content)
+        usage.update(request_info)
+        return response_content, usage
+    
+    def _build_messages(self, prompt: str, personality: str) -> list:
+        """建構對話訊息"""
+        return [
+            {
+                "role": "system",
+                "content": f"You are a {personality} professional chess master. respond in JSON format."
+            },
+            {
+                "role": "user",
+                "content": prompt
             }
-            
+        ]
+    
+    def _record_usage(self, model_name: str, player_color: Optional[str], messages: list, response, seconds: float):
+        """記錄一次 API 回應的 token 用量與費用，API 未回報用量時以文字估計"""
+        input_tokens, output_tokens, cost = response_usage(response)
+        estimated = input_tokens is None or output_tokens is None
+        if input_tokens is None:
+            input_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+        if output_tokens is None:
+            choices = getattr(response, "choices", None) or []
+            content = getattr(getattr(choices[0], "message", None), "content", None) if choices else None
+            output_tokens = count_tokens(content or "")
+        self.usage.record_call(model_name, player_color, input_tokens, output_tokens, seconds, estimated, cost)
+    
+    def _get_cache_key(self, model_name: str, board_state: str, personality: str, prompt: str) -> Optional[str]:
+        """計算回應快取鍵，未啟用快取時回傳 None"""
+        if self.response_cache is None:
+            return None
+        return ResponseCache.make_key(model_name, board_state, personality, config.LLM_TEMPERATURE, prompt)
+    
+    def _lookup_cache(self, cache_key: Optional[str]) -> Optional[str]:
+        """查詢回應快取"""
+        if cache_key is None:
+            return None
+        return self.response_cache.get(cache_key, config.LLM_TEMPERATURE)
+    
+    def _handle_response(self,
+                         response_content: str,
+                         model_name: str,
+                         board_state: str,
+                         legal_moves: list,
+                         player_color: str,
+                         thinking_start_time: datetime,
+                         cache_key: Optional[str] = None,
+                         cache_hit: bool = False,
+                         usage: Optional[dict] = None,
+                         reprompt: bool = False) -> Tuple[str, str]:
+        """解析 API 回應、修復非法移動並記錄思考過程"""
+        # 解析回應
+        with span("parse"):
+            move, thinking_process = self._parse_llm_response(response_content)
+            move = decode_move(move, board_state, legal_moves, prompt_move_encoding())
+            original_move = move
+            repair_type = None
+            if config.MOVE_REPAIR_ENABLED:
+                move, repair_type = repair_move(move, response_content, board_state, legal_moves)
+                if repair_type not in (None, "failed"):
+                    self.repair_stats.record(model_name, repair_type)
+                if reprompt and move in legal_moves:
+                    self.repair_stats.record(model_name, "reprompt")
+        
+        # 只快取能解析出合法移動的回應
+        if cache_key is not None and move in legal_moves:
+            self.response_cache.put(cache_key, response_content)
+        
+        # 記錄思考過程
+        with span("log"):
+            thinking_log = self._create_thinking_log(
+                model_name, board_state, legal_moves, player_color, thinking_start_time,
+                thinking_process, move, response_content, cache_hit
+            )
+            if usage:
+                self._add_log_usage(thinking_log, model_name, usage)
+            if repair_type is not None:
+                thinking_log.update(repair=repair_type, original_move=original_move)
+            if reprompt:
+                thinking_log["reprompt"] = True
             self.thinking_logs.append(thinking_log)
-            
-            if config.LOG_THINKING_PROCESS:
-                self._log_thinking_process(thinking_log)
-            
-            return move, thinking_process
-            
+            self._write_thinking_log_file(thinking_log)
+        
+        return move, thinking_process
+    
+    def _add_log_usage(self, thinking_log: dict, model_name: str, usage: dict):
+        """將 token 用量加入思考記錄，API 未回報費用時依 TOKEN_PRICES 計算 cost_usd"""
+        thinking_log.update(usage)
+        if "cost_usd" not in usage:
+            cost = call_cost(model_name, usage["input_tokens"], usage["output_tokens"])
+            if cost is not None:
+                thinking_log["cost_usd"] = cost
+    
+    def _create_thinking_log(self,
+                             model_name: str,
+                             board_state: str,
+                             legal_moves: list,
+                             player_color: str,
+                             thinking_start_time: datetime,
+                             thinking_process: str,
+                             move: str,
+                             response_content: str,
+                             cache_hit: bool = False) -> dict:
+        """建立單步思考記錄"""
+        thinking_end_time = datetime.now()
+        thinking_duration = (thinking_end_time - thinking_start_time).total_seconds()
+        
+        thinking_log = {
+            "timestamp": thinking_start_time.isoformat(),
+            "model": model_name,
+            "player": player_color,
+            "thinking_duration": thinking_duration,
+            "board_state": board_state,
+            "legal_moves": legal_moves,
+            "thinking_process": thinking_process,
+            "chosen_move": move,
+            "raw_response": response_content,
+            "cache_hit": cache_hit
+        }
+        # 目前為止各階段的耗時（重新詢問的記錄包含先前的階段）
+        timer = current_timer()
+        if timer is not None:
+            thinking_log["phases"] = timer.snapshot()
+        return thinking_log
+    
+    def _write_thinking_log_file(self, thinking_log: dict):
+        """依設定將思考記錄寫入日誌檔（有串流時交給背景寫入執行緒）"""
+        if not self.log_to_file:
+            return
+        if self.log_sink is not None:
+            self.log_sink.write(thinking_log)
+        elif config.LOG_THINKING_PROCESS:
+            self._log_thinking_process(thinking_log)
+    
+    def attach_log_sink(self, log_sink: ThinkingLogSink):
+        """
+        改用 JSON Lines 串流保存思考記錄
+        
+        之後每步記錄由背景執行緒逐筆寫入，記憶體中只保留最近幾步。
+        """
+        self.log_sink = log_sink
+        self.thinking_logs = log_sink.new_buffer()
+    
+    def _stream_completion(self,
+                           model_name: str,
+                           prompt: str,
+                           personality: str,
+                           board_state: str,
+                           legal_moves: list,
+                           player_color: Optional[str] = None):
+        """
+        以串流方式呼叫 API，解析出合法的 chosen_move 時立即返回
+        
+        Returns:
+            Tuple[str, Optional[str], Optional[Stream]]: (已收到的內容, 提前解析出的移動, 尚未讀完的串流)
+            串流完整讀完時後兩者為 None
+        """
+        # 串流請求只重試建立連線，不對沖
+        start = time.perf_counter()
+        kwargs = self._chat_kwargs(prompt, personality, 1000)
+        stream, _ = self._create_completion(
+            model_name, hedge=False, player_color=player_color, stream=True, **kwargs
+        )
+        detector = ChosenMoveDetector(legal_moves, board_state, prompt_move_encoding())
+        try:
+            with span("generation"):
+                for chunk in stream:
+                    if detector.feed(extract_delta_text(chunk)):
+                        return detector.text, detector.move, stream
+            return detector.text, None, None
+        finally:
+            # 串流回應不含用量，以已收到的內容估計（背景讀完的部分不計入）
+            self._record_stream_usage(model_name, player_color, kwargs["messages"], detector.text,
+                                      time.perf_counter() - start)
+    
+    def _record_stream_usage(self,
+                             model_name: str,
+                             player_color: Optional[str],
+                             messages: list,
+                             received: str,
+                             seconds: float):
+        """記錄一次串流請求的估計用量"""
+        input_tokens = sum(count_tokens(message["content"]) for message in messages)
+        self.usage.record_call(model_name, player_color, input_tokens, count_tokens(received), seconds, estimated=True)
+    
+    def _begin_truncated_log(self,
+                             partial_content: str,
+                             move: str,
+                             model_name: str,
+                             board_state: str,
+                             legal_moves: list,
+                             player_color: str,
+                             thinking_start_time: datetime,
+                             usage: dict) -> dict:
+        """為提前中止的串流建立思考記錄（含已收到部分的估計用量與費用），日誌檔在串流結束後才寫入"""
+        thinking_log = self._create_thinking_log(
+            model_name, board_state, legal_moves, player_color, thinking_start_time,
+            self._parse_partial_response(partial_content), move, partial_content
+        )
+        self._add_log_usage(thinking_log, model_name, usage)
+        thinking_log["stream_truncated"] = True
+        self.thinking_logs.append(thinking_log)
+        return thinking_log
+    
+    def _complete_streamed_log(self,
+                               thinking_log: dict,
+                               response_content: str,
+                               legal_moves: list,
+                               cache_key: Optional[str]):
+        """背景串流讀完後補齊思考記錄"""
+        move, thinking_process = self._parse_llm_response(response_content)
+        move = decode_move(move, thinking_log["board_state"], legal_moves, prompt_move_encoding())
+        if thinking_process.startswith("解析失敗"):
+            thinking_process = self._parse_partial_response(response_content)
+        else:
+            thinking_log["stream_truncated"] = False
+            if cache_key is not None and move in legal_moves:
+                self.response_cache.put(cache_key, response_content)
+        
+        thinking_log["raw_response"] = response_content
+        thinking_log["thinking_process"] = thinking_process
+        self._write_thinking_log_file(thinking_log)
+    
+    def _finish_stream(self, stream, thinking_log: dict, legal_moves: list, cache_key: Optional[str]):
+        """在背景執行緒中讀完剩餘串流"""
+        response_content = thinking_log["raw_response"]
+        try:
+            for chunk in stream:
+                response_content += extract_delta_text(chunk)
         except Exception as e:
-            error_msg = f"LLM 推理錯誤: {str(e)}"
-            print(f"錯誤: {error_msg}")
+            print(f"背景串流讀取錯誤: {e}")
+        finally:
+            stream.close()
+        self._complete_streamed_log(thinking_log, response_content, legal_moves, cache_key)
+    
+    def wait_for_background_streams(self, timeout: float = config.THINKING_TIMEOUT):
+        """等待所有背景串流讀完，保存思考記錄前呼叫"""
+        for thread in self._background_streams:
+            thread.join(timeout)
+        self._background_streams = [t for t in self._background_streams if t.is_alive()]
+    
+    def _fallback_move(self,
+                       legal_moves: list,
+                       error: Exception,
+                       model_name: Optional[str] = None,
+                       board_state: Optional[str] = None,
+                       player_color: Optional[str] = None,
+                       thinking_start_time: Optional[datetime] = None) -> Tuple[str, str]:
+        """推理失敗時隨機選擇一個合法移動，並記錄為回退以便統計"""
+        error_msg = f"LLM 推理錯誤: {str(error)}"
+        print(f"錯誤: {error_msg}")
+        
+        # 錯誤時隨機選擇一個合法移動
+        fallback_move = self.rng.choice(legal_moves) if legal_moves else None
+        thinking_process = f"錯誤回退: {error_msg}"
+        
+        if model_name is not None:
+            self.usage.record_fallback(model_name, player_color)
+            thinking_log = self._create_thinking_log(
+                model_name, board_state, legal_moves, player_color, thinking_start_time,
+                thinking_process, fallback_move, ""
+            )
+            thinking_log["fallback"] = True
+            self.thinking_logs.append(thinking_log)
+            self._write_thinking_log_file(thinking_log)
+        
+        return fallback_move, thinking_process
+    
+    def think_batch(self,
+                    model_name: str,
+                    positions: List[BatchPosition],
+                    personality: str,
+                    batch_size: int = config.BATCH_SIZE) -> Dict[str, str]:
+        """
+        一次請求多個局面的移動（離線分析與題庫評測用）
+        
+        每 batch_size 個局面合併為一次請求，回應依局面 ID 逐一以各自的合法移動驗證，
+        未通過驗證的局面改以單一局面呼叫 think_and_move。
+        
+        Returns:
+            Dict[str, str]: 局面 ID -> 選擇的移動
+        """
+        start = time.perf_counter()
+        batch_size = max(1, batch_size)
+        batches = [positions[i:i + batch_size] for i in range(0, len(positions), batch_size)]
+        moves: Dict[str, str] = {}
+        for batch in batches:
+            moves.update(self._request_batch(model_name, batch, personality))
+        batch_answered = len(moves)
+        
+        for position in positions:
+            if position.position_id not in moves:
+                moves[position.position_id], _ = self.think_and_move(
+                    model_name, position.board_state, position.legal_moves, [],
+                    position.player_color, personality, position.position_analysis or {}
+                )
+        
+        self._record_batch_stats(len(positions), len(batches), batch_answered, time.perf_counter() - start)
+        return moves
+    
+    def _request_batch(self, model_name: str, positions: List[BatchPosition], personality: str) -> Dict[str, str]:
+        """送出一次批次請求，回傳通過驗證的移動（請求失敗時為空）"""
+        prompt = build_batch_prompt(positions, prompt_move_encoding())
+        thinking_start_time = datetime.now()
+        colors = {position.player_color for position in positions}
+        try:
+            response, _ = self._create_completion(
+                model_name, player_color=colors.pop() if len(colors) == 1 else "Mixed",
+                **self._chat_kwargs(prompt, personality, config.BATCH_MAX_TOKENS_PER_POSITION * len(positions))
+            )
+            response_content = response.choices[0].message.content
+        except Exception as e:
+            print(f"批次推理錯誤，改為逐一推理: {e}")
+            return {}
+        return self._handle_batch_response(response_content, model_name, positions, thinking_start_time)
+    
+    def _handle_batch_response(self,
+                               response_content: str,
+                               model_name: str,
+                               positions: List[BatchPosition],
+                               thinking_start_time: datetime) -> Dict[str, str]:
+        """解析批次回應，逐一驗證各局面的移動並記錄思考過程"""
+        try:
+            answers = json.loads(response_content[response_content.find('{'):response_content.rfind('}') + 1])
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            print("解析批次回應時發生錯誤，改為逐一推理")
+            return {}
+        if not isinstance(answers, dict):
+            return {}
+        
+        moves = {}
+        for position in positions:
+            answer = answers.get(position.position_id)
+            if isinstance(answer, str):
+                answer = {"chosen_move": answer}
+            if not isinstance(answer, dict):
+                continue
             
-            # 錯誤時隨機選擇一個合法移動
-            import random
-            fallback_move = random.choice(legal_moves) if legal_moves else None
+            move = decode_move(str(answer.get("chosen_move", "")), position.board_state,
+                               position.legal_moves, prompt_move_encoding())
+            if config.MOVE_REPAIR_ENABLED:
+                move, repair_type = repair_move(move, "", position.board_state, position.legal_moves)
+                if repair_type not in (None, "failed"):
+                    self.repair_stats.record(model_name, repair_type)
+            if move not in position.legal_moves:
+                continue
             
-            return fallback_move, f"錯誤回退: {error_msg}"
+            moves[position.position_id] = move
+            thinking_log = self._create_thinking_log(
+                model_name, position.board_state, position.legal_moves, position.player_color,
+                thinking_start_time, str(answer.get("reasoning", "")), move,
+                json.dumps(answer, ensure_ascii=False)
+            )
+            thinking_log["batch"] = True
+            self.thinking_logs.append(thinking_log)
+            self._write_thinking_log_file(thinking_log)
+        return moves
+    
+    def _record_batch_stats(self, positions: int, batches: int, batch_answered: int, elapsed: float):
+        """累計批次推理統計"""
+        self.batch_stats["positions"] += positions
+        self.batch_stats["batches"] += batches
+        self.batch_stats["batch_answered"] += batch_answered
+        self.batch_stats["single_calls"] += positions - batch_answered
+        self.batch_stats["elapsed"] += elapsed
+    
+    def get_repair_stats(self) -> Dict[str, Dict[str, int]]:
+        """獲取各模型依類型的移動修復次數（所有推理核心共用）"""
+        return self.repair_stats.get_stats()
+    
+    def get_batch_stats(self) -> dict:
+        """獲取批次推理統計（含每秒處理的局面數）"""
+        stats = dict(self.batch_stats)
+        stats["positions_per_sec"] = stats["positions"] / stats["elapsed"] if stats["elapsed"] else 0.0
+        return stats
     
     def _build_chess_prompt(self, 
                            board_state: str,
@@ -110,28 +748,39 @@ class LLMInferenceCore:
                            move_history: list,
                            player_color: str,
                            position_analysis: dict) -> str:
-        """建構西洋棋分析提示詞"""
-        response_format = RESPONSE_FORMAT_THINK if config.RESPONSE_WITH_THINKING else RESPONSE_FORMAT_WITHOUT_THINK
-        prompt = f"""
-Please analyze the following chess position and choose the best move:
-
-**Game Information:**
-- You are playing as {player_color}
-- Current position: {board_state}
-- Move count: {position_analysis.get('move_count', 0)}
-- Game status: {position_analysis.get('status', 'Active')}
-- In check: {position_analysis.get('is_check', False)}
-- Material balance: {position_analysis.get('material_balance', 0)} (positive means White is ahead)
-
-**Available legal moves:**
-{', '.join(legal_moves)}
-
-{response_format}
-```
-
-Please ensure that the chosen move is within the legal moves list.
-"""
-        return prompt
+        """建構西洋棋分析提示詞（依 PROMPT_LAYOUT 選擇版面）"""
+        if config.PROMPT_LAYOUT == "lean":
+            return build_lean_prompt(
+                board_state, legal_moves, player_color, position_analysis,
+                config.RESPONSE_WITH_THINKING, config.PROMPT_MOVE_ENCODING
+            )
+        return build_legacy_prompt(
+            board_state, legal_moves, player_color, position_analysis, config.RESPONSE_WITH_THINKING
+        )
+    
+    def _token_usage(self, prompt: str, personality: str, response=None, response_content: Optional[str] = None) -> dict:
+        """輸入與輸出 token 數：優先使用 API 回報的用量，否則以文字估計"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        
+        result = {}
+        if isinstance(prompt_tokens, int):
+            result.update(input_tokens=prompt_tokens, input_tokens_estimated=False)
+        else:
+            messages = self._build_messages(prompt, personality)
+            result.update(
+                input_tokens=sum(count_tokens(message["content"]) for message in messages),
+                input_tokens_estimated=True
+            )
+        if isinstance(completion_tokens, int):
+            result.update(output_tokens=completion_tokens, output_tokens_estimated=False)
+        else:
+            result.update(output_tokens=count_tokens(response_content or ""), output_tokens_estimated=True)
+        reported_cost = response_usage(response)[2]
+        if reported_cost is not None:
+            result["cost_usd"] = reported_cost
+        return result
     
     def _parse_llm_response(self, response_content: str) -> Tuple[str, str]:
         """解析 LLM 回應並提取移動和思考過程"""
@@ -169,29 +818,293 @@ Please ensure that the chosen move is within the legal moves list.
         # 解析失敗時的回退處理
         return "", f"解析失敗，原始回應: {response_content[:500]}..."
     
+    def _parse_partial_response(self, partial_content: str) -> str:
+        """從不完整的回應中盡量擷取思考過程"""
+        thinking_parts = []
+        analyses = extract_json_strings(partial_content, "analysis")
+        if analyses:
+            thinking_parts.append(f"局面分析: {analyses[0]}")
+        
+        candidate_moves = extract_json_strings(partial_content, "move")
+        evaluations = extract_json_strings(partial_content, "evaluation")
+        if candidate_moves:
+            thinking_parts.append("候選移動:")
+            for i, candidate in enumerate(candidate_moves):
+                evaluation = evaluations[i] if i < len(evaluations) else ""
+                thinking_parts.append(f"  - {candidate}: {evaluation}")
+        
+        thinking_parts.append("(回應串流已於選定移動後中止)")
+        return "\n".join(thinking_parts)
+    
     def _log_thinking_process(self, thinking_log: dict):
         """記錄思考過程到檔案"""
         try:
             with open(config.GAME_LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(f"\n{'='*50}\n")
-                f.write(f"時間: {thinking_log['timestamp']}\n")
-                f.write(f"模型: {thinking_log['model']}\n")
-                f.write(f"玩家: {thinking_log['player']}\n")
-                f.write(f"思考時間: {thinking_log['thinking_duration']:.2f} 秒\n")
-                f.write(f"選擇移動: {thinking_log['chosen_move']}\n")
-                f.write(f"\n思考過程:\n{thinking_log['thinking_process']}\n")
-                f.write(f"{'='*50}\n")
+                f.write(format_thinking_log(thinking_log))
         except Exception as e:
             print(f"記錄思考過程時發生錯誤: {e}")
     
     def get_thinking_logs(self) -> list:
-        """獲取所有思考記錄"""
-        return self.thinking_logs
+        """獲取所有思考記錄（串流模式下為最近幾步）"""
+        return list(self.thinking_logs)
     
     def save_thinking_logs(self, filename: str):
-        """將思考記錄保存到 JSON 檔案"""
+        """
+        將思考記錄保存到 JSON Lines 檔案（每步一行，與串流模式的格式相同）
+        
+        串流模式下記錄已逐筆寫入 JSON Lines 檔案，此時只等待寫入完成，不另存 filename。
+        """
+        if self.log_sink is not None:
+            self.log_sink.close()
+            return
+        
         try:
             with open(filename, "w", encoding="utf-8") as f:
-                json.dump(self.thinking_logs, f, ensure_ascii=False, indent=2)
+                f.writelines(json.dumps(thinking_log, ensure_ascii=False) + "\n" for thinking_log in self.thinking_logs)
         except Exception as e:
             print(f"保存思考記錄時發生錯誤: {e}")
+
+
+class AsyncLLMInferenceCore(LLMInferenceCore):
+    """非同步 LLM 推理核心，使用共用連線池，可同時等待多個棋盤的移動"""
+    
+    def __init__(self,
+                 pool_size: int = config.LLM_POOL_SIZE,
+                 response_cache: Optional[ResponseCache] = None,
+                 client=None):
+        """
+        Args:
+            pool_size: 共用連線池大小
+            response_cache: 回應快取，預設依設定使用共用快取
+            client: 自訂的非同步客戶端（例如本機替代後端），預設使用共用連線池
+        """
+        super().__init__(response_cache, client)
+        # 客戶端於第一次推理時在執行中的事件迴圈取得
+        self.pool_size = pool_size
+    
+    @property
+    def client(self) -> "openai.AsyncOpenAI":
+        """自訂客戶端，或目前事件迴圈的共用非同步客戶端"""
+        if self._client is not None:
+            return self._client
+        return get_shared_async_client(self.pool_size)
+    
+    async def think_and_move(self, 
+                             model_name: str,
+                             board_state: str,
+                             legal_moves: list,
+                             move_history: list,
+                             player_color: str,
+                             personality: str,
+                             position_analysis: dict) -> Tuple[str, str]:
+        """
+        讓 LLM 思考並決定下一步移動（非同步版本）
+        
+        參數與回傳值同 LLMInferenceCore.think_and_move
+        """
+        with timed() as timer:
+            move, thinking_process = await self._think(
+                model_name, board_state, legal_moves, move_history,
+                player_color, personality, position_analysis
+            )
+            if move not in legal_moves and legal_moves and config.MOVE_REPAIR_ENABLED:
+                with span("reprompt"):
+                    move = await self._reprompt_move(
+                        model_name, board_state, legal_moves, player_color, personality, move
+                    )
+        if timer is not None:
+            self.latency.observe_phases(model_name, timer.phases)
+        return move, thinking_process
+    
+    async def _think(self,
+                     model_name: str,
+                     board_state: str,
+                     legal_moves: list,
+                     move_history: list,
+                     player_color: str,
+                     personality: str,
+                     position_analysis: dict) -> Tuple[str, str]:
+        """呼叫 LLM 並解析移動（非同步版本），參數與回傳值同 think_and_move"""
+        prompt, thinking_start_time, cache_key, cached = self._prepare_think(
+            model_name, board_state, legal_moves, move_history, player_color, personality, position_analysis
+        )
+        if cached is not None:
+            return cached
+        
+        try:
+            if config.LLM_STREAMING:
+                # 串流模式：解析出合法移動後立即返回
+                response_content, early_move, stream = await self._stream_completion(
+                    model_name, prompt, personality, board_state, legal_moves, player_color
+                )
+                if stream is not None:
+                    thinking_log = self._begin_truncated_log(
+                        response_content, early_move, model_name, board_state, legal_moves, player_color,
+                        thinking_start_time, self._token_usage(prompt, personality, response_content=response_content)
+                    )
+                    if config.STREAM_FINISH_IN_BACKGROUND:
+                        task = asyncio.create_task(
+                            self._finish_stream(stream, thinking_log, legal_moves, cache_key)
+                        )
+                        self._background_streams.append(task)
+                    else:
+                        await stream.close()
+                        self._write_thinking_log_file(thinking_log)
+                    return early_move, thinking_log["thinking_process"]
+                usage = self._token_usage(prompt, personality, response_content=response_content)
+            else:
+                # 呼叫 LLM API
+                response_content, usage = self._read_completion(prompt, personality, *await self._create_completion(
+                    model_name, player_color=player_color, **self._chat_kwargs(prompt, personality, 1000)
+                ))
+            
+            return self._handle_response(
+                response_content, model_name, board_state, legal_moves,
+                player_color, thinking_start_time, cache_key=cache_key,
+                usage=usage
+            )
+            
+        except Exception as e:
+            return self._fallback_move(
+                legal_moves, e, model_name, board_state, player_color, thinking_start_time
+            )
+    
+    async def _reprompt_move(self,
+                             model_name: str,
+                             board_state: str,
+                             legal_moves: list,
+                             player_color: str,
+                             personality: str,
+                             move: str) -> str:
+        """本機修復失敗時要求模型重新選擇（非同步版本），參數與回傳值同 LLMInferenceCore._reprompt_move"""
+        for _ in range(config.MOVE_REPAIR_REPROMPTS):
+            prompt = build_repair_prompt(board_state, legal_moves, move, prompt_move_encoding())
+            thinking_start_time = datetime.now()
+            try:
+                response_content, usage = self._read_completion(prompt, personality, *await self._create_completion(
+                    model_name, player_color=player_color,
+                    **self._chat_kwargs(prompt, personality, config.MOVE_REPAIR_MAX_TOKENS)
+                ))
+            except Exception as e:
+                print(f"重新詢問移動時發生錯誤: {e}")
+                break
+            move, _ = self._handle_response(
+                response_content, model_name, board_state, legal_moves,
+                player_color, thinking_start_time, usage=usage, reprompt=True
+            )
+            if move in legal_moves:
+                return move
+        
+        self.repair_stats.record(model_name, "failed")
+        return move
+    
+    async def _create_completion(self,
+                                 model_name: str,
+                                 hedge: bool = True,
+                                 player_color: Optional[str] = None,
+                                 **kwargs) -> Tuple[Any, dict]:
+        """送出 chat completion 請求（非同步版本），回傳值同 LLMInferenceCore._create_completion"""
+        tokens = estimate_request_tokens(kwargs.get("messages", []), kwargs.get("max_tokens", 0))
+        timer = current_timer()
+        
+        async def request():
+            if self.rate_limiter is not None:
+                with span("queue", timer):
+                    await self.rate_limiter.acquire_async(model_name, tokens)
+            start = time.perf_counter()
+            with self._sent_request(model_name, player_color, timer):
+                response = await self.client.chat.completions.create(model=model_name, **kwargs)
+            return self._settle_request(model_name, player_color, tokens, kwargs, response, start)
+        
+        with span("request", timer):
+            if self.request_policy is None:
+                return await request(), {"attempts": 1, "retries": 0, "hedged": False}
+            return await self.request_policy.call_async(model_name, request, hedge=hedge)
+    
+    async def think_batch(self,
+                          model_name: str,
+                          positions: List[BatchPosition],
+                          personality: str,
+                          batch_size: int = config.BATCH_SIZE) -> Dict[str, str]:
+        """一次請求多個局面的移動（非同步版本，各批次同時送出），參數與回傳值同 LLMInferenceCore.think_batch"""
+        start = time.perf_counter()
+        batch_size = max(1, batch_size)
+        batches = [positions[i:i + batch_size] for i in range(0, len(positions), batch_size)]
+        moves: Dict[str, str] = {}
+        for batch_moves in await asyncio.gather(*(
+            self._request_batch(model_name, batch, personality) for batch in batches
+        )):
+            moves.update(batch_moves)
+        batch_answered = len(moves)
+        
+        failed = [position for position in positions if position.position_id not in moves]
+        results = await asyncio.gather(*(
+            self.think_and_move(
+                model_name, position.board_state, position.legal_moves, [],
+                position.player_color, personality, position.position_analysis or {}
+            )
+            for position in failed
+        ))
+        for position, (move, _) in zip(failed, results):
+            moves[position.position_id] = move
+        
+        self._record_batch_stats(len(positions), len(batches), batch_answered, time.perf_counter() - start)
+        return moves
+    
+    async def _request_batch(self, model_name: str, positions: List[BatchPosition], personality: str) -> Dict[str, str]:
+        """送出一次批次請求（非同步版本）"""
+        prompt = build_batch_prompt(positions, prompt_move_encoding())
+        thinking_start_time = datetime.now()
+        colors = {position.player_color for position in positions}
+        try:
+            response, _ = await self._create_completion(
+                model_name, player_color=colors.pop() if len(colors) == 1 else "Mixed",
+                **self._chat_kwargs(prompt, personality, config.BATCH_MAX_TOKENS_PER_POSITION * len(positions))
+            )
+            response_content = response.choices[0].message.content
+        except Exception as e:
+            print(f"批次推理錯誤，改為逐一推理: {e}")
+            return {}
+        return self._handle_batch_response(response_content, model_name, positions, thinking_start_time)
+    
+    async def _stream_completion(self,
+                                 model_name: str,
+                                 prompt: str,
+                                 personality: str,
+                                 board_state: str,
+                                 legal_moves: list,
+                                 player_color: Optional[str] = None):
+        """以串流方式呼叫 API（非同步版本），回傳值同 LLMInferenceCore._stream_completion"""
+        start = time.perf_counter()
+        kwargs = self._chat_kwargs(prompt, personality, 1000)
+        stream, _ = await self._create_completion(
+            model_name, hedge=False, player_color=player_color, stream=True, **kwargs
+        )
+        detector = ChosenMoveDetector(legal_moves, board_state, prompt_move_encoding())
+        try:
+            with span("generation"):
+                async for chunk in stream:
+                    if detector.feed(extract_delta_text(chunk)):
+                        return detector.text, detector.move, stream
+            return detector.text, None, None
+        finally:
+            self._record_stream_usage(model_name, player_color, kwargs["messages"], detector.text,
+                                      time.perf_counter() - start)
+    
+    async def _finish_stream(self, stream, thinking_log: dict, legal_moves: list, cache_key: Optional[str]):
+        """在背景工作中讀完剩餘串流"""
+        response_content = thinking_log["raw_response"]
+        try:
+            async for chunk in stream:
+                response_content += extract_delta_text(chunk)
+        except Exception as e:
+            print(f"背景串流讀取錯誤: {e}")
+        finally:
+            await stream.close()
+        self._complete_streamed_log(thinking_log, response_content, legal_moves, cache_key)
+    
+    async def wait_for_background_streams(self, timeout: float = config.THINKING_TIMEOUT):
+        """等待所有背景串流讀完，保存思考記錄前呼叫"""
+        if self._background_streams:
+            await asyncio.wait(self._background_streams, timeout=timeout)
+        self._background_streams = [t for t in self._background_streams if not t.done()]
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import chess
+
+from chess_core import PIECE_VALUES
+from prompt_lib import count_tokens
+
+FEN_PATTERN = re.compile(r"([pnbrqkPNBRQK1-8]+(?:/[pnbrqkPNBRQK1-8]+){7} [wb] [KQkq-]+ [a-h1-8-]+(?: \d+ \d+)?)")
+BATCH_ID_PATTERN = re.compile(r"^\[([^\]]+)\]\s*$", re.MULTILINE)
+
+
+def random_policy(board: chess.Board, rng: random.Random) -> chess.Move:
+    """隨機選擇合法移動"""
+    return rng.choice(list(board.legal_moves))
+
+
+def first_policy(board: chess.Board, rng: random.Random) -> chess.Move:
+    """選擇第一個合法移動（結果可重現）"""
+    return next(iter(board.legal_moves))
+
+
+def greedy_policy(board: chess.Board, rng: random.Random) -> chess.Move:
+    """一步殺優先，其次吃下價值最高的棋子，否則隨機"""
+    best_move, best_score = None, 0
+    for move in board.legal_moves:
+        board.push(move)
+        is_mate = board.is_checkmate()
+        board.pop()
+        if is_mate:
+            return move
+
+        captured = board.piece_type_at(move.to_square) or (chess.PAWN if board.is_en_passant(move) else None)
+        if captured:
+            score = PIECE_VALUES[captured] * 10 - PIECE_VALUES[board.piece_type_at(move.from_square)]
+            if best_move is None or score > best_score:
+                best_move, best_score = move, score
+    return best_move or random_policy(board, rng)
+
+
+MOVE_POLICIES: Dict[str, Callable[[chess.Board, random.Random], chess.Move]] = {
+    "random": random_policy,
+    "first": first_policy,
+    "greedy": greedy_policy
+}
+
+
+def build_answer(board: chess.Board, move: chess.Move) -> dict:
+    """依提示詞要求的格式組出回答"""
+    return {
+        "analysis": f"Local stand-in backend, {board.legal_moves.count()} legal moves.",
+        "candidate_moves": [{"move": move.uci(), "evaluation": "chosen by the local move policy"}],
+        "chosen_move": move.uci(),
+        "reasoning": "Local stand-in backend."
+    }
+
+
+def answer_prompt(prompt: str, policy: Callable, rng: random.Random) -> str:
+    """
+    由提示詞中的 FEN 產生回應內容
+
+    批次提示詞（以 [id] 標示各局面）回傳以局面 ID 為鍵的 JSON，其餘回傳單一局面的 JSON。
+    """
+    ids = BATCH_ID_PATTERN.findall(prompt)
+    fens = FEN_PATTERN.findall(prompt)
+    if ids and len(ids) == len(fens):
+        answers = {}
+        for position_id, fen in zip(ids, fens):
+            board = chess.Board(fen)
+            if not board.is_game_over():
+                answers[position_id] = {"chosen_move": policy(board, rng).uci(), "reasoning": "local"}
+        return json.dumps(answers)
+
+    if not fens:
+        return "I could not find a chess position in the prompt."
+    board = chess.Board(fens[0])
+    if board.is_game_over():
+        return "The game is already over."
+    return json.dumps(build_answer(board, policy(board, rng)), ensure_ascii=False)
+
+
+class LocalCompletions:
+    """與 OpenAI chat.completions 介面相容的本機替代後端，不需網路與 API 金鑰"""
+
+    def __init__(self,
+                 policy: str = "greedy",
+                 latency: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            policy: 移動策略名稱（見 MOVE_POLICIES）
+            latency: 每次請求的模擬延遲（秒）
+            seed: 隨機種子
+        """
+        if policy not in MOVE_POLICIES:
+            raise ValueError(f"未知的移動策略: {policy}")
+        self.policy = MOVE_POLICIES[policy]
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def _complete(self, messages: List[dict], model: str) -> SimpleNamespace:
+        """產生一次完整回應"""
+        self.requests += 1
+        prompt = messages[-1]["content"]
+        content = answer_prompt(prompt, self.policy, self.rng)
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        completion_tokens = count_tokens(content)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+class AsyncLocalCompletions(LocalCompletions):
+    """非同步版本"""
+
+    async def create(self, model: str, messages: List[dict], **kwargs) -> SimpleNamespace:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._complete(messages, model)
+
+
+class SyncLocalCompletions(LocalCompletions):
+    """同步版本"""
+
+    def create(self, model: str, messages: List[dict], **kwargs) -> SimpleNamespace:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._complete(messages, model)
+
+
+def create_local_client(policy: str = "greedy",
+                        latency: float = 0.0,
+                        seed: Optional[int] = None,
+                        asynchronous: bool = True) -> SimpleNamespace:
+    """建立可取代 OpenAI 客戶端的本機替代後端（只支援非串流的 chat.completions.create）"""
+    completions_class = AsyncLocalCompletions if asynchronous else SyncLocalCompletions
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions_class(policy, latency, seed)))
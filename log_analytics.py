@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+思考記錄分析工具
+串流讀取思考記錄並建立可重複使用的增量索引，依模型統計延遲與錯誤率
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+import config
+from latency import PERCENTILES, percentile
+
+# 已索引部分的指紋取開頭與結尾各多少位元組
+FINGERPRINT_BYTES = 4096
+
+
+def find_log_files(root: str) -> List[str]:
+    """遞迴尋找目錄中的思考記錄檔（.json 與 .jsonl）"""
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.startswith("thinking_logs_") and name.endswith((".json", ".jsonl")):
+                files.append(os.path.join(directory, name))
+    return sorted(files)
+
+
+def classify_record(record: dict) -> Tuple[bool, bool, bool]:
+    """
+    判斷單步記錄的錯誤類型
+
+    Returns:
+        Tuple[bool, bool, bool]: (解析失敗, 錯誤回退, 非法移動)
+    """
+    thinking_process = record.get("thinking_process") or ""
+    chosen_move = record.get("chosen_move")
+    fallback = bool(record.get("fallback")) or thinking_process.startswith("錯誤回退")
+    parse_failed = not fallback and (not chosen_move or thinking_process.startswith("解析失敗"))
+    illegal = bool(chosen_move) and chosen_move not in (record.get("legal_moves") or [])
+    return parse_failed, fallback, illegal
+
+
+def prefix_fingerprint(path: str, offset: int) -> str:
+    """檔案前 offset 位元組的指紋（開頭與結尾各 FINGERPRINT_BYTES 位元組的雜湊），用於判斷是否只有附加"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+    return digest.hexdigest()
+
+
+class LogIndex:
+    """
+    思考記錄的磁碟增量索引
+
+    每步記錄以 (模型, 顏色, 對局, 步數) 為鍵存入 SQLite。重新執行時只讀取新檔案；
+    JSON Lines 檔案在已讀部分未變動時從上次讀到的位置繼續讀取（繼續對局會截斷後重寫，
+    因此比對已讀部分的指紋），其他有變動的檔案則整個重建。
+    """
+
+    def __init__(self, path: str = config.LOG_INDEX_PATH):
+        """
+        Args:
+            path: SQLite 索引檔案路徑（":memory:" 表示僅存於記憶體）
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.path = path
+        self._last_offset = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                offset INTEGER NOT NULL,
+                plies INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS plies (
+                model TEXT NOT NULL,
+                color TEXT NOT NULL,
+                game TEXT NOT NULL,
+                ply INTEGER NOT NULL,
+                duration REAL NOT NULL,
+                parse_failed INTEGER NOT NULL,
+                fallback INTEGER NOT NULL,
+                illegal INTEGER NOT NULL,
+                cache_hit INTEGER NOT NULL,
+                PRIMARY KEY (model, color, game, ply)
+            );
+            CREATE INDEX IF NOT EXISTS idx_plies_game ON plies(game);
+            """
+        )
+        # 舊版索引沒有指紋欄位，空指紋的 JSON Lines 檔案會重新讀取
+        if "fingerprint" not in [column[1] for column in self._conn.execute("PRAGMA table_info(files)")]:
+            self._conn.execute("ALTER TABLE files ADD COLUMN fingerprint TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+    def update(self, root: str) -> dict:
+        """
+        將目錄中新增或變動的思考記錄加入索引
+
+        Returns:
+            dict: 本次讀取的檔案數、略過的檔案數與新增的步數
+        """
+        stats = {"files_read": 0, "files_skipped": 0, "plies_added": 0}
+        paths = find_log_files(root)
+
+        # 已刪除的檔案連同其步數一併移出索引
+        for (path,) in self._conn.execute("SELECT path FROM files").fetchall():
+            if path not in paths:
+                self._conn.execute("DELETE FROM plies WHERE game = ?", (os.path.relpath(path, root),))
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._conn.commit()
+
+        for path in paths:
+            # 以含副檔名的相對路徑區分對局，同名的 .json 與 .jsonl 不會互相覆蓋
+            game = os.path.relpath(path, root)
+            stat = os.stat(path)
+            row = self._conn.execute(
+                "SELECT size, mtime, offset, plies, fingerprint FROM files WHERE path = ?", (path,)
+            ).fetchone()
+
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+                stats["files_skipped"] += 1
+                continue
+
+            if (row and path.endswith(".jsonl") and stat.st_size >= row[0]
+                    and prefix_fingerprint(path, row[2]) == row[4]):
+                # 已讀部分未變動（只有附加），從上次位置繼續
+                offset, first_ply = row[2], row[3]
+            else:
+                self._conn.execute("DELETE FROM plies WHERE game = ?", (game,))
+                offset, first_ply = 0, 0
+
+            plies = first_ply
+            for ply, record in enumerate(self._read_records(path, offset), start=first_ply):
+                self._insert(game, ply, record)
+                plies = ply + 1
+            fingerprint = ""
+            if path.endswith(".jsonl"):
+                offset = self._last_offset
+                fingerprint = prefix_fingerprint(path, offset)
+            else:
+                offset = stat.st_size
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, offset, plies, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime, offset, plies, fingerprint)
+            )
+            self._conn.commit()
+            stats["files_read"] += 1
+            stats["plies_added"] += plies - first_ply
+        return stats
+
+    def _read_records(self, path: str, offset: int) -> Iterator[dict]:
+        """逐筆讀取記錄；JSON Lines 只讀到最後一個完整的行"""
+        if not path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                yield from json.load(f)
+            return
+
+        self._last_offset = offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._last_offset += len(line)
+                if line.strip():
+                    yield json.loads(line)
+
+    def _insert(self, game: str, ply: int, record: dict):
+        """寫入單步索引"""
+        parse_failed, fallback, illegal = classify_record(record)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO plies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record.get("model", ""), record.get("player", ""), game, ply,
+             float(record.get("thinking_duration") or 0.0),
+             parse_failed, fallback, illegal, bool(record.get("cache_hit")))
+        )
+
+    def report(self, model: Optional[str] = None, color: Optional[str] = None, by_color: bool = False) -> List[dict]:
+        """
+        依模型（可再依顏色）統計
+
+        Returns:
+            List[dict]: 每組的步數、延遲百分位數與各項錯誤率
+        """
+        conditions, params = [], []
+        if model:
+            conditions.append("model = ?")
+            params.append(model)
+        if color:
+            conditions.append("color = ?")
+            params.append(color)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        group = "model, color" if by_color or color else "model"
+
+        rows = self._conn.execute(
+            f"""
+            SELECT {group}, COUNT(*), COUNT(DISTINCT game), SUM(parse_failed), SUM(fallback),
+                   SUM(illegal), SUM(cache_hit), AVG(duration), MAX(duration)
+            FROM plies {where} GROUP BY {group} ORDER BY {group}
+            """,
+            params
+        ).fetchall()
+
+        report = []
+        for row in rows:
+            key = row[:2] if group != "model" else (row[0], None)
+            plies, games, parse_failed, fallback, illegal, cache_hit, mean, maximum = row[len(group.split(", ")):]
+            durations = [value for (value,) in self._conn.execute(
+                f"SELECT duration FROM plies WHERE model = ?{' AND color = ?' if key[1] else ''} ORDER BY duration",
+                [key[0]] + ([key[1]] if key[1] else [])
+            )]
+            entry = {"model": key[0]}
+            if key[1]:
+                entry["color"] = key[1]
+            entry.update({
+                "plies": plies,
+                "games": games,
+                "latency": dict(
+                    {f"p{pct}": percentile(durations, pct) for pct in PERCENTILES},
+                    mean=mean, max=maximum
+                ),
+                "parse_failure_rate": parse_failed / plies,
+                "fallback_rate": fallback / plies,
+                "illegal_move_rate": illegal / plies,
+                "cache_hit_rate": cache_hit / plies
+            })
+            report.append(entry)
+        return report
+
+    def close(self):
+        """關閉索引"""
+        self._conn.close()
+
+
+def print_report(report: List[dict]):
+    """輸出可讀的統計表"""
+    if not report:
+        print("沒有符合條件的思考記錄")
+        return
+
+    for entry in report:
+        title = entry["model"] + (f" ({entry['color']})" if "color" in entry else "")
+        latency = entry["latency"]
+        print(f"\n{title}")
+        print(f"  步數: {entry['plies']}  對局: {entry['games']}")
+        print("  思考時間: " + "  ".join(
+            f"p{pct} {latency[f'p{pct}']:.2f}s" for pct in PERCENTILES
+        ) + f"  平均 {latency['mean']:.2f}s  最大 {latency['max']:.2f}s")
+        print(f"  解析失敗率: {entry['parse_failure_rate']:.1%}  回退率: {entry['fallback_rate']:.1%}  "
+              f"非法移動率: {entry['illegal_move_rate']:.1%}  快取命中率: {entry['cache_hit_rate']:.1%}")
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="思考記錄分析")
+    parser.add_argument("--logs-dir", default=config.LOG_ANALYTICS_DIR, help="思考記錄目錄（含子目錄）")
+    parser.add_argument("--index", default=config.LOG_INDEX_PATH, help="增量索引檔案路徑")
+    parser.add_argument("--model", help="只統計指定模型")
+    parser.add_argument("--color", choices=["White", "Black"], help="只統計指定顏色")
+    parser.add_argument("--by-color", action="store_true", help="依模型與顏色分組")
+    parser.add_argument("--json", help="將統計結果另存為 JSON 檔案")
+    args = parser.parse_args()
+
+    index = LogIndex(args.index)
+    try:
+        stats = index.update(args.logs_dir)
+        print(f"索引更新: 讀取 {stats['files_read']} 個檔案（略過 {stats['files_skipped']} 個未變動），"
+              f"新增 {stats['plies_added']} 步")
+        report = index.report(args.model, args.color, args.by_color)
+    finally:
+        index.close()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
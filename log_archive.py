@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+思考記錄封存格式
+將 JSON / JSON Lines 思考記錄轉換為精簡的二進位封存檔，並可依對局與步數隨機讀取
+
+檔案結構（小端序）:
+    檔頭      MAGIC + 版本
+    對局區塊  模型名稱表、每步固定長度紀錄（局面編碼、移動索引、時間資訊）、
+              文字區塊偏移表、以 zlib 壓縮的文字區塊（每 PLIES_PER_BLOCK 步一塊）
+    索引      各對局名稱、區塊偏移與步數
+    檔尾      索引偏移 + INDEX_MAGIC
+
+移動以該步合法移動生成順序中的 16 位元索引儲存，合法移動列表由局面重新生成，
+因此不需保存；讀取單一步只需解壓縮所在的文字區塊。
+"""
+
+import argparse
+import glob
+import json
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import chess
+
+MAGIC = b"CLLA"
+INDEX_MAGIC = b"CLLI"
+VERSION = 1
+PLIES_PER_BLOCK = 16
+NO_MOVE = 0xFFFF
+
+_HEADER = struct.Struct("<4sH")
+_TRAILER = struct.Struct("<Q4s")
+# 局面: 佔用位元盤、棋子半位元組、輪次與易位權、吃過路兵檔、半回合計數、回合數
+# 紀錄: 移動索引、模型索引、玩家、思考時間、時間戳記（微秒）、旗標
+_PLY_RECORD = struct.Struct("<Q16sBBHHHBBdqB")
+_BLOCK_ENTRY = struct.Struct("<QI")
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_TIMESTAMP = -(2 ** 63)
+
+# 布林欄位以旗標位元儲存
+_FLAG_FIELDS = ("cache_hit", "stream_truncated", "pondered")
+# 由固定長度紀錄與文字區塊還原的欄位，其餘欄位存入額外資料
+_CORE_FIELDS = {"timestamp", "model", "player", "thinking_duration", "board_state",
+                "legal_moves", "thinking_process", "chosen_move", "raw_response"}
+_CASTLING_SQUARES = (chess.H1, chess.A1, chess.H8, chess.A8)
+
+
+def encode_board(board: chess.Board) -> Tuple[int, bytes, int, int, int, int]:
+    """將棋盤編碼為佔用位元盤加每個棋子 4 位元"""
+    occupied = board.occupied
+    nibbles = bytearray(16)
+    for i, square in enumerate(chess.scan_forward(occupied)):
+        piece = board.piece_at(square)
+        value = piece.piece_type + (0 if piece.color == chess.WHITE else 8)
+        nibbles[i // 2] |= value << (4 * (i % 2))
+
+    flags = 1 if board.turn == chess.WHITE else 0
+    for bit, square in enumerate(_CASTLING_SQUARES):
+        if board.castling_rights & chess.BB_SQUARES[square]:
+            flags |= 1 << (bit + 1)
+    ep_file = chess.square_file(board.ep_square) if board.ep_square is not None else 8
+    return occupied, bytes(nibbles), flags, ep_file, board.halfmove_clock, board.fullmove_number
+
+
+def decode_board(occupied: int, nibbles: bytes, flags: int, ep_file: int,
+                 halfmove_clock: int, fullmove_number: int) -> chess.Board:
+    """由編碼還原棋盤"""
+    board = chess.Board.empty()
+    for i, square in enumerate(chess.scan_forward(occupied)):
+        value = (nibbles[i // 2] >> (4 * (i % 2))) & 0xF
+        board.set_piece_at(square, chess.Piece(value & 7, chess.WHITE if value < 8 else chess.BLACK))
+
+    board.turn = chess.WHITE if flags & 1 else chess.BLACK
+    castling = 0
+    for bit, square in enumerate(_CASTLING_SQUARES):
+        if flags & (1 << (bit + 1)):
+            castling |= chess.BB_SQUARES[square]
+    board.castling_rights = castling
+    if ep_file != 8:
+        board.ep_square = chess.square(ep_file, 5 if board.turn == chess.WHITE else 2)
+    board.halfmove_clock = halfmove_clock
+    board.fullmove_number = fullmove_number
+    return board
+
+
+def _encode_timestamp(timestamp: str) -> Optional[int]:
+    """ISO 時間字串轉為微秒；無法還原為相同字串時回傳 None"""
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None or parsed.isoformat() != timestamp:
+        return None
+    delta = parsed - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _decode_timestamp(micros: int) -> str:
+    """微秒轉回 ISO 時間字串"""
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+class ArchiveWriter:
+    """思考記錄封存檔寫入器"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+        self._index: List[Tuple[str, int, int]] = []
+
+    def add_game(self, name: str, records: List[dict]):
+        """寫入一盤對局的所有思考記錄"""
+        offset = self._file.tell()
+        models: Dict[str, int] = {}
+        ply_records = []
+        texts = []
+
+        for record in records:
+            board = chess.Board(record["board_state"])
+            extras = {key: value for key, value in record.items() if key not in _CORE_FIELDS}
+
+            # 局面編碼必須能還原相同的 FEN 與合法移動順序，否則保存原始資料
+            occupied, nibbles, board_flags, ep_file, halfmove, fullmove = encode_board(board)
+            legal_moves = [move.uci() for move in board.legal_moves]
+            if decode_board(occupied, nibbles, board_flags, ep_file, halfmove, fullmove).fen() != record["board_state"]:
+                extras["board_state"] = record["board_state"]
+            if legal_moves != record.get("legal_moves"):
+                extras["legal_moves"] = record.get("legal_moves")
+
+            chosen_move = record.get("chosen_move")
+            move_index = legal_moves.index(chosen_move) if chosen_move in legal_moves else NO_MOVE
+            if move_index == NO_MOVE:
+                extras["chosen_move"] = chosen_move
+
+            timestamp = _encode_timestamp(record.get("timestamp"))
+            if timestamp is None:
+                timestamp = _NO_TIMESTAMP
+                extras["timestamp"] = record.get("timestamp")
+
+            flags = 0
+            for bit, field in enumerate(_FLAG_FIELDS):
+                if extras.get(field) is True:
+                    flags |= 1 << bit
+                    del extras[field]
+                elif extras.get(field) is False:
+                    flags |= 1 << (bit + 4)
+                    del extras[field]
+
+            model_index = models.setdefault(record.get("model", ""), len(models))
+            ply_records.append(_PLY_RECORD.pack(
+                occupied, nibbles, board_flags, ep_file, halfmove, fullmove,
+                move_index, model_index, 0 if record.get("player") == "White" else 1,
+                float(record.get("thinking_duration", 0.0)), timestamp, flags
+            ))
+            texts.append([record.get("thinking_process"), record.get("raw_response"), extras or None])
+
+        # 模型名稱表與步數
+        header = bytearray(struct.pack("<B", len(models)))
+        for model in models:
+            encoded = model.encode("utf-8")
+            header += struct.pack("<H", len(encoded)) + encoded
+        header += struct.pack("<I", len(records))
+        self._file.write(header)
+        self._file.write(b"".join(ply_records))
+
+        # 文字區塊：先預留偏移表，再寫入壓縮資料
+        blocks = [
+            zlib.compress(json.dumps(texts[i:i + PLIES_PER_BLOCK], ensure_ascii=False).encode("utf-8"), 9)
+            for i in range(0, len(texts), PLIES_PER_BLOCK)
+        ]
+        table_offset = self._file.tell()
+        data_offset = table_offset + _BLOCK_ENTRY.size * len(blocks)
+        entries = []
+        for block in blocks:
+            entries.append(_BLOCK_ENTRY.pack(data_offset, len(block)))
+            data_offset += len(block)
+        self._file.write(b"".join(entries))
+        self._file.write(b"".join(blocks))
+
+        self._index.append((name, offset, len(records)))
+
+    def close(self):
+        """寫入索引與檔尾"""
+        index_offset = self._file.tell()
+        index = bytearray(struct.pack("<I", len(self._index)))
+        for name, offset, plies in self._index:
+            encoded = name.encode("utf-8")
+            index += struct.pack("<H", len(encoded)) + encoded + struct.pack("<QI", offset, plies)
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(index_offset, INDEX_MAGIC))
+        self._file.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    """思考記錄封存檔讀取器，只讀取所需的紀錄與文字區塊"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+
+        magic, version = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是有效的思考記錄封存檔: {path}")
+
+        self._file.seek(-_TRAILER.size, os.SEEK_END)
+        index_offset, index_magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+        if index_magic != INDEX_MAGIC:
+            raise ValueError(f"封存檔索引損毀: {path}")
+
+        self._file.seek(index_offset)
+        self.games: Dict[str, Tuple[int, int]] = {}
+        (count,) = struct.unpack("<I", self._file.read(4))
+        for _ in range(count):
+            (length,) = struct.unpack("<H", self._file.read(2))
+            name = self._file.read(length).decode("utf-8")
+            self.games[name] = struct.unpack("<QI", self._file.read(12))
+
+        self._game_headers: Dict[str, Tuple[List[str], int]] = {}
+
+    def list_games(self) -> List[Tuple[str, int]]:
+        """列出所有對局名稱與步數"""
+        return [(name, plies) for name, (_, plies) in self.games.items()]
+
+    def read_ply(self, game: str, ply: int) -> dict:
+        """讀取指定對局的指定步（從 0 開始）"""
+        offset, plies = self.games[game]
+        if not 0 <= ply < plies:
+            raise IndexError(f"{game} 只有 {plies} 步")
+
+        models, records_offset = self._read_game_header(game)
+        self._file.seek(records_offset + ply * _PLY_RECORD.size)
+        fields = _PLY_RECORD.unpack(self._file.read(_PLY_RECORD.size))
+
+        block_index = ply // PLIES_PER_BLOCK
+        self._file.seek(records_offset + plies * _PLY_RECORD.size + block_index * _BLOCK_ENTRY.size)
+        block_offset, block_length = _BLOCK_ENTRY.unpack(self._file.read(_BLOCK_ENTRY.size))
+        self._file.seek(block_offset)
+        texts = json.loads(zlib.decompress(self._file.read(block_length)).decode("utf-8"))
+
+        return self._build_record(fields, texts[ply % PLIES_PER_BLOCK], models)
+
+    def iter_game(self, game: str) -> Iterator[dict]:
+        """依序讀取整盤對局"""
+        for ply in range(self.games[game][1]):
+            yield self.read_ply(game, ply)
+
+    def _read_game_header(self, game: str) -> Tuple[List[str], int]:
+        """讀取並快取對局的模型名稱表"""
+        if game not in self._game_headers:
+            self._file.seek(self.games[game][0])
+            (model_count,) = struct.unpack("<B", self._file.read(1))
+            models = []
+            for _ in range(model_count):
+                (length,) = struct.unpack("<H", self._file.read(2))
+                models.append(self._file.read(length).decode("utf-8"))
+            self._file.read(4)
+            self._game_headers[game] = (models, self._file.tell())
+        return self._game_headers[game]
+
+    @staticmethod
+    def _build_record(fields: tuple, texts: list, models: List[str]) -> dict:
+        """由固定長度紀錄與文字區塊組回原始思考記錄"""
+        (occupied, nibbles, board_flags, ep_file, halfmove, fullmove,
+         move_index, model_index, player, duration, timestamp, flags) = fields
+        thinking_process, raw_response, extras = texts
+        extras = extras or {}
+
+        board = decode_board(occupied, nibbles, board_flags, ep_file, halfmove, fullmove)
+        legal_moves = [move.uci() for move in board.legal_moves]
+
+        record = {
+            "timestamp": extras.pop("timestamp", None) if timestamp == _NO_TIMESTAMP else _decode_timestamp(timestamp),
+            "model": models[model_index],
+            "player": "White" if player == 0 else "Black",
+            "thinking_duration": duration,
+            "board_state": extras.pop("board_state", board.fen()),
+            "legal_moves": extras.pop("legal_moves", legal_moves),
+            "thinking_process": thinking_process,
+            "chosen_move": legal_moves[move_index] if move_index != NO_MOVE else extras.pop("chosen_move", None),
+            "raw_response": raw_response
+        }
+        for bit, field in enumerate(_FLAG_FIELDS):
+            if flags & (1 << bit):
+                record[field] = True
+            elif flags & (1 << (bit + 4)):
+                record[field] = False
+        record.update(extras)
+        return record
+
+    def close(self):
+        """關閉封存檔"""
+        self._file.close()
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_thinking_log_file(path: str) -> List[dict]:
+    """讀取 JSON 或 JSON Lines 思考記錄檔"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def collect_log_files(paths: List[str]) -> List[str]:
+    """展開目錄為其中的思考記錄檔"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "thinking_logs_*.json*"))))
+        else:
+            files.append(path)
+    return files
+
+
+def pack(archive_path: str, paths: List[str]) -> int:
+    """將思考記錄檔打包為封存檔，每個檔案為一盤對局，回傳對局數"""
+    files = collect_log_files(paths)
+    with ArchiveWriter(archive_path) as writer:
+        for path in files:
+            name = os.path.splitext(os.path.basename(path))[0]
+            writer.add_game(name, load_thinking_log_file(path))
+    return len(files)
+
+
+def unpack(archive_path: str, output_dir: str) -> int:
+    """將封存檔還原為 JSON 思考記錄檔，回傳對局數"""
+    os.makedirs(output_dir, exist_ok=True)
+    with ArchiveReader(archive_path) as reader:
+        for name, _ in reader.list_games():
+            with open(os.path.join(output_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(list(reader.iter_game(name)), f, ensure_ascii=False, indent=2)
+        return len(reader.games)
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="思考記錄封存工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = subparsers.add_parser("pack", help="將思考記錄打包為封存檔")
+    pack_parser.add_argument("archive", help="輸出的封存檔路徑")
+    pack_parser.add_argument("paths", nargs="+", help="思考記錄檔或目錄")
+
+    unpack_parser = subparsers.add_parser("unpack", help="將封存檔還原為 JSON")
+    unpack_parser.add_argument("archive", help="封存檔路徑")
+    unpack_parser.add_argument("output_dir", help="輸出目錄")
+
+    list_parser = subparsers.add_parser("list", help="列出封存檔中的對局")
+    list_parser.add_argument("archive", help="封存檔路徑")
+
+    show_parser = subparsers.add_parser("show", help="顯示指定對局的指定步")
+    show_parser.add_argument("archive", help="封存檔路徑")
+    show_parser.add_argument("game", help="對局名稱")
+    show_parser.add_argument("ply", type=int, help="步數（從 0 開始）")
+
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack(args.archive, args.paths)
+        print(f"已打包 {count} 盤對局: {args.archive} ({os.path.getsize(args.archive):,} bytes)")
+    elif args.command == "unpack":
+        count = unpack(args.archive, args.output_dir)
+        print(f"已還原 {count} 盤對局到 {args.output_dir}")
+    elif args.command == "list":
+        with ArchiveReader(args.archive) as reader:
+            for name, plies in reader.list_games():
+                print(f"  {name}: {plies} 步")
+    elif args.command == "show":
+        with ArchiveReader(args.archive) as reader:
+            print(json.dumps(reader.read_ply(args.game, args.ply), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
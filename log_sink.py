@@ -0,0 +1,163 @@
+import atexit
+import json
+import os
+import queue
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import config
+
+FSYNC_POLICIES = ("never", "batch", "close")
+
+
+class LogWriterThread:
+    """背景寫入執行緒，批次將日誌附加到各自的檔案，避免在對局執行緒中等待磁碟 I/O"""
+
+    def __init__(self,
+                 batch_size: int = config.THINKING_LOG_BATCH_SIZE,
+                 fsync_policy: str = config.THINKING_LOG_FSYNC):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"未知的 fsync 策略: {fsync_policy}")
+
+        self.batch_size = max(1, batch_size)
+        self.fsync_policy = fsync_policy
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="thinking-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, text: str):
+        """排入一筆待寫入的文字"""
+        self._queue.put((path, text))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待目前已排入的內容全部寫入"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _run(self):
+        """寫入迴圈：一次取出一批，依檔案分組後附加寫入"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending: Dict[str, List[str]] = {}
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    # 先寫入排在 flush 之前的內容
+                    self._write(pending)
+                    pending = {}
+                    item.set()
+                else:
+                    path, text = item
+                    pending.setdefault(path, []).append(text)
+            self._write(pending)
+
+    def _write(self, pending: Dict[str, List[str]]):
+        """將分組後的內容附加到檔案"""
+        for path, texts in pending.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(texts))
+                    if self.fsync_policy == "batch":
+                        f.flush()
+                        os.fsync(f.fileno())
+            except Exception as e:
+                print(f"寫入日誌時發生錯誤 ({path}): {e}")
+
+
+_writer: Optional[LogWriterThread] = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> LogWriterThread:
+    """取得行程內共用的背景寫入執行緒"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriterThread()
+            atexit.register(_writer.flush, config.THINKING_TIMEOUT)
+        return _writer
+
+
+class ThinkingLogSink:
+    """
+    單盤對局的思考記錄串流
+
+    每步思考以一行 JSON 附加到該盤專屬的 JSON Lines 檔案，
+    記憶體中只保留最近幾步的環狀緩衝區，多盤同時進行也不會互相干擾。
+    """
+
+    def __init__(self,
+                 jsonl_path: str,
+                 text_log_path: Optional[str] = None,
+                 buffer_size: int = config.THINKING_LOG_BUFFER_SIZE,
+                 writer: Optional[LogWriterThread] = None,
+                 truncate_to: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            jsonl_path: JSON Lines 思考記錄檔案路徑
+            text_log_path: 可讀的文字日誌路徑（None 表示不寫入）
+            buffer_size: 記憶體中保留的最近記錄數
+            writer: 背景寫入執行緒，預設使用行程共用的執行緒
+            truncate_to: 從檢查點繼續時各檔案保留的位元組數（其餘檔案清空）
+        """
+        truncate_to = truncate_to or {}
+        for path in (jsonl_path, text_log_path):
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                if path in truncate_to and os.path.exists(path):
+                    # 捨棄檢查點之後寫入的記錄
+                    with open(path, "r+b") as f:
+                        f.truncate(truncate_to[path])
+                else:
+                    open(path, "w").close()
+
+        self.jsonl_path = jsonl_path
+        self.text_log_path = text_log_path
+        self.buffer_size = buffer_size
+        self.writer = writer or get_log_writer()
+        self.records_written = 0
+
+    def new_buffer(self) -> Deque[dict]:
+        """建立記憶體中的環狀緩衝區"""
+        return deque(maxlen=self.buffer_size)
+
+    def write(self, thinking_log: dict):
+        """排入一筆思考記錄"""
+        self.writer.submit(self.jsonl_path, json.dumps(thinking_log, ensure_ascii=False) + "\n")
+        if self.text_log_path:
+            self.writer.submit(self.text_log_path, format_thinking_log(thinking_log))
+        self.records_written += 1
+
+    def flush(self, timeout: Optional[float] = config.THINKING_TIMEOUT):
+        """等待已排入的記錄全部寫入"""
+        self.writer.flush(timeout)
+
+    def close(self):
+        """寫入剩餘記錄，依 fsync 策略同步到磁碟"""
+        self.flush()
+        if self.writer.fsync_policy == "close":
+            for path in (self.jsonl_path, self.text_log_path):
+                if path:
+                    with open(path, "a", encoding="utf-8") as f:
+                        os.fsync(f.fileno())
+
+
+def format_thinking_log(thinking_log: dict) -> str:
+    """格式化可讀的文字日誌區塊"""
+    return (
+        f"\n{'='*50}\n"
+        f"時間: {thinking_log['timestamp']}\n"
+        f"模型: {thinking_log['model']}\n"
+        f"玩家: {thinking_log['player']}\n"
+        f"思考時間: {thinking_log['thinking_duration']:.2f} 秒\n"
+        f"選擇移動: {thinking_log['chosen_move']}\n"
+        f"\n思考過程:\n{thinking_log['thinking_process']}\n"
+        f"{'='*50}\n"
+    )
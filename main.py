@@ -4,13 +4,22 @@ Chess-LLM 主程式
 使用兩個不同的 LLM 模型進行西洋棋對弈
 """
 
+import argparse
+import json
 import time
 import os
 from datetime import datetime
+from typing import Optional
 from colorama import init, Fore, Style
 
+from checkpoint import (CHECKPOINT_SUFFIX, GameCheckpointer, apply_checkpoint_config, find_checkpoints,
+                        load_checkpoint, log_truncation, restore_chess, restore_rng)
 from chess_core import ChessCore
+from latency import LatencyHistograms, format_latency_stats, start_prometheus_export
 from llm_inference import LLMInferenceCore
+from log_sink import ThinkingLogSink
+from renderer import Renderer, create_renderer
+from usage import UsageTracker, budget_exceeded, format_usage
 import config
 
 # 初始化 colorama
@@ -20,41 +29,107 @@ init()
 class ChessLLMGame:
     """西洋棋 LLM 對弈遊戲主類別"""
     
-    def __init__(self):
-        self.chess = ChessCore()
-        self.llm_core = LLMInferenceCore()
-        self.game_start_time = datetime.now()
-        
-        # 檢查 API 金鑰
-        if not config.OPENROUTER_API_KEY:
+    def __init__(self,
+                 resume_state: Optional[dict] = None,
+                 llm_core: Optional[LLMInferenceCore] = None,
+                 output_dir: str = "",
+                 headless: Optional[bool] = None,
+                 renderer: Optional[Renderer] = None):
+        """
+        Args:
+            resume_state: 要繼續的對局檢查點（None 表示開始新對局）
+            llm_core: 自訂的推理核心（例如重播後端），預設連線到 OpenRouter
+            output_dir: 棋譜與思考記錄的輸出目錄（預設為目前目錄）
+            headless: 無介面模式（每步之間不暫停、不顯示棋盤），預設依設定
+            renderer: 接收對局事件的顯示器（可由多盤對局共用），預設依設定建立
+        """
+        # 檢查 API 金鑰（使用自訂推理核心時不需要）
+        if llm_core is None and not config.OPENROUTER_API_KEY:
             print(f"{Fore.RED}錯誤: 未設定 OPENROUTER_API_KEY 環境變數{Style.RESET_ALL}")
             print("請在 .env 檔案中設定你的 OpenRouter API 金鑰")
             exit(1)
+        
+        self.output_dir = output_dir
+        self.headless = config.HEADLESS if headless is None else headless
+        self.move_delay = 0.0 if self.headless else config.MOVE_DELAY
+        # 終端輸出交給顯示器的背景執行緒，自行建立的顯示器於對局結束時關閉
+        self._owns_renderer = renderer is None
+        self.renderer = renderer if renderer is not None else create_renderer(headless=self.headless)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        self.resume_state = resume_state
+        if resume_state:
+            # 還原中斷時的設定，沿用原本的檔案
+            apply_checkpoint_config(resume_state)
+            self.game_start_time = datetime.fromisoformat(resume_state["started"])
+            self.pgn_filename = resume_state["pgn_file"]
+        else:
+            self.game_start_time = datetime.now()
+            self.pgn_filename = os.path.join(output_dir, f"game_{self.game_start_time.strftime('%Y%m%d_%H%M%S')}.pgn")
+        self.game_name = os.path.splitext(os.path.basename(self.pgn_filename))[0]
+        pgn_stream_path = self.pgn_filename if config.PGN_STREAM_ENABLED else None
+        if resume_state:
+            self.chess = restore_chess(resume_state, pgn_stream_path)
+        else:
+            self.chess = ChessCore(pgn_stream_path=pgn_stream_path)
+        self.llm_core = llm_core if llm_core is not None else LLMInferenceCore()
+        if resume_state:
+            restore_rng(resume_state, getattr(self.llm_core, "rng", None))
+        # 本盤的各階段延遲，同時計入行程內共用的直方圖
+        self.latency = LatencyHistograms(parent=self.llm_core.latency)
+        self.llm_core.latency = self.latency
+        # 本盤的 token 用量與費用，同時計入行程內共用的統計（預算檢查）
+        self.usage = UsageTracker(parent=self.llm_core.usage)
+        self.llm_core.usage = self.usage
+        self.budget_stop: Optional[str] = None
+        
+        # 思考記錄以 JSON Lines 逐步寫入（停用串流時於對局結束後一次寫入同名檔案）
+        thinking_filename = text_log_filename = None
+        if config.THINKING_LOG_STREAMING:
+            if resume_state and resume_state.get("thinking_log_file"):
+                # 沿用檢查點記錄的檔案（原本的輸出目錄與檔名）
+                thinking_filename = resume_state["thinking_log_file"]
+                text_log_filename = resume_state.get("text_log_file")
+            else:
+                thinking_filename = os.path.join(output_dir, f"thinking_logs_{self.game_start_time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+                text_log_filename = config.GAME_LOG_FILE if config.LOG_THINKING_PROCESS else None
+            self.llm_core.attach_log_sink(ThinkingLogSink(
+                thinking_filename, text_log_filename,
+                truncate_to=log_truncation(resume_state, thinking_filename, text_log_filename)
+            ))
+
+        # 每步移動後保存檢查點
+        self.checkpointer: Optional[GameCheckpointer] = None
+        if resume_state:
+            self.checkpointer = GameCheckpointer.from_state(resume_state["path"], resume_state)
+        elif config.CHECKPOINT_ENABLED:
+            game_id = self.game_start_time.strftime('%Y%m%d_%H%M%S')
+            self.checkpointer = GameCheckpointer(
+                os.path.join(config.CHECKPOINT_DIR, f"game_{game_id}{CHECKPOINT_SUFFIX}"),
+                game_id, config.WHITE_MODEL, config.BLACK_MODEL, config.WHITE_PERSONALITY, config.BLACK_PERSONALITY,
+                self.pgn_filename, thinking_filename, text_log_filename, started=self.game_start_time.isoformat()
+            )
+    
+    def emit(self, kind: str, **data):
+        """送出對局事件給顯示器（無介面且未設定顯示器時不做任何事）"""
+        if self.renderer is not None:
+            self.renderer.emit(self.game_name, kind, **data)
+    
+    @property
+    def verbose(self) -> bool:
+        """顯示器是否需要逐步的棋盤與思考過程"""
+        return self.renderer is not None and self.renderer.verbose
     
     def print_header(self):
         """印出遊戲標題"""
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print(f"           西洋棋 LLM 對弈系統")
-        print(f"{'='*60}{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}白棋模型: {config.WHITE_MODEL}")
-        print(f"黑棋模型: {config.BLACK_MODEL}")
-        print(f"遊戲開始時間: {self.game_start_time.strftime('%Y-%m-%d %H:%M:%S')}{Style.RESET_ALL}")
-        print()
+        self.emit("start", white_model=config.WHITE_MODEL, black_model=config.BLACK_MODEL,
+                  start_time=self.game_start_time)
     
     def print_board(self):
         """印出當前棋盤"""
-        print(f"\n{Fore.GREEN}當前棋盤:{Style.RESET_ALL}")
-        print(self.chess.get_board_ascii())
-        
-        analysis = self.chess.get_position_analysis()
-        print(f"\n{Fore.BLUE}局面資訊:{Style.RESET_ALL}")
-        print(f"  輪到: {analysis['turn']}")
-        print(f"  移動次數: {analysis['move_count']}")
-        print(f"  狀態: {analysis['status']}")
-        print(f"  材料平衡: {analysis['material_balance']}")
-        if analysis['is_check']:
-            print(f"  {Fore.RED}將軍!{Style.RESET_ALL}")
-        print()
+        if self.verbose:
+            self.emit("board", ascii=self.chess.get_board_ascii(), analysis=self.chess.get_position_analysis())
     
     def play_turn(self, player_color: str, model_name: str, personality: str) -> bool:
         """
@@ -68,55 +143,64 @@ class ChessLLMGame:
         Returns:
             bool: 是否成功執行移動
         """
-        print(f"{Fore.MAGENTA}{'='*40}")
-        print(f"  {player_color} 的回合 ({model_name})")
-        print(f"{'='*40}{Style.RESET_ALL}")
-        
-        # 獲取當前遊戲狀態
-        board_state = self.chess.get_current_position()
-        ascii_board = self.chess.get_board_ascii()
-        legal_moves = self.chess.get_legal_moves()
-        position_analysis = self.chess.get_position_analysis()
-        
-        print(f"{Fore.YELLOW}正在思考...{Style.RESET_ALL}")
-        
-        # LLM 思考和決定移動
-        move, thinking_process = self.llm_core.think_and_move(
-            model_name=model_name,
-            board_state=board_state,
-            legal_moves=legal_moves,
-            move_history=self.chess.move_history,
-            player_color=player_color,
-            personality=personality,
-            position_analysis=position_analysis
-        )
-        
-        # 顯示思考過程
-        if thinking_process:
-            print(f"\n{Fore.CYAN}思考過程:{Style.RESET_ALL}")
-            print(thinking_process)
-            print()
-        
-        # 執行移動
-        if move and self.chess.make_move(move):
-            print(f"{Fore.GREEN}✓ {player_color} 移動: {move}{Style.RESET_ALL}")
-            return True
-        else:
-            print(f"{Fore.RED}✗ 無效移動: {move}{Style.RESET_ALL}")
-            print(f"合法移動: {', '.join(legal_moves[:5])}{'...' if len(legal_moves) > 5 else ''}")
-            return False
+        with self.latency.time(model_name, "turn"):
+            if self.verbose:
+                self.emit("turn", player=player_color, model=model_name)
+            
+            # 獲取當前遊戲狀態
+            board_state = self.chess.get_current_position()
+            legal_moves = self.chess.get_legal_moves()
+            position_analysis = self.chess.get_position_analysis()
+            
+            # LLM 思考和決定移動
+            with self.latency.time(model_name, "think"):
+                move, thinking_process = self.llm_core.think_and_move(
+                    model_name=model_name,
+                    board_state=board_state,
+                    legal_moves=legal_moves,
+                    move_history=self.chess.move_history,
+                    player_color=player_color,
+                    personality=personality,
+                    position_analysis=position_analysis
+                )
+            
+            # 顯示思考過程
+            if thinking_process and self.verbose:
+                self.emit("thinking", text=thinking_process)
+            
+            # 執行移動
+            with self.latency.time(model_name, "apply"):
+                applied = bool(move) and self.chess.make_move(move)
+            if applied:
+                self.emit("move", player=player_color, move=move, ply=self.chess.get_move_count())
+                if self.checkpointer:
+                    with self.latency.time(model_name, "checkpoint"):
+                        self.checkpointer.save(self.chess, self.llm_core.log_sink, rng=getattr(self.llm_core, "rng", None))
+                return True
+            else:
+                self.emit("invalid", player=player_color, move=move, legal_moves=legal_moves)
+                return False
     
     def run_game(self):
         """執行完整的遊戲"""
         self.print_header()
         
-        # 清空日誌檔案
-        if os.path.exists(config.GAME_LOG_FILE):
+        # 清空日誌檔案（繼續對局時保留先前的內容）
+        if self.resume_state:
+            self.emit("message", color=Fore.YELLOW,
+                      text=f"從檢查點繼續: {self.resume_state['path']}（已進行 {self.chess.get_move_count()} 步）")
+        elif os.path.exists(config.GAME_LOG_FILE):
             open(config.GAME_LOG_FILE, 'w').close()
         
-        move_count = 0
+        move_count = self.chess.get_move_count()
         
         while not self.chess.is_game_over() and move_count < config.MAX_MOVES:
+            # 達到用量預算時停止，檢查點保留為未完成，之後可繼續
+            self.budget_stop = budget_exceeded()
+            if self.budget_stop:
+                self.emit("message", color=Fore.YELLOW, text=f"{self.budget_stop}，停止對局")
+                break
+            
             self.print_board()
             
             current_player = self.chess.get_current_player()
@@ -129,70 +213,122 @@ class ChessLLMGame:
                 success = self.play_turn("Black", config.BLACK_MODEL, config.BLACK_PERSONALITY)
             
             if not success:
-                print(f"{Fore.RED}移動失敗，遊戲結束{Style.RESET_ALL}")
+                self.emit("message", color=Fore.RED, text="移動失敗，遊戲結束")
                 break
             
             move_count += 1
             
-            # 短暫暫停，讓輸出更易讀
-            time.sleep(0.1)
+            # 短暫暫停，讓輸出更易讀（無介面模式不暫停）
+            if self.move_delay:
+                time.sleep(self.move_delay)
         
-        # 遊戲結束
-        self.print_game_result()
-        self.save_game_data()
+        # 遊戲結束，等待背景串流讀完以保存完整的思考記錄
+        self.llm_core.wait_for_background_streams()
+        try:
+            self.print_game_result()
+            self.save_game_data()
+        finally:
+            if self._owns_renderer and self.renderer is not None:
+                self.renderer.close()
     
     def print_game_result(self):
         """印出遊戲結果"""
         self.print_board()
-        
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print(f"                遊戲結束")
-        print(f"{'='*60}{Style.RESET_ALL}")
-        
-        result = self.chess.get_game_result()
-        status = self.chess.get_game_status()
-        
-        print(f"{Fore.YELLOW}結果: {result}")
-        print(f"狀態: {status}")
-        print(f"總移動數: {self.chess.get_move_count()}")
-        
-        game_duration = datetime.now() - self.game_start_time
-        print(f"遊戲時長: {game_duration}{Style.RESET_ALL}")
-        
-        # 顯示 PGN
-        print(f"\n{Fore.GREEN}PGN 記錄:{Style.RESET_ALL}")
-        print(self.chess.export_pgn())
+        self.emit("end", result=self.chess.get_game_result(), status=self.chess.get_game_status(),
+                  move_count=self.chess.get_move_count(), duration=datetime.now() - self.game_start_time,
+                  pgn=self.chess.export_pgn() if self.verbose else None)
     
     def save_game_data(self):
         """保存遊戲資料"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # 保存 PGN
-        pgn_filename = f"game_{timestamp}.pgn"
-        with open(pgn_filename, "w", encoding="utf-8") as f:
-            f.write(self.chess.export_pgn())
+        # 保存 PGN（串流模式下棋譜已逐步寫入，此處補上最終結果）
+        pgn_filename = self.pgn_filename
+        if config.PGN_STREAM_ENABLED:
+            self.chess.finalize_pgn()
+        else:
+            with open(pgn_filename, "w", encoding="utf-8") as f:
+                f.write(self.chess.export_pgn())
         
-        # 保存思考記錄
-        thinking_filename = f"thinking_logs_{timestamp}.json"
+        # 保存思考記錄（兩種模式都是 JSON Lines，串流模式下已逐步寫入）
+        if self.llm_core.log_sink is not None:
+            thinking_filename = self.llm_core.log_sink.jsonl_path
+        else:
+            thinking_filename = os.path.join(
+                self.output_dir, f"thinking_logs_{self.game_start_time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+            )
         self.llm_core.save_thinking_logs(thinking_filename)
         
-        print(f"\n{Fore.GREEN}遊戲資料已保存:")
-        print(f"  PGN 檔案: {pgn_filename}")
-        print(f"  思考記錄: {thinking_filename}")
-        print(f"  遊戲日誌: {config.GAME_LOG_FILE}{Style.RESET_ALL}")
+        # 保存 token 用量與費用（依模型與執行方）
+        usage = self.usage.get_stats()
+        usage_filename = os.path.splitext(pgn_filename)[0] + "_usage.json"
+        with open(usage_filename, "w", encoding="utf-8") as f:
+            json.dump(usage, f, ensure_ascii=False, indent=2)
+        if self.checkpointer:
+            self.checkpointer.save(self.chess, self.llm_core.log_sink, finished=not self.budget_stop, game_result={
+                "result": self.chess.get_game_result(),
+                "status": self.chess.get_game_status(),
+                "move_count": self.chess.get_move_count(),
+                "pgn_file": pgn_filename,
+                "thinking_log_file": thinking_filename,
+                "usage_file": usage_filename,
+                "latency": self.latency.get_stats()
+            }, rng=getattr(self.llm_core, "rng", None))
+        
+        self.emit("message", color=Fore.GREEN,
+                  text=f"\n遊戲資料已保存:\n  PGN 檔案: {pgn_filename}\n  思考記錄: {thinking_filename}\n"
+                       f"  用量統計: {usage_filename}\n  遊戲日誌: {config.GAME_LOG_FILE}")
+        self.emit("message", color=Fore.BLUE, text="用量: " + format_usage(usage["total"]) + "".join(
+            f"\n  {color}: " + format_usage(row) for color, row in usage["colors"].items()
+        ))
+        latency_lines = format_latency_stats(self.latency.get_stats())
+        if latency_lines:
+            self.emit("message", color=Fore.BLUE,
+                      text="各階段延遲 (p50/p90):\n" + "\n".join(f"  {line}" for line in latency_lines))
+
+
+def run(game: ChessLLMGame):
+    """執行對局；沒有顯示器時只在結束後印出一行結果"""
+    game.run_game()
+    if game.renderer is None:
+        print(f"{game.game_name}: {game.chess.get_game_result()} ({game.chess.get_game_status()}), "
+              f"{game.chess.get_move_count()} 步, {datetime.now() - game.game_start_time}")
 
 
 def main():
     """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 對弈")
+    parser.add_argument("--resume", nargs="?", const=config.CHECKPOINT_DIR, default=None, metavar="PATH",
+                        help="從檢查點繼續對局（檔案，或目錄中所有未完成的對局）")
+    parser.add_argument("--headless", action="store_true", default=config.HEADLESS,
+                        help="無介面模式：每步之間不暫停，不顯示棋盤與思考過程")
+    parser.add_argument("--renderer", choices=["console", "progress", "none"], default=None,
+                        help="進度顯示方式（預設依設定，無介面模式下不使用 console）")
+    args = parser.parse_args()
+    config.HEADLESS = args.headless
+    if args.renderer:
+        config.RENDERER = args.renderer
+
+    # 定期將各階段延遲直方圖匯出為 Prometheus 文字檔
+    exporter = start_prometheus_export()
     try:
-        game = ChessLLMGame()
-        game.run_game()
+        if args.resume is None:
+            run(ChessLLMGame())
+        elif os.path.isdir(args.resume):
+            states = find_checkpoints(args.resume, unfinished_only=True)
+            if not states:
+                print(f"{Fore.YELLOW}{args.resume} 中沒有未完成的對局{Style.RESET_ALL}")
+            for state in states:
+                run(ChessLLMGame(resume_state=state))
+        else:
+            run(ChessLLMGame(resume_state=load_checkpoint(args.resume)))
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}遊戲被使用者中斷{Style.RESET_ALL}")
     except Exception as e:
         print(f"\n{Fore.RED}發生錯誤: {e}{Style.RESET_ALL}")
         import traceback
         traceback.print_exc()
+    finally:
+        if exporter is not None:
+            exporter.stop()
 
 
 if __name__ == "__main__":
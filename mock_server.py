@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+本機 OpenAI 相容的模擬 chat-completions 伺服器
+將 OPENROUTER_BASE_URL 指向此伺服器，即可在不花費 API 費用的情況下對完整推理流程做負載測試
+"""
+
+import argparse
+import collections
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Optional
+
+from local_backend import MOVE_POLICIES, answer_prompt
+from prompt_lib import count_tokens
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "pareto")
+STREAM_CHUNK_SIZE = 16
+
+
+class LatencyModel:
+    """回應延遲分佈，lognormal 與 pareto 具有長尾"""
+
+    def __init__(self,
+                 distribution: str = "lognormal",
+                 median: float = 0.0,
+                 sigma: float = 1.0,
+                 max_latency: float = 60.0):
+        """
+        Args:
+            distribution: "fixed"、"uniform"（0 到 2 倍中位數）、"lognormal" 或 "pareto"
+            median: 延遲中位數（秒）
+            sigma: lognormal 的對數標準差，或 pareto 的形狀參數（越小尾巴越長）
+            max_latency: 延遲上限（秒）
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延遲分佈: {distribution}")
+        self.distribution = distribution
+        self.median = max(0.0, median)
+        self.sigma = sigma
+        self.max_latency = max_latency
+
+    def sample(self, rng: random.Random) -> float:
+        """抽樣一次延遲"""
+        if self.median <= 0:
+            return 0.0
+        if self.distribution == "fixed":
+            latency = self.median
+        elif self.distribution == "uniform":
+            latency = rng.uniform(0, 2 * self.median)
+        elif self.distribution == "lognormal":
+            latency = rng.lognormvariate(math.log(self.median), self.sigma)
+        else:
+            # Pareto 的中位數為 scale * 2^(1/alpha)
+            alpha = max(self.sigma, 0.1)
+            latency = self.median / 2 ** (1 / alpha) * rng.paretovariate(alpha)
+        return min(latency, self.max_latency)
+
+
+class MockChatServer:
+    """模擬 chat-completions 伺服器，可注入錯誤、速率限制與格式錯誤的回應"""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8000,
+                 policy: str = "greedy",
+                 latency: Optional[LatencyModel] = None,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 malformed_rate: float = 0.0,
+                 rpm: int = 0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            host: 監聽位址
+            port: 監聽埠號（0 表示自動選擇）
+            policy: 移動策略名稱（見 local_backend.MOVE_POLICIES）
+            latency: 回應延遲分佈
+            error_rate: 回傳 500 錯誤的比例
+            rate_limit_rate: 隨機回傳 429 的比例
+            malformed_rate: 回傳無法解析的 JSON 內容的比例
+            rpm: 每分鐘請求數上限，超過時回傳 429（0 表示不限制）
+            seed: 隨機種子
+        """
+        if policy not in MOVE_POLICIES:
+            raise ValueError(f"未知的移動策略: {policy}")
+        self.policy = MOVE_POLICIES[policy]
+        self.latency = latency or LatencyModel(median=0.0)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.rpm = rpm
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_times: Deque[float] = collections.deque()
+        self.stats: Dict[str, int] = collections.Counter()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """可設定為 OPENROUTER_BASE_URL 的位址"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockChatServer":
+        """在背景執行緒中啟動伺服器"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-chat-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止伺服器"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def _count(self, name: str):
+        """累計統計（多個處理執行緒共用）"""
+        with self._lock:
+            self.stats[name] += 1
+
+    def _draw(self) -> Dict[str, float]:
+        """為一次請求抽樣延遲與注入的錯誤（共用亂數產生器需加鎖）"""
+        with self._lock:
+            return {
+                "latency": self.latency.sample(self._rng),
+                "error": self._rng.random() < self.error_rate,
+                "rate_limited": self._rng.random() < self.rate_limit_rate,
+                "malformed": self._rng.random() < self.malformed_rate
+            }
+
+    def _check_rpm(self) -> Optional[float]:
+        """滑動視窗的每分鐘請求數限制，超過時回傳需等待的秒數"""
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            while self._request_times and now - self._request_times[0] >= 60.0:
+                self._request_times.popleft()
+            if len(self._request_times) >= self.rpm:
+                return 60.0 - (now - self._request_times[0])
+            self._request_times.append(now)
+        return None
+
+    def _rate_limit_headers(self, retry_after: float) -> Dict[str, str]:
+        """與 OpenAI / OpenRouter 相同名稱的速率限制標頭"""
+        with self._lock:
+            remaining = max(0, self.rpm - len(self._request_times)) if self.rpm else 0
+        return {
+            "retry-after": f"{max(retry_after, 0.0):.3f}",
+            "x-ratelimit-limit-requests": str(self.rpm or 0),
+            "x-ratelimit-remaining-requests": str(remaining),
+            "x-ratelimit-reset-requests": f"{max(retry_after, 0.0):.3f}s"
+        }
+
+    def _complete(self, request: dict, malformed: bool) -> dict:
+        """產生 chat.completion 回應"""
+        messages = request.get("messages") or []
+        prompt = messages[-1].get("content", "") if messages else ""
+        with self._lock:
+            content = answer_prompt(prompt, self.policy, self._rng)
+        if malformed:
+            # 截斷 JSON，模擬模型輸出不完整
+            content = content[:max(1, len(content) // 2)]
+
+        prompt_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+        completion_tokens = count_tokens(content)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _make_handler(self):
+        """建立綁定此伺服器設定的請求處理類別"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_error(self, status: int, message: str, error_type: str,
+                            headers: Optional[Dict[str, str]] = None):
+                self._send_json(status, {"error": {"message": message, "type": error_type, "code": status}}, headers)
+
+            def _send_stream(self, completion: dict):
+                """以 SSE 格式分段送出回應"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                content = completion["choices"][0]["message"]["content"]
+                base = {key: completion[key] for key in ("id", "created", "model")}
+                pieces = [content[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(content), STREAM_CHUNK_SIZE)]
+                try:
+                    for index, piece in enumerate(pieces):
+                        delta = {"content": piece}
+                        if index == 0:
+                            delta["role"] = "assistant"
+                        chunk = dict(base, object="chat.completion.chunk",
+                                     choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    final = dict(base, object="chat.completion.chunk",
+                                 choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                    self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                except (BrokenPipeError, ConnectionResetError):
+                    # 用戶端提前中止串流
+                    server._count("stream_aborted")
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+                elif self.path.rstrip("/").endswith("/stats"):
+                    with server._lock:
+                        stats = dict(server.stats)
+                    self._send_json(200, stats)
+                else:
+                    self._send_error(404, f"Unknown path: {self.path}", "not_found")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_error(404, f"Unknown path: {self.path}", "not_found")
+                    return
+                try:
+                    request = json.loads(body or b"{}")
+                except json.JSONDecodeError:
+                    self._send_error(400, "Request body is not valid JSON", "invalid_request_error")
+                    return
+
+                server._count("requests")
+                retry_after = server._check_rpm()
+                if retry_after is not None:
+                    server._count("rate_limited")
+                    self._send_error(429, "Rate limit exceeded", "rate_limit_error",
+                                     server._rate_limit_headers(retry_after))
+                    return
+
+                draw = server._draw()
+                if draw["latency"]:
+                    time.sleep(draw["latency"])
+
+                if draw["rate_limited"]:
+                    server._count("rate_limited")
+                    self._send_error(429, "Rate limit exceeded (injected)", "rate_limit_error",
+                                     server._rate_limit_headers(1.0))
+                elif draw["error"]:
+                    server._count("errors")
+                    self._send_error(500, "Internal server error (injected)", "server_error")
+                else:
+                    if draw["malformed"]:
+                        server._count("malformed")
+                    completion = server._complete(request, draw["malformed"])
+                    server._count("completions")
+                    if request.get("stream"):
+                        self._send_stream(completion)
+                    else:
+                        self._send_json(200, completion)
+
+        return Handler
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="本機 OpenAI 相容的模擬 chat-completions 伺服器")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址")
+    parser.add_argument("--port", type=int, default=8000, help="監聽埠號")
+    parser.add_argument("--policy", choices=sorted(MOVE_POLICIES), default="greedy", help="移動策略")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="延遲分佈")
+    parser.add_argument("--latency-median", type=float, default=0.0, help="延遲中位數（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=1.0,
+                        help="lognormal 的對數標準差，或 pareto 的形狀參數")
+    parser.add_argument("--latency-max", type=float, default=60.0, help="延遲上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳 500 錯誤的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="隨機回傳 429 的比例")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="回傳格式錯誤 JSON 的比例")
+    parser.add_argument("--rpm", type=int, default=0, help="每分鐘請求數上限（0 表示不限制）")
+    parser.add_argument("--seed", type=int, default=None, help="隨機種子")
+    args = parser.parse_args()
+
+    server = MockChatServer(
+        host=args.host,
+        port=args.port,
+        policy=args.policy,
+        latency=LatencyModel(args.latency, args.latency_median, args.latency_sigma, args.latency_max),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        rpm=args.rpm,
+        seed=args.seed
+    )
+    print(f"模擬伺服器已啟動: {server.base_url}")
+    print(f"設定 OPENROUTER_BASE_URL={server.base_url} 與任意 OPENROUTER_API_KEY 即可使用")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n模擬伺服器已停止")
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import chess
+
+from stream_parser import extract_json_strings
+
+REPAIR_TYPES = ("uci", "promotion", "lan", "san", "json_fragment", "scan", "reprompt", "failed")
+
+# 起訖格之間可能夾雜 -、x、: 或空白，升變可能寫成 =Q
+_UCI_VARIANT = re.compile(r"([a-h][1-8])\s*[-x:]?\s*([a-h][1-8])\s*=?\s*([qrbn])?[+#!?]*", re.IGNORECASE)
+_LAN = re.compile(r"([KQRBN])([a-h][1-8])\s*[-x:]?\s*([a-h][1-8])(?:=?([QRBN]))?[+#!?]*")
+_TOKEN = re.compile(r"[A-Za-z0-9=+#\-]+")
+_CHOICE_KEYWORDS = re.compile(r"chosen[_ ]move|i (?:will )?(?:choose|play)|best move|final move|my move", re.IGNORECASE)
+
+
+def normalize_move(text: str, board: chess.Board) -> Optional[Tuple[str, str]]:
+    """
+    將 SAN、LAN 或格式不標準的 UCI 轉換為合法的 UCI 移動
+
+    Returns:
+        Optional[Tuple[str, str]]: (UCI 移動, 修復類型)，無法對應到合法移動時為 None
+    """
+    text = (text or "").strip().strip("\"'`.,;:()[]{}")
+    if not text:
+        return None
+
+    match = _UCI_VARIANT.fullmatch(text)
+    if match:
+        origin, target, promotion = (group.lower() if group else "" for group in match.groups())
+        candidate = _legal_uci(board, origin + target + promotion)
+        if candidate:
+            return candidate, "uci"
+        # 多餘的升變字尾，或缺少升變字尾（預設升后）
+        for fixed in (origin + target, origin + target + "q"):
+            candidate = _legal_uci(board, fixed)
+            if candidate:
+                return candidate, "promotion"
+
+    match = _LAN.fullmatch(text)
+    if match:
+        piece, origin, target, promotion = match.groups()
+        candidate = _legal_uci(board, origin + target + (promotion or "").lower())
+        if candidate and board.piece_at(chess.parse_square(origin)).symbol().upper() == piece:
+            return candidate, "lan"
+
+    san = text.replace("0-0-0", "O-O-O").replace("0-0", "O-O")
+    try:
+        return board.parse_san(san).uci(), "san"
+    except ValueError:
+        return None
+
+
+def _legal_uci(board: chess.Board, uci: str) -> Optional[str]:
+    """UCI 字串若為合法移動則回傳標準形式（王車易位的王吃車寫法也會轉換）"""
+    try:
+        return board.parse_uci(uci).uci()
+    except ValueError:
+        return None
+
+
+def scan_response(raw_response: str, board: chess.Board) -> Optional[Tuple[str, str]]:
+    """
+    從原始回應中尋找合法移動
+
+    先找不完整 JSON 中的 chosen_move 片段；其次取「選擇」等關鍵字之後第一個合法移動；
+    全文只提到一個合法移動時採用它。都不符合時回傳 None，以免誤選分析中提到的其他移動。
+    """
+    for fragment in reversed(extract_json_strings(raw_response, "chosen_move")):
+        normalized = normalize_move(fragment, board)
+        if normalized:
+            return normalized[0], "json_fragment"
+
+    keyword = None
+    for keyword in _CHOICE_KEYWORDS.finditer(raw_response):
+        pass
+    if keyword:
+        for token in _TOKEN.findall(raw_response[keyword.end():]):
+            normalized = normalize_move(token, board)
+            if normalized:
+                return normalized[0], "scan"
+
+    mentioned = []
+    for token in _TOKEN.findall(raw_response):
+        normalized = normalize_move(token, board)
+        if normalized and normalized[0] not in mentioned:
+            mentioned.append(normalized[0])
+    if len(mentioned) == 1:
+        return mentioned[0], "scan"
+    return None
+
+
+def repair_move(move: str, raw_response: str, board_state: str, legal_moves: List[str]) -> Tuple[str, Optional[str]]:
+    """
+    在執行移動前修復非法或無法解析的移動（不需呼叫 API）
+
+    Returns:
+        Tuple[str, Optional[str]]: (修復後的移動, 修復類型)；不需修復時類型為 None，
+        無法修復時回傳原本的移動與 "failed"
+    """
+    if move in legal_moves:
+        return move, None
+
+    board = chess.Board(board_state)
+    repaired = normalize_move(move, board) if move else None
+    if repaired is None and raw_response:
+        repaired = scan_response(raw_response, board)
+    if repaired is None or repaired[0] not in legal_moves:
+        return move, "failed"
+    return repaired
+
+
+class MoveRepairStats:
+    """各模型的移動修復次數（依修復類型），所有對局共用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Counter] = {}
+
+    def record(self, model_name: str, repair_type: str):
+        """記錄一次修復"""
+        with self._lock:
+            self._counts.setdefault(model_name, Counter())[repair_type] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """獲取各模型各類型的修復次數"""
+        with self._lock:
+            return {model: dict(counts) for model, counts in self._counts.items()}
+
+
+_repair_stats = MoveRepairStats()
+
+
+def get_repair_stats() -> MoveRepairStats:
+    """取得行程內共用的修復統計"""
+    return _repair_stats
@@ -0,0 +1,109 @@
+import io
+import os
+from typing import Dict, List, Optional
+
+import chess
+
+import config
+
+
+class IncrementalPgnWriter:
+    """
+    增量 PGN 建構器
+
+    每步移動只在 make_move 時附加一次 SAN，匯出時不需重播整盤棋。
+    格式與 str(chess.pgn.Game) 相同（七標籤標頭、單行棋譜）。
+    設定 stream_path 時，每步移動會立即附加寫入磁碟，程式中斷也不會遺失棋譜。
+    """
+
+    def __init__(self,
+                 headers: Dict[str, str],
+                 stream_path: Optional[str] = None,
+                 fsync: bool = config.PGN_STREAM_FSYNC):
+        self.headers = dict(headers)
+        self.headers.setdefault("Result", "*")
+        self.stream_path = stream_path
+        self.fsync = fsync
+
+        self._tokens: List[str] = []
+        self._force_move_number = True
+        self._stream = None
+
+        if stream_path:
+            os.makedirs(os.path.dirname(stream_path) or ".", exist_ok=True)
+            self._stream = open(stream_path, "w", encoding="utf-8")
+            self._stream.write(self._format_headers("*"))
+            self._flush_stream()
+
+    def add_move(self, board: chess.Board, move: chess.Move):
+        """
+        附加一步移動（必須在 board.push(move) 之前呼叫）
+
+        Args:
+            board: 移動前的棋盤
+            move: 即將執行的移動
+        """
+        if board.turn == chess.WHITE:
+            token = f"{board.fullmove_number}. {board.san(move)} "
+        elif self._force_move_number:
+            token = f"{board.fullmove_number}... {board.san(move)} "
+        else:
+            token = f"{board.san(move)} "
+        self._force_move_number = False
+        self._tokens.append(token)
+
+        if self._stream:
+            self._stream.write(token)
+            self._flush_stream()
+
+    def export(self, result: str = "*") -> str:
+        """匯出完整 PGN 字串"""
+        return self._format_headers(result) + "".join(self._tokens) + result
+
+    def to_game(self, result: str = "*") -> "chess.pgn.Game":
+        """轉換為 chess.pgn.Game 物件（chess.pgn 會連帶載入 chess.engine，只在需要時匯入）"""
+        import chess.pgn
+        return chess.pgn.read_game(io.StringIO(self.export(result)))
+
+    def finalize(self, result: str) -> str:
+        """
+        寫入最終結果；串流模式下以原子替換的方式覆寫完整 PGN 檔案
+
+        Returns:
+            str: 完整 PGN 字串
+        """
+        pgn = self.export(result)
+        if self.stream_path:
+            self.close()
+            temp_path = f"{self.stream_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(pgn)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.stream_path)
+        return pgn
+
+    def copy(self) -> "IncrementalPgnWriter":
+        """複製目前的棋譜（不含磁碟串流）"""
+        clone = IncrementalPgnWriter(self.headers)
+        clone._tokens = list(self._tokens)
+        clone._force_move_number = self._force_move_number
+        return clone
+
+    def close(self):
+        """關閉磁碟串流"""
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+    def _format_headers(self, result: str) -> str:
+        """格式化標頭"""
+        headers = dict(self.headers, Result=result)
+        lines = [f'[{name} "{value}"]' for name, value in headers.items()]
+        return "\n".join(lines) + "\n\n"
+
+    def _flush_stream(self):
+        """將串流內容寫入磁碟"""
+        self._stream.flush()
+        if self.fsync:
+            os.fsync(self._stream.fileno())
@@ -0,0 +1,179 @@
+import asyncio
+import copy
+from typing import Dict, List, Optional, Tuple
+
+import chess
+
+from chess_core import ChessCore
+from llm_inference import AsyncLLMInferenceCore, prompt_move_encoding
+from prompt_lib import decode_move
+from stream_parser import extract_json_strings
+import config
+
+
+class Ponderer:
+    """
+    推測思考：己方走完後，在對手思考期間預先計算己方對其可能回應的下一步
+
+    對手的可能回應取自對手上一次回應中仍然合法的 candidate_moves，
+    不足時以將軍與吃子等強制性移動補足。對手實際走出的移動命中推測時，
+    直接採用預先計算的結果，省去一次完整的 LLM 往返。
+    """
+
+    def __init__(self,
+                 llm_core: AsyncLLMInferenceCore,
+                 max_replies: int = config.PONDER_MAX_REPLIES,
+                 budget: int = config.PONDER_BUDGET):
+        self.llm_core = llm_core
+        self.max_replies = max_replies
+        self.budget = budget
+
+        # 玩家顏色 -> {推測局面 FEN -> 推測工作}
+        self._pending: Dict[str, Dict[str, asyncio.Task]] = {"White": {}, "Black": {}}
+
+        self.speculative_calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    def predict_replies(self, board: chess.Board, opponent_candidates: List[str]) -> List[str]:
+        """預測對手最可能的回應"""
+        legal_moves = {move.uci(): move for move in board.legal_moves}
+
+        predicted: List[str] = []
+        for move in opponent_candidates:
+            if move in legal_moves and move not in predicted:
+                predicted.append(move)
+
+        if len(predicted) < self.max_replies:
+            # 強制性移動：將軍優先，其次依被吃棋子價值排序
+            forcing = []
+            for uci, move in legal_moves.items():
+                if uci in predicted:
+                    continue
+                gives_check = board.gives_check(move)
+                captured = board.piece_type_at(move.to_square) or (chess.PAWN if board.is_en_passant(move) else 0)
+                if gives_check or captured:
+                    forcing.append((gives_check, captured, uci))
+            forcing.sort(reverse=True)
+            predicted.extend(uci for _, _, uci in forcing)
+
+        return predicted[:self.max_replies]
+
+    def start(self, chess_core: ChessCore, player_color: str, model_name: str, personality: str):
+        """
+        己方走完後開始推測
+
+        Args:
+            chess_core: 己方走完後的遊戲狀態（輪到對手）
+            player_color: 己方顏色
+            model_name: 己方模型
+            personality: 己方個性
+        """
+        opponent_color = "Black" if player_color == "White" else "White"
+        opponent_candidates = self._last_candidates(opponent_color)
+
+        for reply in self.predict_replies(chess_core.board, opponent_candidates):
+            if self.speculative_calls >= self.budget:
+                break
+
+            speculative = chess_core.copy()
+            if not speculative.make_move(reply) or speculative.is_game_over():
+                continue
+
+            fen = speculative.get_current_position()
+            if fen in self._pending[player_color]:
+                continue
+
+            request = dict(
+                model_name=model_name,
+                board_state=fen,
+                legal_moves=speculative.get_legal_moves(),
+                move_history=list(speculative.move_history),
+                player_color=player_color,
+                personality=personality,
+                position_analysis=speculative.get_position_analysis()
+            )
+            self._pending[player_color][fen] = asyncio.create_task(self._speculate(request))
+            self.speculative_calls += 1
+
+    async def take(self, player_color: str, fen: str) -> Optional[Tuple[str, str]]:
+        """
+        取得目前局面的推測結果，並取消該方其他未命中的推測
+
+        Returns:
+            Optional[Tuple[str, str]]: 命中時為 (選擇的移動, 思考過程)，否則為 None
+        """
+        pending = self._pending[player_color]
+        if not pending:
+            return None
+
+        task = pending.pop(fen, None)
+        self._cancel(player_color)
+
+        if task is None:
+            self.misses += 1
+            return None
+
+        try:
+            move, thinking_process, thinking_log = await task
+        except Exception:
+            thinking_log = None
+
+        # 推理錯誤回退的結果不採用
+        if thinking_log is None or thinking_log.get("fallback"):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        thinking_log["pondered"] = True
+        self.llm_core.thinking_logs.append(thinking_log)
+        self.llm_core._write_thinking_log_file(thinking_log)
+        return move, thinking_process
+
+    async def _speculate(self, request: dict) -> Tuple[str, str, Optional[dict]]:
+        """執行一次推測推理，使用獨立記錄的推理核心副本，結果被採用前不寫入日誌檔"""
+        core = copy.copy(self.llm_core)
+        core.thinking_logs = []
+        core._background_streams = []
+        core.log_to_file = False
+        move, thinking_process = await core.think_and_move(**request)
+        thinking_log = core.thinking_logs[-1] if core.thinking_logs else None
+        return move, thinking_process, thinking_log
+
+    def _last_candidates(self, player_color: str) -> List[str]:
+        """取得該方最近一次回應中的候選移動，依提示詞的移動編碼在當時的局面轉回 UCI"""
+        move_encoding = prompt_move_encoding()
+        for thinking_log in reversed(self.llm_core.thinking_logs):
+            if thinking_log.get("player") == player_color:
+                board_state = thinking_log.get("board_state")
+                legal_moves = thinking_log.get("legal_moves") or []
+                return [
+                    decode_move(move, board_state, legal_moves, move_encoding)
+                    for move in extract_json_strings(thinking_log.get("raw_response") or "", "move")
+                ]
+        return []
+
+    def _cancel(self, player_color: str):
+        """取消該方所有未完成的推測"""
+        for task in self._pending[player_color].values():
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+        self._pending[player_color].clear()
+
+    def cancel_all(self):
+        """取消所有推測（對局結束時呼叫）"""
+        for player_color in self._pending:
+            self._cancel(player_color)
+
+    def get_stats(self) -> dict:
+        """獲取推測統計"""
+        lookups = self.hits + self.misses
+        return {
+            "speculative_calls": self.speculative_calls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -1,3 +1,5 @@
+import chess
+
 RESPONSE_FORMAT_THINK = """
 **Please respond in the following format (must be valid JSON):**
 ```json
@@ -22,4 +24,223 @@ RESPONSE_FORMAT_WITHOUT_THINK = """
     "chosen_move": "UCI format of the chosen move"
 }}
 ```
-"""
\ No newline at end of file
+"""
+
+# 精簡版面：靜態指示放在最前面，每次呼叫都逐位元組相同，方便供應商的前綴快取命中
+LEAN_INSTRUCTIONS = """You are choosing the next move in a chess game.
+Analyze the position given after "Position:" and choose the best move from the legal moves listed there.
+{move_format}
+{response_format}
+The chosen move must be one of the listed legal moves.
+"""
+
+LEAN_RESPONSE_FORMAT_THINK = """Respond with valid JSON only:
+{"analysis": "threats, opportunities and strategic considerations", "candidate_moves": [{"move": "<move>", "evaluation": "<reasoning>"}], "chosen_move": "<move>", "reasoning": "<why this move>"}
+List at most 3 candidate moves, all legal."""
+
+LEAN_RESPONSE_FORMAT_WITHOUT_THINK = """Respond with valid JSON only:
+{"chosen_move": "<move>"}"""
+
+MOVE_FORMATS = {
+    "uci": "Legal moves are listed in UCI format (e.g. e2e4, e7e8q). Answer moves in UCI format.",
+    "grouped": ("Legal moves are grouped by origin square (e.g. \"g1:f3,h3\" means g1f3 and g1h3). "
+                "Answer moves in UCI format."),
+    "san": "Legal moves are listed in SAN (e.g. e4, Nf3, O-O, exd8=Q+). Answer moves exactly as written in the list."
+}
+
+LEAN_POSITION = """
+Position:
+side: {player_color}
+fen: {board_state}
+move: {move_count}
+status: {status}
+check: {is_check}
+material: {material_balance} (positive = White ahead)
+legal: {legal_moves}
+"""
+
+MOVE_ENCODINGS = tuple(MOVE_FORMATS)
+
+# 批次版面：一次請求多個互不相關的局面，回應以局面 ID 為鍵
+BATCH_INSTRUCTIONS = """You are choosing the next move in several independent chess positions.
+Each position below is given with its id in brackets, the side to move, its FEN and its legal moves.
+{move_format}
+Respond with valid JSON only, with exactly one entry per position id:
+{{"<id>": {{"chosen_move": "<move>", "reasoning": "<one sentence>"}}}}
+Each chosen move must be one of the legal moves of that position.
+"""
+
+BATCH_POSITION = """
+[{position_id}]
+side: {player_color}
+fen: {board_state}
+legal: {legal_moves}
+"""
+
+REPAIR_PROMPT = """Your answer "{move}" is not a legal move in this position.
+fen: {board_state}
+{move_format}
+legal: {legal_moves}
+Reply with JSON only: {{"chosen_move": "<one move from the legal list>"}}"""
+
+
+def build_lean_prefix(move_encoding: str, with_thinking: bool) -> str:
+    """建構精簡版面的靜態前綴（只取決於設定，與局面無關）"""
+    response_format = LEAN_RESPONSE_FORMAT_THINK if with_thinking else LEAN_RESPONSE_FORMAT_WITHOUT_THINK
+    return LEAN_INSTRUCTIONS.format(move_format=MOVE_FORMATS[move_encoding], response_format=response_format)
+
+
+def encode_legal_moves(board_state: str, legal_moves: list, move_encoding: str) -> str:
+    """
+    以指定格式編碼合法移動
+
+    Args:
+        board_state: 當前棋盤狀態 (FEN)，SAN 格式需要
+        legal_moves: UCI 格式的合法移動列表
+        move_encoding: "uci"、"grouped"（依起始格分組）或 "san"
+    """
+    if move_encoding == "uci":
+        return ", ".join(legal_moves)
+
+    if move_encoding == "grouped":
+        groups: dict = {}
+        for move in legal_moves:
+            groups.setdefault(move[:2], []).append(move[2:])
+        return " ".join(f"{origin}:{','.join(targets)}" for origin, targets in groups.items())
+
+    if move_encoding == "san":
+        board = chess.Board(board_state)
+        return ", ".join(board.san(chess.Move.from_uci(move)) for move in legal_moves)
+
+    raise ValueError(f"未知的移動編碼: {move_encoding}")
+
+
+def decode_move(move: str, board_state: str, legal_moves: list, move_encoding: str) -> str:
+    """將模型以提示詞格式回答的移動轉回 UCI（無法轉換時原樣回傳）"""
+    if move_encoding != "san" or not move or move in legal_moves:
+        return move
+
+    try:
+        return chess.Board(board_state).parse_san(move).uci()
+    except ValueError:
+        return move
+
+
+def count_tokens(text: str) -> int:
+    """
+    估計輸入 token 數
+
+    安裝 tiktoken 時使用 cl100k_base 編碼，否則以約 4 個字元一個 token 估計。
+    各模型的實際分詞器不同，此數值用於比較提示詞版面，實際用量以 API 回報為準。
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return max(1, (len(text) + 3) // 4)
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def build_legacy_prompt(board_state: str,
+                        legal_moves: list,
+                        player_color: str,
+                        position_analysis: dict,
+                        with_thinking: bool) -> str:
+    """原始版面：局面資訊在前，回應格式在後"""
+    response_format = RESPONSE_FORMAT_THINK if with_thinking else RESPONSE_FORMAT_WITHOUT_THINK
+    prompt = f"""
+Please analyze the following chess position and choose the best move:
+
+**Game Information:**
+- You are playing as {player_color}
+- Current position: {board_state}
+- Move count: {position_analysis.get('move_count', 0)}
+- Game status: {position_analysis.get('status', 'Active')}
+- In check: {position_analysis.get('is_check', False)}
+- Material balance: {position_analysis.get('material_balance', 0)} (positive means White is ahead)
+
+**Available legal moves:**
+{', '.join(legal_moves)}
+
+{response_format}
+```
+
+Please ensure that the chosen move is within the legal moves list.
+"""
+    return prompt
+
+
+def build_lean_prompt(board_state: str,
+                      legal_moves: list,
+                      player_color: str,
+                      position_analysis: dict,
+                      with_thinking: bool,
+                      move_encoding: str) -> str:
+    """精簡版面：靜態前綴加上精簡的局面資訊"""
+    return build_lean_prefix(move_encoding, with_thinking) + LEAN_POSITION.format(
+        player_color=player_color,
+        board_state=board_state,
+        move_count=position_analysis.get('move_count', 0),
+        status=position_analysis.get('status', 'Active'),
+        is_check=position_analysis.get('is_check', False),
+        material_balance=position_analysis.get('material_balance', 0),
+        legal_moves=encode_legal_moves(board_state, legal_moves, move_encoding)
+    )
+
+
+def build_batch_prompt(positions: list, move_encoding: str) -> str:
+    """
+    建構多局面批次提示詞
+
+    Args:
+        positions: 具有 position_id、board_state、legal_moves 與 player_color 屬性的局面列表
+        move_encoding: 合法移動編碼
+    """
+    return BATCH_INSTRUCTIONS.format(move_format=MOVE_FORMATS[move_encoding]) + "".join(
+        BATCH_POSITION.format(
+            position_id=position.position_id,
+            player_color=position.player_color,
+            board_state=position.board_state,
+            legal_moves=encode_legal_moves(position.board_state, position.legal_moves, move_encoding)
+        )
+        for position in positions
+    )
+
+
+def build_repair_prompt(board_state: str, legal_moves: list, move: str, move_encoding: str) -> str:
+    """建構要求模型從合法移動中重新選擇的簡短提示詞"""
+    return REPAIR_PROMPT.format(
+        move=move[:40],
+        board_state=board_state,
+        move_format=MOVE_FORMATS[move_encoding],
+        legal_moves=encode_legal_moves(board_state, legal_moves, move_encoding)
+    )
+
+
+def main():
+    """比較各提示詞版面與移動編碼的輸入 token 數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="比較提示詞版面的輸入 token 數")
+    parser.add_argument("--fen", default=chess.STARTING_FEN, help="要比較的局面 (FEN)")
+    parser.add_argument("--without-thinking", action="store_true", help="使用不含思考過程的回應格式")
+    args = parser.parse_args()
+
+    board = chess.Board(args.fen)
+    legal_moves = [move.uci() for move in board.legal_moves]
+    position_analysis = {"move_count": len(board.move_stack), "status": "Active",
+                         "is_check": board.is_check(), "material_balance": 0}
+    player_color = "White" if board.turn == chess.WHITE else "Black"
+    with_thinking = not args.without_thinking
+
+    legacy = build_legacy_prompt(args.fen, legal_moves, player_color, position_analysis, with_thinking)
+    print(f"{'legacy':<16} {count_tokens(legacy):>6} tokens")
+    for move_encoding in MOVE_ENCODINGS:
+        prefix = build_lean_prefix(move_encoding, with_thinking)
+        prompt = build_lean_prompt(args.fen, legal_moves, player_color, position_analysis,
+                                   with_thinking, move_encoding)
+        print(f"{'lean/' + move_encoding:<16} {count_tokens(prompt):>6} tokens "
+              f"(靜態前綴 {count_tokens(prefix)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import asyncio
+import collections
+import contextvars
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+from latency import PERCENTILES, percentile
+from prompt_lib import count_tokens
+import config
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# 目前送出的請求所屬的模型，由回應掛鉤讀取（在同一執行緒或非同步工作中執行）
+_current_model: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("rate_limited_model", default=None)
+
+
+def parse_reset_seconds(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    解析速率限制重設時間，回傳距離現在的秒數
+
+    支援 OpenAI 的時間長度（"1s"、"6m0s"、"250ms"）、秒數，以及 OpenRouter 的 epoch 時間戳（毫秒或秒）。
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts or "".join(amount + unit for amount, unit in parts) != value:
+            return None
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+    now = time.time() if now is None else now
+    if number > 1e12:
+        return max(0.0, number / 1000.0 - now)
+    if number > 1e9:
+        return max(0.0, number - now)
+    return max(0.0, number)
+
+
+def estimate_request_tokens(messages: list, max_tokens: int = 0) -> int:
+    """預約用的 token 估計：輸入訊息加上回應上限，收到回應後再依實際用量退還"""
+    return sum(count_tokens(message.get("content") or "") for message in messages) + (max_tokens or 0)
+
+
+class TokenBucket:
+    """
+    以預約方式實作的權杖桶
+
+    取用時立即扣除（餘額可為負）並回傳可開始的時間，因此先預約者先服務。
+    桶容量為每分鐘上限的 burst 比例，補充速率為其餘部分，任何 60 秒內的用量都不超過上限。
+    """
+
+    def __init__(self, limit_per_minute: float, burst: float):
+        self.limit = 0.0
+        self.set_limit(limit_per_minute, burst)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_limit(self, limit_per_minute: float, burst: float):
+        """設定每分鐘上限（0 表示不限制）"""
+        self.limit = float(limit_per_minute)
+        self.capacity = min(self.limit, max(1.0, self.limit * burst))
+        remainder = self.limit - self.capacity
+        self.rate = (remainder if remainder > 0 else self.limit) / 60.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """預約 amount 個權杖，回傳可開始的時間（monotonic 秒）"""
+        if not self.limit:
+            return now
+        self._refill(now)
+        start = now if self.level >= amount else now + (amount - self.level) / self.rate
+        self.level -= amount
+        return start
+
+    def refund(self, amount: float, now: float):
+        """退還多預約的權杖"""
+        if self.limit:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, now: float):
+        """伺服器回報已達上限時清空餘額"""
+        if self.limit:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+
+class ModelLimits:
+    """單一模型的請求數與 token 數權杖桶，以及伺服器要求的暫停時間"""
+
+    def __init__(self, rpm: float, tpm: float, burst: float, wait_window: int):
+        self.requests = TokenBucket(rpm, burst)
+        self.tokens = TokenBucket(tpm, burst)
+        self.blocked_until = 0.0
+        self.waits: Deque[float] = collections.deque(maxlen=wait_window)
+        self.stats = {"requests": 0, "delayed": 0, "total_wait": 0.0, "max_wait": 0.0,
+                      "tokens_reserved": 0, "tokens_refunded": 0, "server_throttled": 0, "waiting": 0}
+
+
+class RateLimiter:
+    """
+    各模型的請求數（RPM）與 token 數（TPM）速率限制，所有對局與推理核心共用
+
+    每次實際送出請求前預約額度，依預約順序先到先服務，需等待時同步版本 sleep、非同步版本 await。
+    伺服器回傳的速率限制標頭（retry-after、x-ratelimit-*）會暫停該模型的請求或調低上限。
+    """
+
+    def __init__(self,
+                 rpm: float = config.RATE_LIMIT_RPM,
+                 tpm: float = config.RATE_LIMIT_TPM,
+                 burst: float = config.RATE_LIMIT_BURST,
+                 model_limits: Optional[Dict[str, dict]] = None,
+                 wait_window: int = 1000):
+        """
+        Args:
+            rpm: 每個模型的每分鐘請求數上限（0 表示不限制）
+            tpm: 每個模型的每分鐘 token 數上限（0 表示不限制）
+            burst: 可瞬間使用的額度佔每分鐘上限的比例
+            model_limits: 個別模型的上限，例如 {"model": {"rpm": 20, "tpm": 40000}}
+            wait_window: 每個模型保留的排隊等待時間樣本數
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst = burst
+        self.model_limits = model_limits if model_limits is not None else dict(config.RATE_LIMIT_MODELS)
+        self.wait_window = wait_window
+        self._lock = threading.Lock()
+        self._models: Dict[str, ModelLimits] = {}
+
+    def _limits(self, model: str) -> ModelLimits:
+        """取得模型的速率限制狀態（呼叫端需持有鎖）"""
+        limits = self._models.get(model)
+        if limits is None:
+            overrides = self.model_limits.get(model, {})
+            limits = ModelLimits(overrides.get("rpm", self.rpm), overrides.get("tpm", self.tpm),
+                                 self.burst, self.wait_window)
+            self._models[model] = limits
+        return limits
+
+    def reserve(self, model: str, tokens: int = 0) -> float:
+        """預約一次請求與 tokens 個 token，回傳需等待的秒數"""
+        now = time.monotonic()
+        with self._lock:
+            limits = self._limits(model)
+            start = max(limits.requests.reserve(1, now), limits.tokens.reserve(tokens, now), limits.blocked_until)
+            delay = max(0.0, start - now)
+            limits.stats["requests"] += 1
+            limits.stats["tokens_reserved"] += tokens
+            limits.stats["total_wait"] += delay
+            limits.stats["max_wait"] = max(limits.stats["max_wait"], delay)
+            if delay > 0:
+                limits.stats["delayed"] += 1
+                limits.stats["waiting"] += 1
+            limits.waits.append(delay)
+        return delay
+
+    def _done_waiting(self, model: str):
+        with self._lock:
+            self._limits(model).stats["waiting"] -= 1
+
+    def acquire(self, model: str, tokens: int = 0) -> float:
+        """等待到可送出請求為止，回傳等待秒數"""
+        delay = self.reserve(model, tokens)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                self._done_waiting(model)
+        return delay
+
+    async def acquire_async(self, model: str, tokens: int = 0) -> float:
+        """等待到可送出請求為止（非同步版本）"""
+        delay = self.reserve(model, tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._done_waiting(model)
+        return delay
+
+    def settle(self, model: str, reserved_tokens: int, used_tokens: Optional[int]):
+        """收到回應後依實際 token 用量退還多預約的額度"""
+        if used_tokens is None or used_tokens >= reserved_tokens:
+            return
+        with self._lock:
+            limits = self._limits(model)
+            limits.tokens.refund(reserved_tokens - used_tokens, time.monotonic())
+            limits.stats["tokens_refunded"] += reserved_tokens - used_tokens
+
+    def observe_headers(self, model: str, headers, status_code: int = 200):
+        """
+        依伺服器的速率限制標頭調整
+
+        429 回應依 retry-after 暫停該模型；剩餘額度為 0 時暫停到重設時間；
+        伺服器回報的上限低於設定值時改用伺服器的上限。
+        """
+        now = time.monotonic()
+        pause = None
+        if status_code == 429:
+            pause = parse_reset_seconds(headers.get("retry-after"))
+            if pause is None:
+                pause = config.RATE_LIMIT_DEFAULT_PAUSE
+
+        with self._lock:
+            limits = self._limits(model)
+            for kind, bucket in (("requests", limits.requests), ("tokens", limits.tokens)):
+                suffixes = ("-" + kind, "") if kind == "requests" else ("-" + kind,)
+                for suffix in suffixes:
+                    limit = _header_number(headers, "x-ratelimit-limit" + suffix)
+                    if limit and (not bucket.limit or limit < bucket.limit):
+                        bucket.set_limit(limit, self.burst)
+                    if _header_number(headers, "x-ratelimit-remaining" + suffix) == 0:
+                        reset = parse_reset_seconds(headers.get("x-ratelimit-reset" + suffix))
+                        if reset is not None:
+                            pause = max(pause or 0.0, reset)
+            if pause is not None:
+                limits.requests.drain(now)
+                limits.blocked_until = max(limits.blocked_until, now + pause)
+                limits.stats["server_throttled"] += 1
+
+    def get_stats(self) -> Dict[str, dict]:
+        """各模型的排隊等待統計（含等待時間分位數）與目前上限"""
+        with self._lock:
+            result = {}
+            for model, limits in self._models.items():
+                waits = sorted(limits.waits)
+                stats = dict(limits.stats)
+                stats["wait"] = {f"p{pct}": percentile(waits, pct) for pct in PERCENTILES}
+                stats["rpm"] = limits.requests.limit
+                stats["tpm"] = limits.tokens.limit
+                result[model] = stats
+            return result
+
+
+def _header_number(headers, name: str) -> Optional[float]:
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+@contextmanager
+def tag_request(model: str) -> Iterator[None]:
+    """標記期間送出的請求所屬的模型，回應掛鉤不需再解析請求內容"""
+    token = _current_model.set(model)
+    try:
+        yield
+    finally:
+        _current_model.reset(token)
+
+
+def _request_model(request) -> Optional[str]:
+    """未以 tag_request 標記的請求才從請求內容讀取模型名稱（無法解析時為 None）"""
+    try:
+        return json.loads(request.content).get("model")
+    except (ValueError, UnicodeDecodeError, AttributeError, TypeError, RuntimeError):
+        # 掛鉤不可讓請求失敗：內容非 JSON、無法解碼或尚未讀取（串流請求）時略過
+        return None
+
+
+def observe_response(response):
+    """httpx 回應事件掛鉤：將速率限制標頭交給共用的速率限制器"""
+    limiter = get_default_rate_limiter()
+    if limiter is None:
+        return
+    model = _current_model.get() or _request_model(response.request)
+    if model:
+        limiter.observe_headers(model, response.headers, response.status_code)
+
+
+async def observe_response_async(response):
+    """非同步 httpx 用戶端的回應事件掛鉤"""
+    observe_response(response)
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_rate_limiter() -> Optional[RateLimiter]:
+    """取得依設定建立的共用速率限制器（未啟用時為 None）"""
+    global _default_limiter
+    if not config.RATE_LIMIT_ENABLED:
+        return None
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
@@ -0,0 +1,206 @@
+"""
+對局進度顯示
+對局迴圈只把事件放入佇列，由背景執行緒負責顯示，終端輸出不會拖慢對局；
+可選完整顯示、節流的多盤彙整進度，或完全不顯示（無介面模式）
+"""
+
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, NamedTuple, Optional
+
+from colorama import Fore, Style
+
+import config
+
+
+class GameEvent(NamedTuple):
+    """對局事件"""
+    game: str
+    kind: str  # start / board / turn / thinking / move / invalid / end / message
+    data: dict
+
+
+class Renderer(ABC):
+    """
+    事件顯示器抽象基底類別（子類別實作 handle）
+
+    emit 只將事件放入有上限的佇列；佇列已滿時依 block_when_full 等待或捨棄事件（並計數），
+    對局迴圈不會因終端輸出而變慢。
+    """
+
+    # 是否需要逐步的棋盤與思考過程事件（不需要時對局迴圈不產生這些內容）
+    verbose = False
+
+    def __init__(self, queue_size: int = config.RENDER_QUEUE_SIZE, block_when_full: bool = False):
+        self._queue: "queue.Queue[Optional[GameEvent]]" = queue.Queue(maxsize=queue_size)
+        self.block_when_full = block_when_full
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def emit(self, game: str, kind: str, **data):
+        """排入一個事件"""
+        event = GameEvent(game, kind, data)
+        if self.block_when_full:
+            self._queue.put(event)
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                break
+            try:
+                self.handle(event)
+            except Exception as e:
+                print(f"顯示事件時發生錯誤: {e}")
+        self.finish()
+
+    @abstractmethod
+    def handle(self, event: GameEvent):
+        """顯示單一事件（由背景執行緒呼叫）"""
+
+    def finish(self):
+        """佇列結束後的收尾輸出"""
+
+    def close(self, timeout: Optional[float] = None):
+        """顯示完剩餘事件後結束背景執行緒"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+class ConsoleRenderer(Renderer):
+    """完整顯示棋盤、局面資訊與思考過程（互動模式的預設輸出）"""
+
+    verbose = True
+
+    def __init__(self, queue_size: int = config.RENDER_QUEUE_SIZE):
+        # 互動模式不捨棄任何輸出
+        super().__init__(queue_size, block_when_full=True)
+
+    def handle(self, event: GameEvent):
+        data = event.data
+        if event.kind == "start":
+            print(f"\n{Fore.CYAN}{'='*60}")
+            print(f"           {data.get('title', '西洋棋 LLM 對弈系統')}")
+            if data.get("subtitle"):
+                print(f"             {data['subtitle']}")
+            print(f"{'='*60}{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}白棋模型: {data['white_model']}")
+            print(f"黑棋模型: {data['black_model']}")
+            print(f"遊戲開始時間: {data['start_time'].strftime('%Y-%m-%d %H:%M:%S')}{Style.RESET_ALL}")
+            print()
+        elif event.kind == "board":
+            analysis = data["analysis"]
+            print(f"\n{Fore.GREEN}當前棋盤:{Style.RESET_ALL}")
+            print(data["ascii"])
+            print(f"\n{Fore.BLUE}局面資訊:{Style.RESET_ALL}")
+            print(f"  輪到: {analysis['turn']}")
+            print(f"  移動次數: {analysis['move_count']}")
+            print(f"  狀態: {analysis['status']}")
+            print(f"  材料平衡: {analysis['material_balance']}")
+            if analysis['is_check']:
+                print(f"  {Fore.RED}將軍!{Style.RESET_ALL}")
+            print()
+        elif event.kind == "turn":
+            print(f"{Fore.MAGENTA}{'='*40}")
+            print(f"  {data['player']} 的回合 ({data['model']})")
+            print(f"{'='*40}{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}正在思考...{Style.RESET_ALL}")
+        elif event.kind == "thinking":
+            print(f"\n{Fore.CYAN}思考過程:{Style.RESET_ALL}")
+            print(data["text"])
+            print()
+        elif event.kind == "move":
+            print(f"{Fore.GREEN}✓ {data['player']} 移動: {data['move']}{Style.RESET_ALL}")
+        elif event.kind == "invalid":
+            legal_moves = data["legal_moves"]
+            print(f"{Fore.RED}✗ 無效移動: {data['move']}{Style.RESET_ALL}")
+            print(f"合法移動: {', '.join(legal_moves[:5])}{'...' if len(legal_moves) > 5 else ''}")
+        elif event.kind == "end":
+            print(f"\n{Fore.CYAN}{'='*60}")
+            print(f"                {data.get('title', '遊戲結束')}")
+            print(f"{'='*60}{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}結果: {data['result']}")
+            print(f"狀態: {data['status']}")
+            print(f"總移動數: {data['move_count']}")
+            print(f"遊戲時長: {data['duration']}{Style.RESET_ALL}")
+            print(f"\n{Fore.GREEN}PGN 記錄:{Style.RESET_ALL}")
+            print(data["pgn"])
+        elif event.kind == "message":
+            print(f"{data.get('color', '')}{data['text']}{Style.RESET_ALL if data.get('color') else ''}")
+
+
+class ProgressRenderer(Renderer):
+    """
+    彙整所有對局的進度，最多每 interval 秒輸出一行
+
+    適合無介面模式或多盤對局共用一個終端；佇列滿時捨棄事件而不阻塞對局。
+    """
+
+    def __init__(self, interval: float = config.RENDER_INTERVAL, queue_size: int = config.RENDER_QUEUE_SIZE):
+        self.interval = interval
+        self.games: Dict[str, dict] = {}
+        self.moves = 0
+        self.invalid = 0
+        self.start = time.monotonic()
+        self._last_print = self.start
+        self._last_line = None
+        super().__init__(queue_size)
+
+    def handle(self, event: GameEvent):
+        game = self.games.setdefault(event.game, {"plies": 0, "finished": False, "result": None})
+        if event.kind == "move":
+            game["plies"] += 1
+            self.moves += 1
+        elif event.kind == "invalid":
+            self.invalid += 1
+        elif event.kind == "end":
+            game.update(finished=True, result=event.data["result"])
+
+        now = time.monotonic()
+        if now - self._last_print >= self.interval or event.kind == "end":
+            self._last_print = now
+            self.print_progress(now)
+
+    def print_progress(self, now: Optional[float] = None):
+        """輸出一行彙整進度（與上一行相同時略過）"""
+        elapsed = (now or time.monotonic()) - self.start
+        finished = sum(game["finished"] for game in self.games.values())
+        line = (finished, len(self.games), self.moves, self.invalid, self.dropped)
+        if line == self._last_line:
+            return
+        self._last_line = line
+        rate = self.moves / elapsed if elapsed > 0 else 0.0
+        print(f"{Fore.CYAN}[{elapsed:6.1f}s] 對局 {finished}/{len(self.games)} 完成, "
+              f"{self.moves} 步 ({rate:.1f} 步/秒), 無效移動 {self.invalid}"
+              f"{f', 捨棄事件 {self.dropped}' if self.dropped else ''}{Style.RESET_ALL}")
+
+    def finish(self):
+        self.print_progress()
+
+
+RENDERERS = {
+    "console": ConsoleRenderer,
+    "progress": ProgressRenderer
+}
+
+
+def create_renderer(kind: Optional[str] = None, headless: Optional[bool] = None) -> Optional[Renderer]:
+    """依名稱建立顯示器（"none" 表示不顯示），預設依設定；無介面模式不使用完整顯示"""
+    headless = config.HEADLESS if headless is None else headless
+    if kind is None:
+        kind = config.RENDERER
+        if headless and kind == "console":
+            kind = "none"
+    if kind == "none":
+        return None
+    if kind not in RENDERERS:
+        raise ValueError(f"未知的顯示方式: {kind}")
+    return RENDERERS[kind]()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Chess-LLM 對局重播
+以思考記錄中保存的原始回應取代 LLM，離線且可重現地重新執行整盤對局，
+用於檢查解析、驗證、日誌與棋譜相關修改的回歸與效能
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Optional
+
+from colorama import init, Fore, Style
+
+from local_backend import FEN_PATTERN
+from llm_inference import LLMInferenceCore
+from main import ChessLLMGame
+from prompt_lib import count_tokens
+from renderer import RENDERERS, Renderer, create_renderer
+import config
+
+# 初始化 colorama
+init()
+
+NO_RECORD_RESPONSE = "No recorded response for this position."
+
+
+def fen_ply(fen: str) -> int:
+    """由 FEN 的回合數與行棋方計算半步編號（從 0 開始）"""
+    fields = fen.split()
+    fullmove = int(fields[5]) if len(fields) > 5 else 1
+    return 2 * (fullmove - 1) + (1 if fields[1] == "b" else 0)
+
+
+def load_thinking_logs(path: str) -> List[dict]:
+    """讀取思考記錄檔案（JSON 陣列或 JSON Lines）"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def split_games(records: List[dict]) -> List[List[dict]]:
+    """依半步編號切分多盤對局的合併記錄（半步編號變小即為新的一盤）"""
+    games: List[List[dict]] = []
+    last_ply = None
+    for record in records:
+        if not record.get("board_state") or record.get("batch"):
+            continue
+        ply = fen_ply(record["board_state"])
+        if last_ply is None or ply < last_ply:
+            games.append([])
+        games[-1].append(record)
+        last_ply = ply
+    return games
+
+
+def load_replay_games(paths: List[str]) -> Dict[str, List[dict]]:
+    """讀取檔案或目錄中的思考記錄，回傳 {對局名稱: 記錄}"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "thinking_logs_*.json*"), recursive=True)))
+        else:
+            files.append(path)
+
+    games = {}
+    for filename in files:
+        name = os.path.splitext(os.path.basename(filename))[0]
+        split = split_games(load_thinking_logs(filename))
+        for index, records in enumerate(split):
+            games[name if len(split) == 1 else f"{name}#{index}"] = records
+    return games
+
+
+class ReplayLog:
+    """單盤對局的已記錄回應，依半步編號依序提供（同一步的重新提問取下一筆）"""
+
+    def __init__(self, records: List[dict]):
+        self.responses: Dict[int, Deque[dict]] = defaultdict(deque)
+        for record in records:
+            self.responses[fen_ply(record["board_state"])].append(record)
+        # 每個半步最後一筆記錄的移動即為當時實際執行的移動（非法移動時對局在此結束）
+        self.recorded_moves = []
+        for ply in sorted(self.responses):
+            record = self.responses[ply][-1]
+            if record["chosen_move"] not in record.get("legal_moves", [record["chosen_move"]]):
+                break
+            self.recorded_moves.append(record["chosen_move"])
+        self.stats = {"served": 0, "missing": 0}
+
+    def next_record(self, fen: str) -> Optional[dict]:
+        """取出該局面的下一筆記錄"""
+        queue = self.responses.get(fen_ply(fen))
+        if not queue:
+            self.stats["missing"] += 1
+            return None
+        self.stats["served"] += 1
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+def recorded_content(record: Optional[dict]) -> str:
+    """記錄對應的回應內容；API 失敗改用隨機移動的記錄改為直接回答當時的移動"""
+    if record is None:
+        return NO_RECORD_RESPONSE
+    if record.get("fallback") or not record.get("raw_response"):
+        return json.dumps({"chosen_move": record["chosen_move"], "reasoning": "replayed fallback"})
+    return record["raw_response"]
+
+
+class ReplayCompletions:
+    """與 OpenAI chat.completions 介面相容的重播後端"""
+
+    def __init__(self, replay_log: ReplayLog, latency_scale: float = 0.0):
+        """
+        Args:
+            replay_log: 要重播的對局記錄
+            latency_scale: 記錄中思考時間的倍率（0 表示不等待，以最快速度重播）
+        """
+        self.replay_log = replay_log
+        self.latency_scale = latency_scale
+
+    def _next(self, messages: List[dict]):
+        """回傳 (回應內容, 模擬延遲)"""
+        fens = FEN_PATTERN.findall(messages[-1]["content"])
+        record = self.replay_log.next_record(fens[0]) if fens else None
+        delay = (record or {}).get("thinking_duration", 0.0) * self.latency_scale
+        return recorded_content(record), delay
+
+    def _response(self, content: str, messages: List[dict], model: str) -> SimpleNamespace:
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        completion_tokens = count_tokens(content)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+class SyncReplayCompletions(ReplayCompletions):
+    """同步版本"""
+
+    def create(self, model: str, messages: List[dict], **kwargs) -> SimpleNamespace:
+        content, delay = self._next(messages)
+        if delay:
+            time.sleep(delay)
+        return self._response(content, messages, model)
+
+
+class AsyncReplayCompletions(ReplayCompletions):
+    """非同步版本"""
+
+    async def create(self, model: str, messages: List[dict], **kwargs) -> SimpleNamespace:
+        content, delay = self._next(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._response(content, messages, model)
+
+
+def create_replay_client(replay_log: ReplayLog, latency_scale: float = 0.0, asynchronous: bool = False) -> SimpleNamespace:
+    """建立可取代 OpenAI 客戶端的重播後端（只支援非串流的 chat.completions.create）"""
+    completions_class = AsyncReplayCompletions if asynchronous else SyncReplayCompletions
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions_class(replay_log, latency_scale)))
+
+
+def create_replay_core(replay_log: ReplayLog, latency_scale: float = 0.0) -> LLMInferenceCore:
+    """
+    建立使用重播後端的推理核心
+
+    不使用回應快取、重試對沖與速率限制，每個請求都依序取用記錄，結果可重現。
+    """
+    core = LLMInferenceCore(client=create_replay_client(replay_log, latency_scale))
+    core.response_cache = None
+    core.request_policy = None
+    core.rate_limiter = None
+    return core
+
+
+def replay_game(name: str,
+                records: List[dict],
+                output_dir: str,
+                latency_scale: float = 0.0,
+                renderer: Optional[Renderer] = None) -> dict:
+    """以無介面的 ChessLLMGame 重播一盤對局，回傳與原始記錄的比對結果"""
+    replay_log = ReplayLog(records)
+    game = ChessLLMGame(
+        llm_core=create_replay_core(replay_log, latency_scale),
+        output_dir=os.path.join(output_dir, name.replace("#", "_")),
+        headless=True,
+        renderer=renderer
+    )
+    start = time.perf_counter()
+    game.run_game()
+    elapsed = time.perf_counter() - start
+
+    replayed = [move.uci() for move in game.chess.move_history]
+    recorded = replay_log.recorded_moves
+    divergence = next((ply for ply, (a, b) in enumerate(zip(replayed, recorded)) if a != b), None)
+    if divergence is None and len(replayed) != len(recorded):
+        divergence = min(len(replayed), len(recorded))
+    return {
+        "game": name,
+        "plies": len(replayed),
+        "recorded_plies": len(recorded),
+        "identical": divergence is None,
+        "divergence_ply": divergence,
+        "elapsed": elapsed,
+        "plies_per_second": len(replayed) / elapsed if elapsed > 0 else 0.0,
+        **replay_log.stats
+    }
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 對局重播")
+    parser.add_argument("logs", nargs="+", help="思考記錄檔案或目錄（thinking_logs_*.json / *.jsonl）")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="模擬記錄中的思考時間（1 為原速，0 為最快速度）")
+    parser.add_argument("--output-dir", default=None, help="重播輸出目錄")
+    parser.add_argument("--renderer", choices=sorted(RENDERERS) + ["none"], default="progress",
+                        help="進度顯示方式（預設為彙整進度）")
+    args = parser.parse_args()
+
+    # 重播後端不支援串流回應；重播的對局不保存檢查點
+    config.LLM_STREAMING = False
+    config.CHECKPOINT_ENABLED = False
+    output_dir = args.output_dir or os.path.join(config.REPLAY_OUTPUT_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(output_dir, exist_ok=True)
+    config.GAME_LOG_FILE = os.path.join(output_dir, "game_log.txt")
+
+    games = load_replay_games(args.logs)
+    if not games:
+        print(f"{Fore.RED}找不到可重播的思考記錄{Style.RESET_ALL}")
+        exit(1)
+
+    renderer = create_renderer(args.renderer)
+    try:
+        results = [replay_game(name, records, output_dir, args.latency_scale, renderer)
+                   for name, records in games.items()]
+    finally:
+        if renderer is not None:
+            renderer.close()
+    total_plies = sum(result["plies"] for result in results)
+    total_elapsed = sum(result["elapsed"] for result in results)
+    summary = {
+        "games": results,
+        "identical_games": sum(result["identical"] for result in results),
+        "total_plies": total_plies,
+        "total_elapsed": total_elapsed,
+        "plies_per_second": total_plies / total_elapsed if total_elapsed > 0 else 0.0
+    }
+    with open(os.path.join(output_dir, "replay_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{Fore.CYAN}{'='*60}")
+    print(f"                重播結果")
+    print(f"{'='*60}{Style.RESET_ALL}")
+    for result in results:
+        status = f"{Fore.GREEN}一致" if result["identical"] else f"{Fore.RED}第 {result['divergence_ply']} 半步起不同"
+        print(f"  {result['game']}: {result['plies']}/{result['recorded_plies']} 半步, "
+              f"{result['elapsed']:.2f}s, {status}{Style.RESET_ALL}")
+    print(f"\n{Fore.YELLOW}一致: {summary['identical_games']}/{len(results)} 盤, "
+          f"共 {total_plies} 半步, {summary['plies_per_second']:.1f} 半步/秒{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}重播摘要已保存: {os.path.join(output_dir, 'replay_summary.json')}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from latency import percentile
+import config
+
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """連線錯誤、逾時、速率限制與 5xx 伺服器錯誤可以重試"""
+    import openai
+    if isinstance(error, (openai.APIConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS_CODES or (isinstance(status, int) and status >= 500)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """讀取速率限制回應中的 retry-after 標頭"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestPolicy:
+    """
+    API 請求策略：可重試錯誤以帶抖動的指數退避重試，慢請求在延遲門檻後送出對沖請求
+
+    對沖門檻為該模型近期延遲的分位數（例如 p90），兩個請求以先回傳者為準。
+    重試與對沖都是額外花費，總數受 max_extra_ratio（相對主要請求數）加上 extra_burst 限制。
+    """
+
+    def __init__(self,
+                 max_retries: int = config.REQUEST_MAX_RETRIES,
+                 backoff_base: float = config.REQUEST_BACKOFF_BASE,
+                 backoff_max: float = config.REQUEST_BACKOFF_MAX,
+                 hedge_enabled: bool = config.REQUEST_HEDGE_ENABLED,
+                 hedge_quantile: float = config.REQUEST_HEDGE_QUANTILE,
+                 hedge_min_delay: float = config.REQUEST_HEDGE_MIN_DELAY,
+                 hedge_default_delay: float = config.REQUEST_HEDGE_DEFAULT_DELAY,
+                 hedge_min_samples: int = config.REQUEST_HEDGE_MIN_SAMPLES,
+                 max_extra_ratio: float = config.REQUEST_MAX_EXTRA_RATIO,
+                 extra_burst: int = config.REQUEST_EXTRA_BURST,
+                 latency_window: int = 200,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            max_retries: 每次請求最多重試次數
+            backoff_base: 退避基準秒數（第 n 次重試上限為 base * 2^n）
+            backoff_max: 單次退避上限秒數
+            hedge_enabled: 是否送出對沖請求
+            hedge_quantile: 對沖門檻使用的延遲分位數（0-100）
+            hedge_min_delay: 對沖門檻下限秒數
+            hedge_default_delay: 延遲樣本不足時的對沖門檻
+            hedge_min_samples: 使用分位數前所需的延遲樣本數
+            max_extra_ratio: 額外請求（重試與對沖）相對主要請求數的上限比例
+            extra_burst: 額外請求的固定額度（啟動初期主要請求數少時使用）
+            latency_window: 每個模型保留的近期延遲樣本數
+            seed: 退避抖動的隨機種子
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.max_extra_ratio = max_extra_ratio
+        self.extra_burst = extra_burst
+        self.latency_window = latency_window
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.primary_requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.extra_denied = 0
+
+    def hedge_delay(self, model: str) -> float:
+        """該模型的對沖門檻（秒）"""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.hedge_min_samples:
+            return max(self.hedge_default_delay, self.hedge_min_delay)
+        return max(percentile(samples, self.hedge_quantile), self.hedge_min_delay)
+
+    def backoff_delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """第 attempt 次重試前的等待時間（full jitter；有 retry-after 時以其為下限）"""
+        with self._lock:
+            delay = self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _record_latency(self, model: str, latency: float):
+        """記錄成功請求的延遲"""
+        with self._lock:
+            samples = self._latencies.setdefault(model, collections.deque(maxlen=self.latency_window))
+            samples.append(latency)
+
+    def _take_extra(self, kind: str) -> bool:
+        """申請一次額外請求額度"""
+        with self._lock:
+            allowed = self.retries + self.hedges < self.max_extra_ratio * self.primary_requests + self.extra_burst
+            if not allowed:
+                self.extra_denied += 1
+            elif kind == "retry":
+                self.retries += 1
+            else:
+                self.hedges += 1
+            return allowed
+
+    def _begin(self):
+        with self._lock:
+            self.primary_requests += 1
+
+    def _timed(self, model: str, request: Callable):
+        """執行一次請求並記錄延遲"""
+        start = time.perf_counter()
+        result = request()
+        self._record_latency(model, time.perf_counter() - start)
+        return result
+
+    def call(self, model: str, request: Callable, hedge: bool = True) -> Tuple[object, dict]:
+        """
+        依策略執行同步請求
+
+        Args:
+            model: 模型名稱（延遲統計與對沖門檻以模型區分）
+            request: 送出一次請求的函數，每次重試或對沖都會重新呼叫
+            hedge: 此請求是否允許對沖（串流請求不對沖）
+
+        Returns:
+            Tuple[object, dict]: (請求結果, 嘗試資訊: attempts / retries / hedged)
+        """
+        self._begin()
+        info = {"attempts": 0, "retries": 0, "hedged": False}
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_enabled:
+                    return self._call_hedged(model, request, info), info
+                info["attempts"] += 1
+                return self._timed(model, request), info
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e) or not self._take_extra("retry"):
+                    raise
+                attempt += 1
+                info["retries"] += 1
+                time.sleep(self.backoff_delay(attempt, e))
+
+    def _call_hedged(self, model: str, request: Callable, info: dict):
+        """送出主要請求，超過門檻仍未完成時送出對沖請求，取先成功者"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=config.LLM_POOL_SIZE,
+                                                        thread_name_prefix="hedged-request")
+
+        info["attempts"] += 1
+        primary = self._executor.submit(self._timed, model, request)
+        done, _ = wait([primary], timeout=self.hedge_delay(model))
+        if done or not self._take_extra("hedge"):
+            return primary.result()
+
+        # 同步請求無法取消，落後的請求在背景完成後丟棄
+        info["attempts"] += 1
+        info["hedged"] = True
+        hedge_future = self._executor.submit(self._timed, model, request)
+        pending = {primary, hedge_future}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge_future:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def call_async(self, model: str, request: Callable[[], Awaitable], hedge: bool = True) -> Tuple[object, dict]:
+        """依策略執行非同步請求，參數與回傳值同 call；落後的對沖請求會被取消"""
+        self._begin()
+        info = {"attempts": 0, "retries": 0, "hedged": False}
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_enabled:
+                    return await self._call_hedged_async(model, request, info), info
+                info["attempts"] += 1
+                return await self._timed_async(model, request), info
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e) or not self._take_extra("retry"):
+                    raise
+                attempt += 1
+                info["retries"] += 1
+                await asyncio.sleep(self.backoff_delay(attempt, e))
+
+    async def _timed_async(self, model: str, request: Callable[[], Awaitable]):
+        """執行一次非同步請求並記錄延遲"""
+        start = time.perf_counter()
+        result = await request()
+        self._record_latency(model, time.perf_counter() - start)
+        return result
+
+    async def _call_hedged_async(self, model: str, request: Callable[[], Awaitable], info: dict):
+        """非同步對沖：先成功者勝出，另一個請求立即取消"""
+        info["attempts"] += 1
+        primary = asyncio.ensure_future(self._timed_async(model, request))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay(model))
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self._take_extra("hedge"):
+            return await primary
+
+        info["attempts"] += 1
+        info["hedged"] = True
+        hedge_task = asyncio.ensure_future(self._timed_async(model, request))
+        pending = {primary, hedge_task}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> dict:
+        """獲取重試與對沖統計"""
+        with self._lock:
+            models = list(self._latencies)
+        return {
+            "primary_requests": self.primary_requests,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "extra_denied": self.extra_denied,
+            "extra_ratio": (self.retries + self.hedges) / self.primary_requests if self.primary_requests else 0.0,
+            "hedge_delay": {model: self.hedge_delay(model) for model in models}
+        }
+
+
+_default_policy: Optional[RequestPolicy] = None
+_default_policy_lock = threading.Lock()
+
+
+def get_default_request_policy() -> Optional[RequestPolicy]:
+    """取得依設定建立的共用請求策略（未啟用時為 None），各模型的延遲統計在所有對局間共用"""
+    global _default_policy
+    if not config.REQUEST_POLICY_ENABLED:
+        return None
+    with _default_policy_lock:
+        if _default_policy is None:
+            _default_policy = RequestPolicy()
+        return _default_policy
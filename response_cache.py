@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import config
+
+
+class ResponseCache:
+    """LLM 回應的磁碟快取，以模型、局面與提示詞為鍵，採用 LRU 淘汰"""
+
+    def __init__(self,
+                 path: str = config.RESPONSE_CACHE_PATH,
+                 max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES,
+                 samples_per_key: int = config.RESPONSE_CACHE_SAMPLES):
+        """
+        Args:
+            path: SQLite 快取檔案路徑（":memory:" 表示僅存於記憶體）
+            max_entries: 快取保留的最大回應數量
+            samples_per_key: temperature > 0 時每個鍵累積的回應數，達到後改為從中抽樣
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.samples_per_key = max(1, samples_per_key)
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT NOT NULL,
+                response TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_key ON responses(key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str,
+                 board_state: str,
+                 personality: str,
+                 temperature: float,
+                 prompt: str) -> str:
+        """由模型、FEN、個性、溫度與提示詞雜湊組成快取鍵"""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        raw_key = json.dumps([model_name, board_state, personality, temperature, prompt_hash])
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, temperature: float) -> Optional[str]:
+        """
+        查詢快取
+
+        temperature 為 0 時直接回傳已快取的回應；temperature > 0 時，
+        需累積到 samples_per_key 個回應後才會從中隨機抽樣，以保留回應的多樣性。
+
+        Returns:
+            Optional[str]: 快取的原始回應，未命中時為 None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, response FROM responses WHERE key = ?", (key,)
+            ).fetchall()
+
+            required = 1 if temperature <= 0 else self.samples_per_key
+            if len(rows) < required:
+                self.misses += 1
+                return None
+
+            rowid, response = random.choice(rows)
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE rowid = ?", (time.time(), rowid)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        """寫入一筆回應，超出容量時淘汰最久未使用的項目"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (key, response, last_access) VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE rowid IN "
+                    "(SELECT rowid FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def get_stats(self) -> dict:
+        """獲取快取統計"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries
+        }
+
+    def close(self):
+        """關閉快取資料庫"""
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_response_cache() -> Optional[ResponseCache]:
+    """取得所有推理核心共用的預設快取，未啟用時回傳 None"""
+    global _default_cache
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
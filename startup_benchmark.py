@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+啟動時間評測
+以 python -X importtime 在新行程中匯入各命令列入口，回報總匯入時間與各套件的匯入成本，
+可與先前的結果比較以發現啟動時間退步
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+import config
+
+ENTRY_POINTS = ["main", "tournament", "game_farm", "replay", "demo", "benchmark", "status", "llm_inference", "config"]
+
+# 只在實際呼叫 API 時才需要的套件，啟動時不應載入
+LAZY_DEPENDENCIES = ["openai", "httpx", "dotenv"]
+
+
+def parse_importtime(output: str) -> List[dict]:
+    """
+    解析 -X importtime 的輸出
+
+    Returns:
+        List[dict]: 每個模組的 name、self_us、cumulative_us 與 depth（巢狀層級）
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        modules.append({
+            "name": stripped.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(stripped) - 1) // 2
+        })
+    return modules
+
+
+def measure_import(module: str) -> dict:
+    """在新的直譯器中匯入模組一次，回傳行程耗時與匯入明細"""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"匯入 {module} 失敗: {completed.stderr.strip().splitlines()[-1:]}")
+    modules = parse_importtime(completed.stderr)
+    # 子模組列在頂層模組之前；只保留這次匯入的子樹（排除直譯器啟動時 site 載入的模組）
+    end = max((index for index, entry in enumerate(modules) if entry["name"] == module and entry["depth"] == 0),
+              default=None)
+    if end is None:
+        return {"wall": wall, "import_us": 0, "modules": []}
+    start = end
+    while start > 0 and modules[start - 1]["depth"] > 0:
+        start -= 1
+    return {"wall": wall, "import_us": modules[end]["cumulative_us"], "modules": modules[start:end + 1]}
+
+
+def package_costs(modules: List[dict]) -> Dict[str, int]:
+    """依頂層套件彙整自身匯入時間（微秒），由大到小排序"""
+    costs: Dict[str, int] = defaultdict(int)
+    for entry in modules:
+        costs[entry["name"].split(".")[0]] += entry["self_us"]
+    return dict(sorted(costs.items(), key=lambda item: item[1], reverse=True))
+
+
+def benchmark_entry_point(module: str, repeat: int = 5, top: int = 10) -> dict:
+    """重複量測同一入口，取最快的一次（排除磁碟快取等干擾）"""
+    runs = [measure_import(module) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["import_us"])
+    loaded = {entry["name"] for entry in best["modules"]}
+    return {
+        "module": module,
+        "import_ms": best["import_us"] / 1000,
+        "wall_ms": min(run["wall"] for run in runs) * 1000,
+        "modules_loaded": len(loaded),
+        "lazy_dependencies_loaded": [name for name in LAZY_DEPENDENCIES if name in loaded],
+        "packages_ms": {name: cost / 1000 for name, cost in list(package_costs(best["modules"]).items())[:top]}
+    }
+
+
+def compare(results: List[dict], baseline: dict, threshold: float) -> List[str]:
+    """與先前的結果比較，回傳匯入時間超過門檻的入口說明"""
+    previous = {entry["module"]: entry for entry in baseline.get("entry_points", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["module"])
+        if before and result["import_ms"] > before["import_ms"] * (1 + threshold):
+            regressions.append(f"{result['module']}: {before['import_ms']:.1f}ms -> {result['import_ms']:.1f}ms")
+    return regressions
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 啟動時間評測")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="要量測的入口模組")
+    parser.add_argument("--repeat", type=int, default=5, help="每個入口的量測次數（取最快的一次）")
+    parser.add_argument("--top", type=int, default=8, help="每個入口列出的套件數")
+    parser.add_argument("--baseline", default=None, help="先前的結果 JSON，比較是否退步")
+    parser.add_argument("--threshold", type=float, default=0.2, help="視為退步的匯入時間增加比例")
+    parser.add_argument("--output", default=None, help="結果 JSON 檔案路徑")
+    args = parser.parse_args()
+
+    results = [benchmark_entry_point(module, args.repeat, args.top) for module in args.modules]
+    summary = {"python": sys.version.split()[0], "timestamp": datetime.now().isoformat(), "entry_points": results}
+
+    for result in results:
+        lazy = f"  ⚠️ 啟動時載入: {', '.join(result['lazy_dependencies_loaded'])}" if result["lazy_dependencies_loaded"] else ""
+        print(f"{result['module']:<14} 匯入 {result['import_ms']:7.1f}ms  行程 {result['wall_ms']:7.1f}ms  "
+              f"{result['modules_loaded']} 個模組{lazy}")
+        print("    " + ", ".join(f"{name} {cost:.1f}ms" for name, cost in result["packages_ms"].items()))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        summary["regressions"] = regressions
+        if regressions:
+            print("\n啟動時間退步:")
+            for regression in regressions:
+                print(f"  {regression}")
+            exit_code = 1
+        else:
+            print(f"\n沒有入口的匯入時間增加超過 {args.threshold:.0%}")
+
+    output = args.output or os.path.join(
+        config.BENCHMARK_OUTPUT_DIR, f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已保存: {output}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import re
+from typing import List, Optional
+
+from prompt_lib import decode_move
+
+# chosen_move 欄位的值必須以收尾引號結束才算完整
+CHOSEN_MOVE_PATTERN = re.compile(r'"chosen_move"\s*:\s*"([^"]*)"')
+
+# 保留尾端字元數，避免欄位被切在兩個片段之間時漏掉
+_SCAN_OVERLAP = 64
+
+
+def extract_delta_text(chunk) -> str:
+    """取出串流片段中的文字內容"""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def extract_json_strings(text: str, key: str) -> List[str]:
+    """從可能不完整的 JSON 文字中擷取指定鍵的所有完整字串值"""
+    pattern = re.compile(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % re.escape(key))
+    values = []
+    for match in pattern.finditer(text):
+        try:
+            values.append(json.loads(f'"{match.group(1)}"'))
+        except json.JSONDecodeError:
+            values.append(match.group(1))
+    return values
+
+
+class ChosenMoveDetector:
+    """在串流回應中逐步偵測已完整輸出且合法的 chosen_move"""
+
+    def __init__(self, legal_moves: list, board_state: Optional[str] = None, move_encoding: str = "uci"):
+        """
+        Args:
+            legal_moves: 合法移動（UCI）
+            board_state: 目前局面 (FEN)，以 SAN 編碼時用於將回答轉回 UCI
+            move_encoding: 提示詞的移動編碼，回答與非串流模式一樣以 decode_move 轉換後再檢查
+        """
+        self.legal_moves = set(legal_moves)
+        self.board_state = board_state
+        self.move_encoding = move_encoding
+        self.text = ""
+        self.move: Optional[str] = None
+        self._scan_from = 0
+
+    def feed(self, delta: str) -> bool:
+        """
+        加入新的串流片段
+
+        Returns:
+            bool: 是否已偵測到合法的 chosen_move（self.move 為轉換後的 UCI）
+        """
+        if not delta or self.move is not None:
+            return self.move is not None
+
+        self.text += delta
+        for match in CHOSEN_MOVE_PATTERN.finditer(self.text, self._scan_from):
+            candidate = decode_move(match.group(1).strip(), self.board_state, self.legal_moves, self.move_encoding)
+            if candidate in self.legal_moves:
+                self.move = candidate
+                return True
+            self._scan_from = match.end()
+
+        self._scan_from = max(self._scan_from, len(self.text) - _SCAN_OVERLAP)
+        return False
@@ -87,6 +87,126 @@ def test_chess_core():
         print(f"✗ ChessCore 測試失敗: {e}")
         return False
 
+def test_position_snapshot():
+    """測試每步局面快照的共用與失效"""
+    print("\n測試局面快照...")
+
+    try:
+        from chess_core import ChessCore
+
+        chess = ChessCore()
+        snapshot = chess.get_snapshot()
+        chess.get_legal_moves()
+        chess.get_position_analysis()
+        if chess.get_snapshot() is snapshot and snapshot.status == "Active":
+            print("✓ 同一步內共用局面快照")
+        else:
+            print("✗ 局面快照未被共用")
+            return False
+
+        # 愚者將死：快照在每步後重新計算
+        for move in ["f2f3", "e7e5", "g2g4", "d8h4"]:
+            chess.make_move(move)
+        snapshot = chess.get_snapshot()
+        if (snapshot.status == "Checkmate" and snapshot.is_game_over and snapshot.result == "0-1"
+                and chess.get_game_result() == "Black wins" and snapshot.legal_moves == ()):
+            print("✓ 移動後快照正確更新")
+        else:
+            print(f"✗ 移動後快照錯誤: {snapshot}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 局面快照測試失敗: {e}")
+        return False
+
+def test_material_tracking():
+    """測試增量材料計數（吃子、吃過路兵與升變）"""
+    print("\n測試增量材料計數...")
+
+    try:
+        import random
+        from chess_core import ChessCore
+
+        # 吃過路兵後升變吃子
+        chess = ChessCore(verify_material=True)
+        for move in ["e2e4", "a7a6", "e4e5", "d7d5", "e5d6", "a6a5", "d6c7", "a5a4", "c7b8q"]:
+            if not chess.make_move(move):
+                print(f"✗ 移動失敗: {move}")
+                return False
+        counts = chess.get_piece_counts()
+        if counts["White"]["queen"] == 2 and counts["Black"]["pawn"] == 6 and chess.get_position_analysis()["material_balance"] == 13:
+            print("✓ 吃過路兵與升變計數正確")
+        else:
+            print(f"✗ 材料計數錯誤: {counts}")
+            return False
+
+        # 隨機對局中每步與完整重算結果比對
+        rng = random.Random(0)
+        for _ in range(20):
+            chess = ChessCore(verify_material=True)
+            while not chess.is_game_over() and chess.get_move_count() < 200:
+                chess.make_move(rng.choice(chess.get_legal_moves()))
+        print("✓ 隨機對局材料計數一致")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 增量材料計數測試失敗: {e}")
+        return False
+
+def test_incremental_pgn():
+    """測試增量 PGN 匯出與逐步寫入磁碟"""
+    print("\n測試增量 PGN...")
+
+    try:
+        import tempfile
+        import chess.pgn
+        from chess_core import ChessCore
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            pgn_path = os.path.join(output_dir, "game.pgn")
+            core = ChessCore(pgn_stream_path=pgn_path)
+            for move in ["f2f3", "e7e5", "g2g4"]:
+                core.make_move(move)
+
+            # 對局進行中檔案已包含所有移動
+            with open(pgn_path, encoding="utf-8") as f:
+                partial = chess.pgn.read_game(f)
+            if [move.uci() for move in partial.mainline_moves()] == ["f2f3", "e7e5", "g2g4"]:
+                print("✓ 移動已即時寫入 PGN 檔案")
+            else:
+                print("✗ PGN 檔案未即時更新")
+                return False
+
+            core.make_move("d8h4")
+
+            # 以 chess.pgn 完整重建作為對照
+            game = chess.pgn.Game()
+            game.headers["Event"] = "LLM Chess Battle"
+            game.headers["Date"] = core.game_start_time.strftime("%Y.%m.%d")
+            game.headers["White"] = "LLM White"
+            game.headers["Black"] = "LLM Black"
+            game.headers["Result"] = core.board.result()
+            game.add_line(core.move_history)
+            expected = str(game)
+
+            final_pgn = core.finalize_pgn()
+            with open(pgn_path, encoding="utf-8") as f:
+                saved = f.read()
+            if final_pgn == expected and saved == expected and saved.endswith("0-1"):
+                print("✓ 增量 PGN 與完整重建結果一致")
+            else:
+                print(f"✗ 增量 PGN 錯誤:\n{final_pgn}")
+                return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 增量 PGN 測試失敗: {e}")
+        return False
+
 def test_config():
     """測試配置"""
     print("\n測試配置...")
@@ -151,6 +271,1615 @@ def test_llm_core_init():
         print(f"✗ LLMInferenceCore 測試失敗: {e}")
         return False
 
+def test_async_llm_core():
+    """測試非同步推理核心的共用連線池與並行推理"""
+    print("\n測試非同步推理核心...")
+
+    try:
+        import asyncio
+        import time
+        from types import SimpleNamespace
+        import config
+        from llm_inference import AsyncLLMInferenceCore, close_shared_async_client
+
+        class FakeCompletions:
+            """延遲固定時間後回傳第一個合法移動的假 API"""
+
+            async def create(self, **kwargs):
+                await asyncio.sleep(0.2)
+                content = '{"chosen_move": "e2e4"}'
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        class FakeAsyncCore(AsyncLLMInferenceCore):
+            client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+        async def run():
+            api_key = config.OPENROUTER_API_KEY
+            config.OPENROUTER_API_KEY = api_key or "test-key"
+            try:
+                shared = AsyncLLMInferenceCore().client is AsyncLLMInferenceCore().client
+                await close_shared_async_client()
+            finally:
+                config.OPENROUTER_API_KEY = api_key
+
+            log_thinking = config.LOG_THINKING_PROCESS
+            config.LOG_THINKING_PROCESS = False
+            try:
+                cores = [FakeAsyncCore() for _ in range(5)]
+                start = time.perf_counter()
+                results = await asyncio.gather(*(
+                    core.think_and_move("test-model", "startpos", ["e2e4"], [], "White", "Calm", {})
+                    for core in cores
+                ))
+            finally:
+                config.LOG_THINKING_PROCESS = log_thinking
+            return shared, results, time.perf_counter() - start
+
+        shared, results, elapsed = asyncio.run(run())
+
+        if shared:
+            print("✓ 所有推理核心共用同一個連線池")
+        else:
+            print("✗ 推理核心未共用連線池")
+            return False
+
+        if all(move == "e2e4" for move, _ in results) and elapsed < 0.5:
+            print(f"✓ 並行推理完成 ({elapsed:.2f} 秒)")
+        else:
+            print(f"✗ 並行推理失敗或未並行 ({elapsed:.2f} 秒)")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 非同步推理核心測試失敗: {e}")
+        return False
+
+def test_prompt_layout():
+    """測試精簡提示詞版面與移動編碼"""
+    print("\n測試精簡提示詞版面...")
+
+    try:
+        import asyncio
+        from types import SimpleNamespace
+        import config
+        from chess_core import ChessCore
+        from llm_inference import AsyncLLMInferenceCore
+        from prompt_lib import build_lean_prefix, build_lean_prompt, encode_legal_moves
+
+        chess_core = ChessCore()
+        positions = []
+        for move in ("e2e4", "e7e5", "g1f3"):
+            positions.append((chess_core.get_current_position(), chess_core.get_legal_moves(),
+                              chess_core.get_current_player(), chess_core.get_position_analysis()))
+            chess_core.make_move(move)
+
+        prefix = build_lean_prefix("grouped", True)
+        prompts = [build_lean_prompt(*position, True, "grouped") for position in positions]
+        if all(prompt.startswith(prefix) for prompt in prompts):
+            print("✓ 各局面的提示詞共用相同的靜態前綴")
+        else:
+            print("✗ 靜態前綴不一致")
+            return False
+
+        board_state, legal_moves = positions[0][:2]
+        grouped = encode_legal_moves(board_state, legal_moves, "grouped")
+        san = encode_legal_moves(board_state, legal_moves, "san")
+        if "g1:h3,f3" in grouped and "Nf3" in san and len(grouped) < len(", ".join(legal_moves)):
+            print("✓ 合法移動以精簡格式編碼")
+        else:
+            print(f"✗ 移動編碼錯誤: {grouped} / {san}")
+            return False
+
+        class FakeCompletions:
+            """以 SAN 回答並回報輸入 token 數的假 API"""
+
+            async def create(self, **kwargs):
+                content = '{"chosen_move": "Nf3"}'
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                                       usage=SimpleNamespace(prompt_tokens=123))
+
+        class FakeAsyncCore(AsyncLLMInferenceCore):
+            client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+        settings = (config.PROMPT_LAYOUT, config.PROMPT_MOVE_ENCODING, config.LOG_THINKING_PROCESS)
+        config.PROMPT_LAYOUT, config.PROMPT_MOVE_ENCODING, config.LOG_THINKING_PROCESS = "lean", "san", False
+        try:
+            core = FakeAsyncCore()
+            move, _ = asyncio.run(core.think_and_move(
+                "test-model", board_state, legal_moves, [], "White", "Calm", positions[0][3]
+            ))
+        finally:
+            config.PROMPT_LAYOUT, config.PROMPT_MOVE_ENCODING, config.LOG_THINKING_PROCESS = settings
+
+        thinking_log = core.get_thinking_logs()[-1]
+        if move == "g1f3" and thinking_log["input_tokens"] == 123 and not thinking_log["input_tokens_estimated"]:
+            print("✓ SAN 回答轉回 UCI，並記錄輸入 token 數")
+        else:
+            print(f"✗ SAN 轉換或 token 記錄錯誤: {move}, {thinking_log}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 精簡提示詞版面測試失敗: {e}")
+        return False
+
+def test_batch_inference():
+    """測試多局面批次推理"""
+    print("\n測試批次推理...")
+
+    try:
+        import asyncio
+        import json
+        from types import SimpleNamespace
+        import chess
+        import config
+        from llm_inference import AsyncLLMInferenceCore, BatchPosition
+
+        class FakeCompletions:
+            """批次請求回傳部分錯誤的答案，單一請求回傳 a2a3 的假 API"""
+
+            def __init__(self):
+                self.requests = 0
+
+            async def create(self, **kwargs):
+                self.requests += 1
+                prompt = kwargs["messages"][-1]["content"]
+                if "several independent chess positions" in prompt:
+                    answers = {"p0": {"chosen_move": "e2e4", "reasoning": "center"}, "p1": "d2d4",
+                               "p2": {"chosen_move": "e2e5"}, "p3": {"chosen_move": "g1f3"}}
+                    content = json.dumps({key: value for key, value in answers.items() if f"[{key}]" in prompt})
+                else:
+                    content = '{"chosen_move": "a2a3"}'
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        completions = FakeCompletions()
+
+        class FakeAsyncCore(AsyncLLMInferenceCore):
+            client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+        board = chess.Board()
+        legal_moves = [move.uci() for move in board.legal_moves]
+        positions = [BatchPosition(f"p{i}", board.fen(), legal_moves, "White") for i in range(5)]
+
+        log_thinking = config.LOG_THINKING_PROCESS
+        config.LOG_THINKING_PROCESS = False
+        try:
+            core = FakeAsyncCore()
+            moves = asyncio.run(core.think_batch("test-model", positions, "Calm", batch_size=3))
+        finally:
+            config.LOG_THINKING_PROCESS = log_thinking
+
+        expected = {"p0": "e2e4", "p1": "d2d4", "p2": "a2a3", "p3": "g1f3", "p4": "a2a3"}
+        if moves == expected and completions.requests == 4:
+            print("✓ 批次回應依局面 ID 驗證，失敗的局面改為單一推理")
+        else:
+            print(f"✗ 批次推理結果錯誤: {moves} ({completions.requests} 次請求)")
+            return False
+
+        stats = core.get_batch_stats()
+        if (stats["batches"] == 2 and stats["batch_answered"] == 3 and stats["single_calls"] == 2
+                and stats["positions_per_sec"] > 0):
+            print(f"✓ 批次統計正確 ({stats['positions_per_sec']:.0f} 局面/秒)")
+        else:
+            print(f"✗ 批次統計錯誤: {stats}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 批次推理測試失敗: {e}")
+        return False
+
+def test_benchmark():
+    """測試題庫評測與本機替代後端"""
+    print("\n測試題庫評測...")
+
+    try:
+        import asyncio
+        from benchmark import Benchmark, load_positions, parse_position_line
+        from llm_inference import AsyncLLMInferenceCore
+        from local_backend import create_local_client
+
+        position = parse_position_line("6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 30 bm Rd8#;", 1)
+        if position.best_moves == ("d1d8",) and position.fen.endswith(" 0 30"):
+            print("✓ FEN 與 EPD 題目解析正確")
+        else:
+            print(f"✗ 題目解析錯誤: {position}")
+            return False
+
+        positions = load_positions(["benchmarks/sample.epd"])
+        benchmark = Benchmark(
+            positions, ["local-greedy"], concurrency=4,
+            llm_core_factory=lambda: AsyncLLMInferenceCore(client=create_local_client("greedy", latency=0.05))
+        )
+        summary = asyncio.run(benchmark.run())
+        stats = summary["models"]["local-greedy"]
+
+        if stats["solve_rate"] == 1.0 and len(summary["positions"]) == len(positions):
+            print(f"✓ 本機替代後端解出全部 {len(positions)} 題")
+        else:
+            print(f"✗ 解題率錯誤: {stats['solve_rate']:.1%}")
+            return False
+
+        # 8 題、並行 4、每題 0.05 秒，約需 0.1 秒
+        if stats["elapsed"] < 0.3 and stats["tokens"]["input"] > 0 and not stats["tokens"]["estimated"]:
+            print(f"✓ 並行評測完成 ({stats['positions_per_sec']:.0f} 局面/秒)，已記錄 token 用量")
+        else:
+            print(f"✗ 評測未並行或缺少 token 用量: {stats}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 題庫評測測試失敗: {e}")
+        return False
+
+def test_mock_server():
+    """測試本機模擬 chat-completions 伺服器"""
+    print("\n測試模擬伺服器...")
+
+    try:
+        import json
+        import urllib.error
+        import urllib.request
+        import chess
+        import config
+        from llm_inference import LLMInferenceCore
+        from mock_server import LatencyModel, MockChatServer
+
+        server = MockChatServer(port=0, latency=LatencyModel("lognormal", 0.01, 1.0), seed=1).start()
+        settings = (config.OPENROUTER_API_KEY, config.OPENROUTER_BASE_URL,
+                    config.LLM_STREAMING, config.LOG_THINKING_PROCESS)
+        config.OPENROUTER_API_KEY, config.OPENROUTER_BASE_URL = "mock-key", server.base_url
+        config.LOG_THINKING_PROCESS = False
+        try:
+            # 完整走過真實的 HTTP 客戶端、解析與記錄流程
+            core = LLMInferenceCore()
+            board = chess.Board()
+            legal_moves = [move.uci() for move in board.legal_moves]
+            results = []
+            for streaming, malformed_rate in ((False, 0.0), (True, 0.0), (False, 1.0)):
+                config.LLM_STREAMING = streaming
+                server.malformed_rate = malformed_rate
+                results.append(core.think_and_move("mock", board.fen(), legal_moves, [], "White", "Calm", {})[0])
+
+            # 每分鐘請求數上限
+            server.rpm = 1
+            statuses = []
+            for _ in range(2):
+                request = urllib.request.Request(
+                    server.base_url + "/chat/completions", method="POST",
+                    data=json.dumps({"model": "mock", "messages": [{"role": "user", "content": "hi"}]}).encode(),
+                    headers={"Content-Type": "application/json"}
+                )
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        statuses.append((response.status, None))
+                except urllib.error.HTTPError as e:
+                    statuses.append((e.code, e.headers.get("retry-after")))
+        finally:
+            (config.OPENROUTER_API_KEY, config.OPENROUTER_BASE_URL,
+             config.LLM_STREAMING, config.LOG_THINKING_PROCESS) = settings
+            server.stop()
+
+        # 格式錯誤（截斷）的回應由移動修復從 JSON 片段取回移動
+        if all(result in legal_moves for result in results):
+            print("✓ 一般、串流與格式錯誤的回應皆經由真實推理流程處理")
+        else:
+            print(f"✗ 模擬伺服器回應處理錯誤: {results}")
+            return False
+
+        if statuses[0][0] == 200 and statuses[1][0] == 429 and statuses[1][1]:
+            print("✓ 超過每分鐘請求數時回傳 429 與 retry-after")
+        else:
+            print(f"✗ 速率限制錯誤: {statuses}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 模擬伺服器測試失敗: {e}")
+        return False
+
+def test_request_policy():
+    """測試請求重試與對沖"""
+    print("\n測試請求策略...")
+
+    try:
+        import asyncio
+        import time
+        from request_policy import RequestPolicy
+
+        class ServiceUnavailable(Exception):
+            status_code = 503
+
+        def flaky_request(failures):
+            """前 failures 次回傳 503 的假請求"""
+            calls = []
+
+            async def request():
+                calls.append(1)
+                if len(calls) <= failures:
+                    raise ServiceUnavailable("503")
+                return "ok"
+            return request, calls
+
+        policy = RequestPolicy(max_retries=3, backoff_base=0.01, hedge_enabled=False, seed=1)
+        request, calls = flaky_request(2)
+        result, info = asyncio.run(policy.call_async("m", request))
+        if result == "ok" and info["retries"] == 2 and len(calls) == 3:
+            print("✓ 可重試錯誤以指數退避重試")
+        else:
+            print(f"✗ 重試錯誤: {result}, {info}")
+            return False
+
+        # 額外請求額度用完時不再重試
+        strict = RequestPolicy(max_retries=3, backoff_base=0.01, hedge_enabled=False,
+                               max_extra_ratio=0.0, extra_burst=0)
+        request, calls = flaky_request(1)
+        try:
+            asyncio.run(strict.call_async("m", request))
+            print("✗ 超出額外請求上限仍然重試")
+            return False
+        except ServiceUnavailable:
+            if len(calls) != 1 or strict.get_stats()["extra_denied"] != 1:
+                print("✗ 額外請求上限統計錯誤")
+                return False
+        print("✓ 重試受額外請求上限限制")
+
+        # 第一個請求卡住，對沖請求先回傳
+        hedging = RequestPolicy(hedge_enabled=True, hedge_default_delay=0.05, hedge_min_delay=0.01)
+        started = []
+
+        async def slow_then_fast():
+            started.append(1)
+            await asyncio.sleep(2.0 if len(started) == 1 else 0.01)
+            return len(started)
+
+        start = time.perf_counter()
+        result, info = asyncio.run(hedging.call_async("m", slow_then_fast))
+        elapsed = time.perf_counter() - start
+        if result == 2 and info["hedged"] and elapsed < 0.5 and hedging.get_stats()["hedge_wins"] == 1:
+            print(f"✓ 慢請求由對沖請求取代 ({elapsed:.2f} 秒)")
+        else:
+            print(f"✗ 對沖錯誤: {result}, {info}, {elapsed:.2f} 秒")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 請求策略測試失敗: {e}")
+        return False
+
+def test_rate_limiter():
+    """測試每個模型的速率限制器"""
+    print("\n測試速率限制器...")
+
+    try:
+        import asyncio
+        import time
+        from types import SimpleNamespace
+        from rate_limiter import RateLimiter, get_default_rate_limiter, observe_response, parse_reset_seconds, tag_request
+
+        # 每分鐘 120 次、瞬間額度 5%：前 6 次立即送出，之後每 60/114 秒一次
+        limiter = RateLimiter(rpm=120, tpm=0, burst=0.05, model_limits={})
+        delays = [limiter.reserve("m") for _ in range(8)]
+        if max(delays[:6]) == 0 and 0.5 < delays[6] < 0.56 and 1.03 < delays[7] < 1.1:
+            print("✓ 請求依預約順序排隊，不超過每分鐘上限")
+        else:
+            print(f"✗ 排隊時間錯誤: {delays}")
+            return False
+
+        tokens = RateLimiter(rpm=0, tpm=6000, burst=0.5, model_limits={})
+        first, second = tokens.reserve("m", 3000), tokens.reserve("m", 3000)
+        tokens.settle("m", 3000, 500)
+        third = tokens.reserve("m", 2000)
+        if first == 0 and 59 < second <= 60 and 49 < third <= 50:
+            print("✓ token 上限以預約計算，依實際用量退還")
+        else:
+            print(f"✗ token 限制錯誤: {first}, {second}, {third}")
+            return False
+
+        adaptive = RateLimiter(rpm=0, tpm=0, model_limits={})
+        adaptive.observe_headers("m", {"x-ratelimit-limit-requests": "60"})
+        adaptive.observe_headers("m", {"retry-after": "2"}, 429)
+        other = adaptive.reserve("other")
+        paused = adaptive.reserve("m")
+        stats = adaptive.get_stats()["m"]
+        if other == 0 and 1.9 < paused <= 2.0 and stats["rpm"] == 60 and stats["server_throttled"] == 1:
+            print("✓ 依伺服器標頭暫停該模型並調低上限")
+        else:
+            print(f"✗ 標頭調整錯誤: {other}, {paused}, {stats}")
+            return False
+
+        now = time.time()
+        resets = [parse_reset_seconds("6m0s"), parse_reset_seconds("250ms"),
+                  round(parse_reset_seconds(str(int((now + 5) * 1000)), now))]
+        if resets == [360.0, 0.25, 5]:
+            print("✓ 重設時間格式解析正確")
+        else:
+            print(f"✗ 重設時間解析錯誤: {resets}")
+            return False
+
+        # 回應掛鉤由請求標記取得模型，不解析請求內容；未標記且內容無法解析時略過
+        throttled = SimpleNamespace(request=SimpleNamespace(content=b"\xff not json"),
+                                    headers={"retry-after": "1"}, status_code=429)
+        observe_response(throttled)
+        with tag_request("tagged-model"):
+            observe_response(throttled)
+        shared = get_default_rate_limiter()
+        if shared is None or shared.get_stats()["tagged-model"]["server_throttled"] == 1:
+            print("✓ 回應掛鉤依請求標記的模型調整")
+        else:
+            print(f"✗ 請求標記錯誤: {shared.get_stats()}")
+            return False
+
+        async def run():
+            fair = RateLimiter(rpm=600, tpm=0, burst=0.01, model_limits={})
+            finished = []
+
+            async def game(index):
+                await fair.acquire_async("m")
+                finished.append(index)
+
+            await asyncio.gather(*(game(index) for index in range(12)))
+            return finished, fair.get_stats()["m"]
+
+        finished, stats = asyncio.run(run())
+        if finished == list(range(12)) and stats["delayed"] == 6 and stats["wait"]["p99"] > 0.5:
+            print(f"✓ 並行對局先到先服務 (等待 p99 {stats['wait']['p99']:.2f}s)")
+        else:
+            print(f"✗ 排隊順序錯誤: {finished}, {stats}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 速率限制器測試失敗: {e}")
+        return False
+
+def test_move_repair():
+    """測試非法移動的本機修復與重新詢問"""
+    print("\n測試移動修復...")
+
+    try:
+        import asyncio
+        from types import SimpleNamespace
+        import chess
+        import config
+        from llm_inference import AsyncLLMInferenceCore
+        from move_repair import MoveRepairStats, normalize_move, repair_move
+
+        board = chess.Board()
+        legal_moves = [move.uci() for move in board.legal_moves]
+        cases = {"Nf3": ("g1f3", "san"), "E2-E4": ("e2e4", "uci"), "Ng1-f3": ("g1f3", "lan"),
+                 "e2e4q": ("e2e4", "promotion"), "Bb5": None}
+        results = {text: normalize_move(text, board) for text in cases}
+        if results == cases:
+            print("✓ SAN、LAN 與 UCI 變體正規化正確")
+        else:
+            print(f"✗ 正規化錯誤: {results}")
+            return False
+
+        scanned = repair_move("", "Analysis... I will play Nf3, although e4 is also good.", board.fen(), legal_moves)
+        ambiguous = repair_move("", "Both e4 and d4 are fine.", board.fen(), legal_moves)
+        if scanned == ("g1f3", "scan") and ambiguous == ("", "failed"):
+            print("✓ 由原始回應找出選擇的移動，無法判斷時不猜測")
+        else:
+            print(f"✗ 掃描原始回應錯誤: {scanned}, {ambiguous}")
+            return False
+
+        class FakeCompletions:
+            """第一次回答無法解析，重新詢問時回答 SAN 的假 API"""
+
+            def __init__(self):
+                self.prompts = []
+
+            async def create(self, **kwargs):
+                self.prompts.append(kwargs["messages"][-1]["content"])
+                content = "Let me think about both d4 and e4." if len(self.prompts) == 1 else '{"chosen_move": "d4"}'
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        completions = FakeCompletions()
+        log_thinking = config.LOG_THINKING_PROCESS
+        config.LOG_THINKING_PROCESS = False
+        try:
+            core = AsyncLLMInferenceCore(client=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+            core.repair_stats = MoveRepairStats()
+            move, _ = asyncio.run(core.think_and_move(
+                "test-model", board.fen(), legal_moves, [], "White", "Calm", {}
+            ))
+        finally:
+            config.LOG_THINKING_PROCESS = log_thinking
+
+        logs = core.get_thinking_logs()
+        if (move == "d2d4" and len(completions.prompts) == 2 and "not a legal move" in completions.prompts[1]
+                and logs[0]["repair"] == "failed" and logs[1]["repair"] == "san" and logs[1]["reprompt"]):
+            print("✓ 本機修復失敗後以簡短提示詞重新詢問一次")
+        else:
+            print(f"✗ 重新詢問錯誤: {move}, {len(completions.prompts)} 次請求")
+            return False
+
+        if core.get_repair_stats() == {"test-model": {"san": 1, "reprompt": 1}}:
+            print("✓ 各模型修復次數依類型統計")
+        else:
+            print(f"✗ 修復統計錯誤: {core.get_repair_stats()}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 移動修復測試失敗: {e}")
+        return False
+
+def test_response_cache():
+    """測試 LLM 回應快取"""
+    print("\n測試回應快取...")
+
+    try:
+        from response_cache import ResponseCache
+
+        cache = ResponseCache(path=":memory:", max_entries=3, samples_per_key=2)
+        key = ResponseCache.make_key("test-model", "startpos", "Calm", 0.0, "prompt")
+
+        if cache.get(key, 0.0) is None:
+            cache.put(key, '{"chosen_move": "e2e4"}')
+        if cache.get(key, 0.0) == '{"chosen_move": "e2e4"}':
+            print("✓ 快取命中正確")
+        else:
+            print("✗ 快取命中錯誤")
+            return False
+
+        # temperature > 0 時需累積足夠樣本才會命中
+        warm_key = ResponseCache.make_key("test-model", "startpos", "Calm", 0.7, "prompt")
+        cache.put(warm_key, '{"chosen_move": "d2d4"}')
+        first = cache.get(warm_key, 0.7)
+        cache.put(warm_key, '{"chosen_move": "c2c4"}')
+        second = cache.get(warm_key, 0.7)
+        if first is None and second in ('{"chosen_move": "d2d4"}', '{"chosen_move": "c2c4"}'):
+            print("✓ 取樣模式正確")
+        else:
+            print("✗ 取樣模式錯誤")
+            return False
+
+        # 超出容量時淘汰最久未使用的項目
+        cache.put(ResponseCache.make_key("test-model", "other", "Calm", 0.0, "prompt"), "{}")
+        stats = cache.get_stats()
+        if stats["entries"] == 3 and cache.get(key, 0.0) is None:
+            print(f"✓ LRU 淘汰正確 (命中率 {stats['hit_rate']:.0%})")
+        else:
+            print("✗ LRU 淘汰錯誤")
+            return False
+
+        cache.close()
+        return True
+
+    except Exception as e:
+        print(f"✗ 回應快取測試失敗: {e}")
+        return False
+
+def test_streaming_early_stop():
+    """測試串流模式在解析出 chosen_move 後提前返回"""
+    print("\n測試串流提前中止...")
+
+    try:
+        import asyncio
+        from types import SimpleNamespace
+        import config
+        import chess
+        from llm_inference import AsyncLLMInferenceCore
+        from stream_parser import ChosenMoveDetector
+
+        pieces = ['{"analysis": "Open", ', '"chosen_move": "e2', 'e4", ', '"reasoning": "Center"}']
+        consumed = []
+
+        class FakeStream:
+            """逐片段輸出的假串流"""
+
+            def __init__(self):
+                self.closed = False
+                self._iterator = self._iterate()
+
+            def __aiter__(self):
+                return self._iterator
+
+            async def _iterate(self):
+                for piece in pieces:
+                    consumed.append(piece)
+                    delta = SimpleNamespace(content=piece)
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+            async def close(self):
+                self.closed = True
+
+        class FakeCompletions:
+            async def create(self, **kwargs):
+                return FakeStream()
+
+        class FakeAsyncCore(AsyncLLMInferenceCore):
+            client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+        async def run():
+            core = FakeAsyncCore()
+            move, _ = await core.think_and_move("test-model", "startpos", ["e2e4", "d2d4"], [],
+                                                "White", "Calm", {})
+            consumed_at_move = len(consumed)
+            await core.wait_for_background_streams()
+            return move, consumed_at_move, core.thinking_logs[0]
+
+        settings = (config.LLM_STREAMING, config.STREAM_FINISH_IN_BACKGROUND, config.LOG_THINKING_PROCESS,
+                    config.TOKEN_PRICES)
+        config.LLM_STREAMING, config.STREAM_FINISH_IN_BACKGROUND, config.LOG_THINKING_PROCESS = True, True, False
+        config.TOKEN_PRICES = {"*": {"input": 1.0, "output": 2.0}}
+        try:
+            move, consumed_at_move, thinking_log = asyncio.run(run())
+        finally:
+            (config.LLM_STREAMING, config.STREAM_FINISH_IN_BACKGROUND, config.LOG_THINKING_PROCESS,
+             config.TOKEN_PRICES) = settings
+
+        if move == "e2e4" and consumed_at_move == 3:
+            print("✓ 解析出合法移動後立即返回")
+        else:
+            print(f"✗ 提前返回失敗: {move} ({consumed_at_move} 個片段)")
+            return False
+
+        if not thinking_log["stream_truncated"] and "Center" in thinking_log["thinking_process"]:
+            print("✓ 背景串流補齊思考記錄")
+        else:
+            print("✗ 背景串流未補齊思考記錄")
+            return False
+
+        if thinking_log["output_tokens_estimated"] and thinking_log.get("cost_usd", 0) > 0:
+            print("✓ 提前中止的思考記錄包含估計用量與費用")
+        else:
+            print(f"✗ 提前中止的思考記錄缺少用量: {thinking_log}")
+            return False
+
+        # SAN 編碼的回答與非串流模式一樣轉回 UCI 後再檢查是否合法
+        board = chess.Board()
+        detector = ChosenMoveDetector([move.uci() for move in board.legal_moves], board.fen(), "san")
+        fed = [detector.feed(piece) for piece in ['{"chosen_move": "Nf', '3", ', '"reasoning": "Develop"}']]
+        if fed == [False, True, True] and detector.move == "g1f3":
+            print("✓ 串流偵測解析 SAN 編碼的移動")
+        else:
+            print(f"✗ SAN 編碼的串流偵測錯誤: {fed}, {detector.move}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 串流測試失敗: {e}")
+        return False
+
+def test_pondering():
+    """測試推測思考命中時直接採用預先計算的移動"""
+    print("\n測試推測思考...")
+
+    try:
+        import asyncio
+        import json
+        import tempfile
+        from types import SimpleNamespace
+        import chess
+        import config
+        from llm_inference import AsyncLLMInferenceCore
+        from ponder import Ponderer
+        from tournament import TournamentGame
+
+        plan = ["a2a3", "h2h3", "b2b3", "g2g3", "c2c3", "f2f3",
+                "a7a6", "h7h6", "b7b6", "g7g6", "c7c6", "f7f6"]
+
+        class FakeCompletions:
+            """依固定計畫走棋，並以計畫中剩餘的移動作為候選的假 API"""
+
+            async def create(self, **kwargs):
+                prompt = kwargs["messages"][1]["content"]
+                legal_moves = prompt.split("**Available legal moves:**")[1].strip().split("\n")[0].split(", ")
+                candidates = [move for move in plan if move in legal_moves] or legal_moves[:1]
+                content = json.dumps({
+                    "candidate_moves": [{"move": move, "evaluation": ""} for move in candidates],
+                    "chosen_move": candidates[0]
+                })
+                await asyncio.sleep(0.01)
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        class FakeAsyncCore(AsyncLLMInferenceCore):
+            client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+        async def play(ponder):
+            with tempfile.TemporaryDirectory() as output_dir:
+                os.makedirs(os.path.join(output_dir, "pgn"))
+                os.makedirs(os.path.join(output_dir, "logs"))
+                game = TournamentGame(0, "white-model", "black-model", "Calm", "Calm", output_dir,
+                                      llm_core_factory=FakeAsyncCore, max_moves=12, ponder=ponder)
+                result = await game.play()
+                return [move.uci() for move in game.chess.move_history], result
+
+        log_thinking = config.LOG_THINKING_PROCESS
+        config.LOG_THINKING_PROCESS = False
+        try:
+            baseline_moves, _ = asyncio.run(play(False))
+            pondered_moves, result = asyncio.run(play(True))
+        finally:
+            config.LOG_THINKING_PROCESS = log_thinking
+
+        stats = result["ponder"]
+        if pondered_moves == baseline_moves and stats["hits"] > 0:
+            print(f"✓ 推測命中 {stats['hits']} 次 (命中率 {stats['hit_rate']:.0%})，棋譜與一般模式一致")
+        else:
+            print(f"✗ 推測思考結果錯誤: {stats}")
+            return False
+
+        if stats["speculative_calls"] <= config.PONDER_BUDGET:
+            print("✓ 推測呼叫未超出預算")
+        else:
+            print("✗ 推測呼叫超出預算")
+            return False
+
+        # SAN 編碼的候選移動在對手當時的局面轉回 UCI 後再預測
+        answered = chess.Board()
+        answered.push_uci("e2e4")
+        opponent_log = {"player": "Black", "board_state": answered.fen(),
+                        "legal_moves": [move.uci() for move in answered.legal_moves],
+                        "raw_response": json.dumps({"candidate_moves": [{"move": "Nf6"}, {"move": "e5"}]})}
+        ponderer = Ponderer(SimpleNamespace(thinking_logs=[opponent_log]), max_replies=2)
+        board = chess.Board()
+        for move in ["e2e4", "c7c5", "g1f3"]:
+            board.push_uci(move)
+        settings = (config.PROMPT_LAYOUT, config.PROMPT_MOVE_ENCODING)
+        config.PROMPT_LAYOUT, config.PROMPT_MOVE_ENCODING = "lean", "san"
+        try:
+            predicted = ponderer.predict_replies(board, ponderer._last_candidates("Black"))
+        finally:
+            config.PROMPT_LAYOUT, config.PROMPT_MOVE_ENCODING = settings
+        if predicted == ["g8f6", "e7e5"]:
+            print("✓ SAN 編碼的候選移動用於預測對手回應")
+        else:
+            print(f"✗ SAN 候選移動預測錯誤: {predicted}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 推測思考測試失敗: {e}")
+        return False
+
+def test_thinking_log_sink():
+    """測試 JSON Lines 思考記錄串流與有界記憶體"""
+    print("\n測試思考記錄串流...")
+
+    try:
+        import json
+        import tempfile
+        import threading
+        from log_sink import ThinkingLogSink
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            sinks = [
+                ThinkingLogSink(os.path.join(output_dir, f"game_{i}.jsonl"),
+                                os.path.join(output_dir, f"game_{i}.txt"), buffer_size=10)
+                for i in range(2)
+            ]
+            buffers = [sink.new_buffer() for sink in sinks]
+
+            def play(index):
+                for ply in range(200):
+                    thinking_log = {
+                        "timestamp": f"ply-{ply}", "model": f"model-{index}", "player": "White",
+                        "thinking_duration": 0.1, "chosen_move": "e2e4", "thinking_process": "..."
+                    }
+                    buffers[index].append(thinking_log)
+                    sinks[index].write(thinking_log)
+
+            threads = [threading.Thread(target=play, args=(i,)) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for sink in sinks:
+                sink.close()
+
+            for i, sink in enumerate(sinks):
+                with open(sink.jsonl_path, encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f]
+                if (len(records) != 200 or any(r["model"] != f"model-{i}" for r in records)
+                        or records[-1]["timestamp"] != "ply-199"):
+                    print(f"✗ 第 {i} 盤 JSON Lines 記錄錯誤")
+                    return False
+            print("✓ 各盤 JSON Lines 記錄完整且互不干擾")
+
+            if all(len(buffer) == 10 for buffer in buffers):
+                print("✓ 記憶體中只保留最近的記錄")
+            else:
+                print("✗ 環狀緩衝區大小錯誤")
+                return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 思考記錄串流測試失敗: {e}")
+        return False
+
+def test_log_archive():
+    """測試思考記錄封存格式"""
+    print("\n測試思考記錄封存...")
+
+    try:
+        import json
+        import tempfile
+        from log_archive import ArchiveReader, ArchiveWriter
+        from chess_core import ChessCore
+
+        # 建立一盤包含非法移動與額外欄位的思考記錄
+        chess_core = ChessCore()
+        records = []
+        for ply in range(40):
+            legal_moves = chess_core.get_legal_moves()
+            chosen_move = "e1e8" if ply == 5 else legal_moves[ply % len(legal_moves)]
+            records.append({
+                "timestamp": f"2025-06-01T12:00:{ply:02d}.123456",
+                "model": "model-a" if ply % 2 == 0 else "model-b",
+                "player": chess_core.get_current_player(),
+                "thinking_duration": 1.5 + ply,
+                "board_state": chess_core.get_current_position(),
+                "legal_moves": legal_moves,
+                "thinking_process": f"思考第 {ply} 步",
+                "chosen_move": chosen_move,
+                "raw_response": '{"chosen_move": "%s"}' % chosen_move,
+                "cache_hit": ply % 3 == 0
+            })
+            chess_core.make_move(legal_moves[ply % len(legal_moves)])
+            if chess_core.is_game_over():
+                break
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "logs.clla")
+            with ArchiveWriter(path) as writer:
+                writer.add_game("game_1", records)
+
+            with ArchiveReader(path) as reader:
+                if reader.list_games() != [("game_1", len(records))]:
+                    print("✗ 封存檔索引錯誤")
+                    return False
+                if reader.read_ply("game_1", 20) != records[20] or reader.read_ply("game_1", 5) != records[5]:
+                    print("✗ 隨機讀取結果與原始記錄不一致")
+                    return False
+                print("✓ 可依對局與步數隨機讀取")
+
+                if list(reader.iter_game("game_1")) == records:
+                    print("✓ 封存後可完整還原思考記錄")
+                else:
+                    print("✗ 還原的思考記錄不一致")
+                    return False
+
+            if os.path.getsize(path) < len(json.dumps(records, ensure_ascii=False).encode("utf-8")):
+                print("✓ 封存檔小於原始 JSON")
+            else:
+                print("✗ 封存檔未縮小")
+                return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 思考記錄封存測試失敗: {e}")
+        return False
+
+def test_log_analytics():
+    """測試思考記錄分析索引"""
+    print("\n測試思考記錄分析...")
+
+    try:
+        import json
+        import tempfile
+        from log_analytics import LogIndex
+
+        def record(model, duration, chosen_move="e2e4", thinking_process="..."):
+            return {"model": model, "player": "White", "thinking_duration": duration,
+                    "legal_moves": ["e2e4", "d2d4"], "chosen_move": chosen_move,
+                    "thinking_process": thinking_process}
+
+        with tempfile.TemporaryDirectory() as logs_dir:
+            with open(os.path.join(logs_dir, "thinking_logs_1.json"), "w", encoding="utf-8") as f:
+                json.dump([record("m", 1.0), record("m", 2.0, "e7e5"), record("m", 3.0, "", "解析失敗")], f)
+            jsonl_path = os.path.join(logs_dir, "thinking_logs_2.jsonl")
+            with open(jsonl_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(record("m", 4.0, "d2d4", "錯誤回退: timeout")) + "\n")
+
+            index = LogIndex(os.path.join(logs_dir, "index.sqlite3"))
+            first = index.update(logs_dir)
+            second = index.update(logs_dir)
+            if first["plies_added"] == 4 and second["files_read"] == 0:
+                print("✓ 重新執行時略過未變動的檔案")
+            else:
+                print(f"✗ 增量索引錯誤: {first}, {second}")
+                return False
+
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record("m", 5.0)) + "\n")
+            third = index.update(logs_dir)
+            if third["files_read"] != 1 or third["plies_added"] != 1:
+                print(f"✗ JSON Lines 未從上次位置繼續讀取: {third}")
+                return False
+            print("✓ JSON Lines 只讀取新增的記錄")
+
+            entry = index.report()[0]
+            index.close()
+            if (entry["plies"] == 5 and entry["latency"]["p50"] == 3.0
+                    and entry["illegal_move_rate"] == 0.2 and entry["parse_failure_rate"] == 0.2
+                    and entry["fallback_rate"] == 0.2):
+                print("✓ 延遲百分位數與錯誤率正確")
+            else:
+                print(f"✗ 統計結果錯誤: {entry}")
+                return False
+
+            # 繼續對局時截斷到檢查點再寫入不同的記錄，檔案變大但已讀部分已改變
+            with open(jsonl_path, "r+", encoding="utf-8") as f:
+                f.truncate(len(f.readline().encode("utf-8")))
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record("m", 6.0, "d2d4", "Resumed after the checkpoint")) + "\n")
+                f.write(json.dumps(record("m", 7.0, "d2d4", "Resumed after the checkpoint")) + "\n")
+            index = LogIndex(os.path.join(logs_dir, "index.sqlite3"))
+            fourth = index.update(logs_dir)
+            entry = index.report()[0]
+            index.close()
+            if fourth["plies_added"] == 3 and entry["plies"] == 6 and entry["latency"]["max"] == 7.0:
+                print("✓ 截斷後重寫的 JSON Lines 重新建立索引")
+            else:
+                print(f"✗ 截斷後重寫的索引錯誤: {fourth}, {entry}")
+                return False
+
+            # 同名的 .json 與 .jsonl 各自計入，刪除的檔案移出索引
+            with open(os.path.join(logs_dir, "thinking_logs_2.json"), "w", encoding="utf-8") as f:
+                json.dump([record("m", 8.0), record("m", 9.0)], f)
+            index = LogIndex(os.path.join(logs_dir, "index.sqlite3"))
+            index.update(logs_dir)
+            both = index.report()[0]
+            os.remove(os.path.join(logs_dir, "thinking_logs_1.json"))
+            index.update(logs_dir)
+            pruned = index.report()[0]
+            index.close()
+            if both["plies"] == 8 and both["games"] == 3 and pruned["plies"] == 5 and pruned["games"] == 2:
+                print("✓ 同名記錄分開索引，刪除的檔案不再計入")
+            else:
+                print(f"✗ 同名或已刪除檔案的索引錯誤: {both}, {pruned}")
+                return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 思考記錄分析測試失敗: {e}")
+        return False
+
+def test_tournament():
+    """測試錦標賽並行對局"""
+    print("\n測試錦標賽模式...")
+
+    try:
+        import asyncio
+        import tempfile
+        from tournament import Tournament
+
+        class FirstMoveCore:
+            """總是選擇第一個合法移動的假推理核心"""
+
+            def __init__(self):
+                self.thinking_logs = []
+
+            def think_and_move(self, model_name, board_state, legal_moves, move_history,
+                               player_color, personality, position_analysis):
+                return legal_moves[0], ""
+
+            def save_thinking_logs(self, filename):
+                pass
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            tournament = Tournament(num_games=4, concurrency=2, output_dir=output_dir,
+                                    llm_core_factory=FirstMoveCore, max_moves=10)
+            summary = asyncio.run(tournament.run())
+
+            if len(summary["games"]) == 4 and all(g["move_count"] == 10 for g in summary["games"]):
+                print("✓ 錦標賽對局全部完成")
+            else:
+                print("✗ 錦標賽對局數量或步數錯誤")
+                return False
+
+            if os.path.exists(os.path.join(output_dir, "summary.json")):
+                print("✓ 錦標賽摘要已保存")
+            else:
+                print("✗ 錦標賽摘要未保存")
+                return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 錦標賽測試失敗: {e}")
+        return False
+
+def test_game_farm():
+    """測試多行程對局農場"""
+    print("\n測試多行程對局農場...")
+
+    try:
+        import tempfile
+        import config
+        from game_farm import GameFarm
+        from log_analytics import LogIndex
+        from replay import load_replay_games
+
+        log_thinking = config.LOG_THINKING_PROCESS
+        config.LOG_THINKING_PROCESS = False
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                farm = GameFarm(num_games=5, workers=2, concurrency=2, output_dir=output_dir,
+                                max_moves=6, offline_policy="first")
+                summary = farm.run()
+                with open(os.path.join(output_dir, "games.pgn"), encoding="utf-8") as f:
+                    pgn_games = f.read().count("[Event ")
+                with open(os.path.join(output_dir, "combined_thinking_logs.jsonl"), encoding="utf-8") as f:
+                    log_lines = sum(1 for line in f if line.strip())
+                # 分析與重播工具只讀取每盤的思考記錄，不重複計入合併檔
+                index = LogIndex(":memory:")
+                index.update(output_dir)
+                indexed_plies = sum(entry["plies"] for entry in index.report())
+                index.close()
+                replay_games = load_replay_games([output_dir])
+        finally:
+            config.LOG_THINKING_PROCESS = log_thinking
+
+        worker_pids = {stats["pid"] for stats in summary["worker_stats"]}
+        if (summary["completed_games"] == 5 and all(g["move_count"] == 6 for g in summary["games"])
+                and len(worker_pids) == 2 and os.getpid() not in worker_pids):
+            print("✓ 對局分散到 2 個工作行程完成")
+        else:
+            print(f"✗ 對局農場結果錯誤: {summary['completed_games']} 盤, 工作行程 {worker_pids}")
+            return False
+
+        if pgn_games == 5 and log_lines == 30:
+            print("✓ 主行程寫入合併的棋譜與思考記錄")
+        else:
+            print(f"✗ 合併輸出錯誤: {pgn_games} 盤棋譜, {log_lines} 筆思考記錄")
+            return False
+
+        if indexed_plies == 30 and len(replay_games) == 5 and sum(map(len, replay_games.values())) == 30:
+            print("✓ 分析與重播工具每盤只讀取一次")
+        else:
+            print(f"✗ 農場輸出被重複讀取: 索引 {indexed_plies} 步, 重播 {len(replay_games)} 盤")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 對局農場測試失敗: {e}")
+        return False
+
+def test_checkpoint():
+    """測試對局檢查點與繼續對局"""
+    print("\n測試對局檢查點...")
+
+    try:
+        import asyncio
+        import json
+        import random
+        import tempfile
+        from datetime import timedelta
+        import config
+        from checkpoint import (CHECKPOINT_CONFIG_KEYS, GameCheckpointer, apply_checkpoint_config, atomic_write_json,
+                                find_checkpoints, load_checkpoint, restore_chess, restore_rng)
+        from chess_core import ChessCore
+        from llm_inference import LLMInferenceCore
+        from local_backend import create_local_client
+        from log_sink import ThinkingLogSink
+        from main import ChessLLMGame
+        from tournament import Tournament
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "data.json")
+            atomic_write_json(path, {"a": 1})
+            atomic_write_json(path, {"a": 2})
+            with open(path, encoding="utf-8") as f:
+                if json.load(f) == {"a": 2} and os.listdir(output_dir) == ["data.json"]:
+                    print("✓ 原子寫入替換檔案且不留下暫存檔")
+                else:
+                    print("✗ 原子寫入結果錯誤")
+                    return False
+
+            # 保存棋步、亂數狀態與思考記錄位置
+            chess_core = ChessCore()
+            for move in ["e2e4", "e7e5", "g1f3"]:
+                chess_core.make_move(move)
+            log_path = os.path.join(output_dir, "thinking.jsonl")
+            sink = ThinkingLogSink(log_path)
+            sink.write({"move": "e2e4"})
+            checkpointer = GameCheckpointer(os.path.join(output_dir, "game.checkpoint.json"), 0, "white", "black",
+                                            "aggressive", "defensive", os.path.join(output_dir, "game.pgn"), log_path)
+            rng = random.Random(42)
+            checkpointer.save(chess_core, sink, rng=rng)
+            expected = rng.random()
+            sink.write({"move": "e7e5"})
+            sink.flush()
+
+            state = load_checkpoint(checkpointer.path)
+            restored = restore_chess(state)
+            apply_checkpoint_config(state)
+            global_state = random.getstate()
+            restored_rng = random.Random()
+            restore_rng(state, restored_rng)
+            if (restored.get_current_position() == chess_core.get_current_position()
+                    and restored_rng.random() == expected and random.getstate() == global_state
+                    and not state["finished"]):
+                print("✓ 檢查點還原棋局與亂數狀態")
+            else:
+                print("✗ 檢查點還原結果錯誤")
+                return False
+
+            ThinkingLogSink(log_path, truncate_to={log_path: state["thinking_log_offsets"]["jsonl"]})
+            with open(log_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            if lines == [json.dumps({"move": "e2e4"})]:
+                print("✓ 繼續對局時捨棄檢查點之後的思考記錄")
+            else:
+                print(f"✗ 思考記錄截斷錯誤: {lines}")
+                return False
+
+        class FirstMoveCore:
+            """總是選擇第一個合法移動的假推理核心"""
+
+            def __init__(self):
+                self.thinking_logs = []
+
+            def think_and_move(self, model_name, board_state, legal_moves, move_history,
+                               player_color, personality, position_analysis):
+                return legal_moves[0], ""
+
+            def save_thinking_logs(self, filename):
+                pass
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            # 共走 6 步後中斷，再從檢查點繼續
+            moves = {"count": 0}
+
+            def should_stop():
+                moves["count"] += 1
+                return moves["count"] > 6
+
+            tournament = Tournament(num_games=2, concurrency=1, output_dir=output_dir,
+                                    llm_core_factory=FirstMoveCore, max_moves=10, should_stop=should_stop)
+            asyncio.run(tournament.run())
+            unfinished = find_checkpoints(output_dir, unfinished_only=True)
+            if not unfinished:
+                print("✗ 中斷的對局沒有留下未完成的檢查點")
+                return False
+
+            resumed = Tournament.from_directory(output_dir, llm_core_factory=FirstMoveCore)
+            summary = asyncio.run(resumed.run())
+            if (len(summary["games"]) == 2 and all(g["move_count"] == 10 for g in summary["games"])
+                    and not find_checkpoints(output_dir, unfinished_only=True)):
+                print(f"✓ 繼續錦標賽後 {len(unfinished)} 盤未完成的對局已走完")
+            else:
+                print("✗ 繼續錦標賽結果錯誤")
+                return False
+
+        # 檢查點的開始時間與思考記錄檔名不同時，繼續對局仍寫入原本的檔案
+        settings = {"CHECKPOINT_ENABLED": True, "THINKING_LOG_STREAMING": True, "LOG_THINKING_PROCESS": False,
+                    "LLM_STREAMING": False, "RESPONSE_CACHE_ENABLED": False, "MAX_MOVES": 4}
+        saved = {key: getattr(config, key) for key in set(settings) | set(CHECKPOINT_CONFIG_KEYS) | {"CHECKPOINT_DIR"}}
+        for key, value in settings.items():
+            setattr(config, key, value)
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                config.CHECKPOINT_DIR = os.path.join(output_dir, "checkpoints")
+
+                def local_core():
+                    core = LLMInferenceCore(client=create_local_client("first", seed=0, asynchronous=False))
+                    core.request_policy = None
+                    core.rate_limiter = None
+                    return core
+
+                game = ChessLLMGame(llm_core=local_core(), output_dir=os.path.join(output_dir, "games"), headless=True)
+                game.play_turn("White", config.WHITE_MODEL, config.WHITE_PERSONALITY)
+                game.play_turn("Black", config.BLACK_MODEL, config.BLACK_PERSONALITY)
+                game.llm_core.log_sink.close()
+                state = load_checkpoint(game.checkpointer.path)
+                if state["started"] != game.game_start_time.isoformat():
+                    print(f"✗ 檢查點開始時間與對局不同: {state['started']}")
+                    return False
+
+                state["started"] = (game.game_start_time + timedelta(seconds=1)).isoformat()
+                atomic_write_json(game.checkpointer.path, state)
+                resumed = ChessLLMGame(resume_state=load_checkpoint(game.checkpointer.path), llm_core=local_core(),
+                                       output_dir=os.path.join(output_dir, "other"), headless=True)
+                resumed.run_game()
+                with open(state["thinking_log_file"], encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f]
+                logs = [name for root, _, names in os.walk(output_dir) for name in names if name.endswith(".jsonl")]
+                if len(records) == 4 and logs == [os.path.basename(state["thinking_log_file"])]:
+                    print("✓ 繼續對局沿用檢查點記錄的思考記錄檔")
+                else:
+                    print(f"✗ 繼續對局的思考記錄錯誤: {len(records)} 筆, {logs}")
+                    return False
+        finally:
+            for key, value in saved.items():
+                setattr(config, key, value)
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 檢查點測試失敗: {e}")
+        return False
+
+def test_replay():
+    """測試以記錄的回應重播對局"""
+    print("\n測試對局重播...")
+
+    try:
+        import contextlib
+        import io
+        import tempfile
+        import config
+        from llm_inference import LLMInferenceCore
+        from local_backend import create_local_client
+        from main import ChessLLMGame
+        from replay import load_replay_games, replay_game
+
+        settings = {"LLM_STREAMING": False, "CHECKPOINT_ENABLED": False, "MAX_MOVES": 20,
+                    "LOG_THINKING_PROCESS": False, "RESPONSE_CACHE_ENABLED": False}
+        saved = {key: getattr(config, key) for key in settings}
+        for key, value in settings.items():
+            setattr(config, key, value)
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                # 先以本機替代後端錄製一盤對局
+                core = LLMInferenceCore(client=create_local_client("random", seed=7, asynchronous=False))
+                core.request_policy = None
+                core.rate_limiter = None
+                game = ChessLLMGame(llm_core=core, output_dir=os.path.join(output_dir, "recorded"), headless=True)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    game.run_game()
+                recorded_moves = [move.uci() for move in game.chess.move_history]
+
+                games = load_replay_games([os.path.join(output_dir, "recorded")])
+                name, records = next(iter(games.items()))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = replay_game(name, records, os.path.join(output_dir, "replay"))
+                if result["identical"] and result["plies"] == len(recorded_moves) == 20 and result["missing"] == 0:
+                    print(f"✓ 重播結果與原始對局一致 ({result['plies_per_second']:.0f} 半步/秒)")
+                else:
+                    print(f"✗ 重播結果不一致: {result}")
+                    return False
+
+                # 修改一筆記錄的回應，重播應在該半步分歧
+                records[5]["raw_response"] = '{"chosen_move": "' + records[5]["legal_moves"][-1] + '"}'
+                if records[5]["legal_moves"][-1] == records[5]["chosen_move"]:
+                    records[5]["raw_response"] = '{"chosen_move": "' + records[5]["legal_moves"][0] + '"}'
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = replay_game(name, records, os.path.join(output_dir, "diverged"))
+                if not result["identical"] and result["divergence_ply"] == 5:
+                    print("✓ 回應不同時回報分歧的半步")
+                else:
+                    print(f"✗ 分歧偵測錯誤: {result}")
+                    return False
+        finally:
+            for key, value in saved.items():
+                setattr(config, key, value)
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 對局重播測試失敗: {e}")
+        return False
+
+def test_headless():
+    """測試無介面模式與事件顯示器"""
+    print("\n測試無介面模式...")
+
+    try:
+        import contextlib
+        import io
+        import time
+        from demo import ChessLLMDemo
+        from renderer import ProgressRenderer, Renderer
+
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output), ChessLLMDemo(headless=True) as demo:
+            demo.run_demo(max_moves=40)
+        elapsed = time.perf_counter() - start
+        if demo.chess.get_move_count() > 0 and elapsed < 2.0 and not output.getvalue():
+            print(f"✓ 無介面示範 {demo.chess.get_move_count()} 步耗時 {elapsed:.2f}s 且沒有終端輸出")
+        else:
+            print(f"✗ 無介面示範錯誤: {elapsed:.2f}s, 輸出 {len(output.getvalue())} 字元")
+            return False
+
+        class RecordingRenderer(Renderer):
+            """記錄收到的事件"""
+
+            def __init__(self):
+                self.events = []
+                super().__init__()
+
+            def handle(self, event):
+                self.events.append(event)
+
+        recorder = RecordingRenderer()
+        ChessLLMDemo(headless=True, renderer=recorder).run_demo(max_moves=6)
+        recorder.close()
+        kinds = [event.kind for event in recorder.events]
+        if kinds.count("move") == 6 and "end" in kinds and "board" not in kinds and "thinking" not in kinds:
+            print("✓ 非完整顯示的顯示器只收到進度事件")
+        else:
+            print(f"✗ 顯示器事件錯誤: {kinds}")
+            return False
+
+        with contextlib.redirect_stdout(io.StringIO()) as progress_output:
+            progress = ProgressRenderer(interval=60.0)
+            for game in ("0", "1"):
+                for ply in range(3):
+                    progress.emit(game, "move", player="White", move="e2e4", ply=ply)
+                progress.emit(game, "end", result="*", status="Active", move_count=3)
+            progress.close()
+        lines = progress_output.getvalue().strip().splitlines()
+        if progress.games and len(lines) <= 3 and "2/2 完成" in lines[-1] and progress.moves == 6:
+            print("✓ 多盤對局的進度彙整為節流輸出")
+        else:
+            print(f"✗ 彙整進度錯誤: {lines}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 無介面模式測試失敗: {e}")
+        return False
+
+def test_lazy_imports():
+    """測試延遲匯入與啟動時間評測"""
+    print("\n測試延遲匯入...")
+
+    try:
+        import subprocess
+        from startup_benchmark import LAZY_DEPENDENCIES, measure_import, package_costs, parse_importtime
+
+        # 在新的直譯器中檢查，避免受到其他測試已匯入的模組影響
+        code = ("import sys, main, replay, llm_inference; from llm_inference import LLMInferenceCore; "
+                "core = LLMInferenceCore(); "
+                f"print(sorted(name for name in {LAZY_DEPENDENCIES!r} if name in sys.modules)); "
+                "core.client; print('openai' in sys.modules)")
+        completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   env=dict(os.environ, OPENROUTER_API_KEY="test"))
+        lines = completed.stdout.strip().splitlines()
+        if lines == ["[]", "True"]:
+            print("✓ openai、httpx 與 python-dotenv 在第一次使用客戶端時才載入")
+        else:
+            print(f"✗ 延遲匯入錯誤: {lines} {completed.stderr.strip()[-200:]}")
+            return False
+
+        sample = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       100 |        100 |     chess.svg\n"
+                  "import time:       300 |        400 |   chess\n"
+                  "import time:        50 |        450 | chess_core\n")
+        modules = parse_importtime(sample)
+        if [m["depth"] for m in modules] == [2, 1, 0] and package_costs(modules) == {"chess": 400, "chess_core": 50}:
+            print("✓ 解析 -X importtime 輸出並依套件彙整")
+        else:
+            print(f"✗ importtime 解析錯誤: {modules}")
+            return False
+
+        result = measure_import("chess_core")
+        names = {m["name"] for m in result["modules"]}
+        if result["import_us"] > 0 and "chess" in names and "chess_core" in names:
+            print(f"✓ chess_core 匯入時間 {result['import_us'] / 1000:.1f}ms")
+        else:
+            print(f"✗ 匯入時間量測錯誤: {result['import_us']}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 延遲匯入測試失敗: {e}")
+        return False
+
+def test_latency():
+    """測試各階段延遲量測與直方圖匯出"""
+    print("\n測試延遲量測...")
+
+    try:
+        import asyncio
+        import json
+        import tempfile
+        import time
+        import config
+        from latency import LatencyHistograms, PhaseTimer, PrometheusExporter, mark_first_byte
+        from llm_inference import AsyncLLMInferenceCore, LLMInferenceCore
+        from local_backend import create_local_client
+        from main import ChessLLMGame
+
+        timer = PhaseTimer()
+        with timer.attempt():
+            time.sleep(0.01)
+            mark_first_byte()
+            time.sleep(0.01)
+        if timer.phases["ttfb"] >= 0.01 and timer.phases["generation"] >= 0.01:
+            print("✓ 回應標頭掛鉤將請求拆分為 ttfb 與 generation")
+        else:
+            print(f"✗ 請求拆分錯誤: {timer.phases}")
+            return False
+
+        histograms = LatencyHistograms(bounds=(0.1, 1.0))
+        for seconds in (0.05, 0.5, 5.0):
+            histograms.observe("model-a", "think", seconds)
+        text = histograms.to_prometheus()
+        expected = ['le="0.1"} 1', 'le="1.0"} 2', 'le="+Inf"} 3',
+                    'chess_llm_phase_duration_seconds_count{model="model-a",phase="think"} 3']
+        stats = histograms.get_stats()["model-a"]["think"]
+        if all(line in text for line in expected) and 0.1 <= stats["p50"] <= 1.0 and stats["max"] == 5.0:
+            print("✓ 直方圖輸出累積桶與分位數估計")
+        else:
+            print(f"✗ 直方圖錯誤: {stats}\n{text}")
+            return False
+
+        settings = (config.MAX_MOVES, config.CHECKPOINT_ENABLED, config.GAME_LOG_FILE, config.LATENCY_METRICS_ENABLED)
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                config.MAX_MOVES = 4
+                config.CHECKPOINT_ENABLED = False
+                config.GAME_LOG_FILE = os.path.join(output_dir, "game_log.txt")
+                config.LATENCY_METRICS_ENABLED = True
+                core = LLMInferenceCore(client=create_local_client("first", latency=0.01, seed=0, asynchronous=False))
+                core.response_cache = None
+                game = ChessLLMGame(llm_core=core, output_dir=output_dir, headless=True)
+                game.run_game()
+
+                with open(core.log_sink.jsonl_path, encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f]
+                required = {"prompt", "cache", "queue", "request", "ttfb", "parse"}
+                game_stats = game.latency.get_stats()
+                if (len(records) == 4 and all(required <= set(record["phases"]) for record in records)
+                        and all(record["phases"]["request"] >= 0.01 for record in records)
+                        and all({"turn", "think", "apply", "request"} <= set(game_stats[model])
+                                for model in (config.WHITE_MODEL, config.BLACK_MODEL))):
+                    print("✓ 思考記錄與對局延遲包含各階段耗時")
+                else:
+                    print(f"✗ 階段耗時錯誤: {[record.get('phases') for record in records]}")
+                    return False
+
+                async_core = AsyncLLMInferenceCore(client=create_local_client("first", seed=0))
+                async_core.response_cache = None
+                async_core.log_to_file = False
+                async_core.latency = LatencyHistograms()
+                asyncio.run(async_core.think_and_move(
+                    "model-b", game.chess.get_current_position(), game.chess.get_legal_moves(), [],
+                    game.chess.get_current_player(), "Balanced", game.chess.get_position_analysis()
+                ))
+                if {"prompt", "request", "parse"} <= set(async_core.latency.get_stats().get("model-b", {})):
+                    print("✓ 非同步推理核心記錄各階段耗時")
+                else:
+                    print(f"✗ 非同步階段耗時錯誤: {async_core.latency.get_stats()}")
+                    return False
+
+                path = os.path.join(output_dir, "metrics", "chess_llm.prom")
+                PrometheusExporter(game.latency, path, interval=60.0).start().stop()
+                with open(path, encoding="utf-8") as f:
+                    exported = f.read()
+                if f'model="{config.WHITE_MODEL}",phase="turn"' in exported:
+                    print("✓ 延遲直方圖匯出為 Prometheus 文字檔")
+                else:
+                    print("✗ Prometheus 文字檔內容錯誤")
+                    return False
+
+        finally:
+            config.MAX_MOVES, config.CHECKPOINT_ENABLED, config.GAME_LOG_FILE, config.LATENCY_METRICS_ENABLED = settings
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 延遲量測測試失敗: {e}")
+        return False
+
+def test_usage():
+    """測試 token 用量、費用統計與預算停止"""
+    print("\n測試用量統計...")
+
+    try:
+        import asyncio
+        import contextlib
+        import io
+        import tempfile
+        from types import SimpleNamespace
+        import chess
+        import config
+        from llm_inference import AsyncLLMInferenceCore, LLMInferenceCore
+        from local_backend import create_local_client
+        from tournament import Tournament
+        from usage import UsageTracker, budget_exceeded, combine_usage, get_usage_tracker
+
+        settings = (config.TOKEN_PRICES, config.USAGE_BUDGET_USD, config.USAGE_BUDGET_TOKENS,
+                    config.LOG_THINKING_PROCESS)
+        try:
+            config.TOKEN_PRICES = {"model-a": {"input": 1.0, "output": 2.0}}
+            config.LOG_THINKING_PROCESS = False
+
+            tracker = UsageTracker()
+            tracker.record_call("model-a", "White", 1000, 500, 2.0)
+            tracker.record_call("model-b", "Black", 100, 100, 1.0, estimated=True)
+            stats = tracker.get_stats()
+            combined = combine_usage([stats, stats])
+            if (abs(stats["total"]["cost_usd"] - 0.002) < 1e-12 and stats["models"]["model-b"]["unpriced_calls"] == 1
+                    and stats["colors"]["White"]["tokens_per_second"] == 250.0
+                    and combined["total"]["input_tokens"] == 2200 and combined["total"]["estimated_calls"] == 2):
+                print("✓ 依模型與執行方彙整用量、費用與輸出速度")
+            else:
+                print(f"✗ 用量彙整錯誤: {stats['total']}")
+                return False
+
+            config.USAGE_BUDGET_TOKENS = 1700
+            if budget_exceeded(tracker.totals()) and not budget_exceeded({"cost_usd": 0.0, "total_tokens": 10}):
+                print("✓ 用量達到預算時回報停止原因")
+            else:
+                print("✗ 預算判斷錯誤")
+                return False
+            config.USAGE_BUDGET_TOKENS = 0
+
+            core = LLMInferenceCore(client=create_local_client("first", seed=0, asynchronous=False))
+            core.response_cache = None
+            core.log_to_file = False
+            core.usage = UsageTracker()
+            board = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+            legal_moves = [move.uci() for move in chess.Board(board).legal_moves]
+            core.think_and_move("model-a", board, legal_moves, [], "White", "Balanced", {})
+            row = core.usage.get_stats()["by_model_color"]["model-a"]["White"]
+            thinking_log = core.get_thinking_logs()[-1]
+            if (row["calls"] == 1 and row["input_tokens"] == thinking_log["input_tokens"] and not row["estimated_calls"]
+                    and abs(thinking_log["cost_usd"] - row["cost_usd"]) < 1e-12 and row["cost_usd"] > 0):
+                print(f"✓ 每次呼叫記錄 API 回報的用量 ({row['input_tokens']} + {row['output_tokens']} tokens)")
+            else:
+                print(f"✗ 呼叫用量錯誤: {row}")
+                return False
+
+            def fail(**kwargs):
+                raise ValueError("boom")
+
+            failing = LLMInferenceCore(client=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fail))))
+            failing.response_cache = None
+            failing.request_policy = None
+            failing.log_to_file = False
+            failing.usage = UsageTracker()
+            with contextlib.redirect_stdout(io.StringIO()):
+                failing.think_and_move("model-a", board, legal_moves, [], "Black", "Balanced", {})
+            row = failing.usage.get_stats()["colors"]["Black"]
+            if row["errors"] == 1 and row["fallbacks"] == 1 and row["calls"] == 0:
+                print("✓ 失敗的呼叫與回退移動計入統計")
+            else:
+                print(f"✗ 失敗呼叫統計錯誤: {row}")
+                return False
+
+            # 預算設為目前累計量再多 1 個 token：第一步之後停止
+            config.USAGE_BUDGET_TOKENS = get_usage_tracker().totals()["total_tokens"] + 1
+            with tempfile.TemporaryDirectory() as output_dir:
+                tournament = Tournament(
+                    num_games=3, concurrency=1, output_dir=output_dir, max_moves=10,
+                    llm_core_factory=lambda: AsyncLLMInferenceCore(client=create_local_client("first", seed=0))
+                )
+                with contextlib.redirect_stdout(io.StringIO()):
+                    summary = asyncio.run(tournament.run())
+            moves = [game["move_count"] for game in summary["games"]]
+            if (summary["budget_stop"] and moves == [1, 0, 0] and all(game["interrupted"] for game in summary["games"])
+                    and summary["usage"]["total"]["calls"] == 1):
+                print("✓ 達到用量預算時錦標賽於下一步前停止")
+            else:
+                print(f"✗ 預算停止錯誤: {moves}, {summary['budget_stop']}")
+                return False
+        finally:
+            (config.TOKEN_PRICES, config.USAGE_BUDGET_USD, config.USAGE_BUDGET_TOKENS,
+             config.LOG_THINKING_PROCESS) = settings
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 用量統計測試失敗: {e}")
+        return False
+
 def main():
     """主測試函數"""
     print("開始系統測試...\n")
@@ -159,7 +1888,32 @@ def main():
         test_imports,
         test_config,
         test_chess_core,
-        test_llm_core_init
+        test_position_snapshot,
+        test_material_tracking,
+        test_incremental_pgn,
+        test_llm_core_init,
+        test_async_llm_core,
+        test_prompt_layout,
+        test_batch_inference,
+        test_benchmark,
+        test_mock_server,
+        test_request_policy,
+        test_rate_limiter,
+        test_move_repair,
+        test_response_cache,
+        test_streaming_early_stop,
+        test_pondering,
+        test_thinking_log_sink,
+        test_log_archive,
+        test_log_analytics,
+        test_tournament,
+        test_game_farm,
+        test_checkpoint,
+        test_replay,
+        test_headless,
+        test_lazy_imports,
+        test_latency,
+        test_usage
     ]
     
     passed = 0
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Chess-LLM 錦標賽模式
+在單一事件迴圈上同時進行多盤 LLM 對弈，並將結果彙整成一份摘要
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from colorama import init, Fore, Style
+
+from checkpoint import (CHECKPOINT_SUFFIX, GameCheckpointer, apply_checkpoint_config, atomic_write_json,
+                        find_checkpoints, log_truncation, restore_chess, restore_rng)
+from chess_core import ChessCore
+from latency import LatencyHistograms, format_latency_stats, get_latency_histograms, start_prometheus_export
+from llm_inference import AsyncLLMInferenceCore, LLMInferenceCore, close_shared_async_client
+from log_sink import ThinkingLogSink
+from move_repair import get_repair_stats
+from rate_limiter import get_default_rate_limiter
+from ponder import Ponderer
+from renderer import ProgressRenderer, Renderer
+from response_cache import get_default_response_cache
+from usage import UsageTracker, budget_exceeded, combine_usage, format_usage, get_usage_tracker
+import config
+
+# 初始化 colorama
+init()
+
+
+class TournamentGame:
+    """錦標賽中的單盤對局，每盤擁有獨立的 ChessCore 與推理核心"""
+
+    def __init__(self,
+                 game_id: int,
+                 white_model: str,
+                 black_model: str,
+                 white_personality: str,
+                 black_personality: str,
+                 output_dir: str,
+                 llm_core_factory: Callable[[], LLMInferenceCore] = AsyncLLMInferenceCore,
+                 max_moves: int = config.MAX_MOVES,
+                 ponder: bool = config.PONDER_ENABLED,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 resume_state: Optional[dict] = None,
+                 renderer: Optional[Renderer] = None):
+        self.game_id = game_id
+        self.white_model = white_model
+        self.black_model = black_model
+        self.white_personality = white_personality
+        self.black_personality = black_personality
+        self.output_dir = output_dir
+        self.max_moves = max_moves
+        self.should_stop = should_stop
+        self.renderer = renderer
+        self.interrupted = False
+
+        self.pgn_filename = os.path.join(output_dir, "pgn", f"game_{game_id:04d}.pgn")
+        pgn_stream_path = self.pgn_filename if config.PGN_STREAM_ENABLED else None
+        if resume_state:
+            self.chess = restore_chess(resume_state, pgn_stream_path)
+        else:
+            self.chess = ChessCore(pgn_stream_path=pgn_stream_path)
+        self.llm_core = llm_core_factory()
+        if resume_state:
+            restore_rng(resume_state, getattr(self.llm_core, "rng", None))
+        self.error: Optional[str] = None
+        # 本盤的各階段延遲，同時計入行程內共用的直方圖
+        self.latency = LatencyHistograms(parent=get_latency_histograms())
+        # 本盤的 token 用量與費用，同時計入行程內共用的統計（預算檢查）
+        self.usage = UsageTracker(parent=get_usage_tracker())
+        if isinstance(self.llm_core, LLMInferenceCore):
+            self.llm_core.latency = self.latency
+            self.llm_core.usage = self.usage
+
+        # 每盤使用專屬的 JSON Lines 思考記錄與文字日誌（停用串流時於對局結束後一次寫入）
+        text_log_filename = None
+        self.thinking_filename = os.path.join(output_dir, "logs", f"thinking_logs_{game_id:04d}.jsonl")
+        if config.THINKING_LOG_STREAMING and isinstance(self.llm_core, LLMInferenceCore):
+            if config.LOG_THINKING_PROCESS:
+                text_log_filename = os.path.join(output_dir, "logs", f"game_log_{game_id:04d}.txt")
+            self.llm_core.attach_log_sink(ThinkingLogSink(
+                self.thinking_filename, text_log_filename,
+                truncate_to=log_truncation(resume_state, self.thinking_filename, text_log_filename)
+            ))
+
+        # 每步移動後保存檢查點，中斷後可從最後一步繼續
+        self.checkpointer: Optional[GameCheckpointer] = None
+        if resume_state:
+            self.checkpointer = GameCheckpointer.from_state(resume_state["path"], resume_state)
+        elif config.CHECKPOINT_ENABLED:
+            self.checkpointer = GameCheckpointer(
+                os.path.join(output_dir, "checkpoints", f"game_{game_id:04d}{CHECKPOINT_SUFFIX}"),
+                game_id, white_model, black_model, white_personality, black_personality,
+                self.pgn_filename, self.thinking_filename, text_log_filename
+            )
+
+        # 推測思考僅支援非同步推理核心
+        self.ponderer: Optional[Ponderer] = None
+        if ponder and isinstance(self.llm_core, AsyncLLMInferenceCore):
+            self.ponderer = Ponderer(self.llm_core)
+
+    async def play(self) -> dict:
+        """
+        執行整盤對局
+
+        Returns:
+            dict: 對局結果摘要
+        """
+        start_time = datetime.now()
+        move_count = self.chess.get_move_count()
+
+        try:
+            while not self.chess.is_game_over() and move_count < self.max_moves:
+                # 收到停止要求時於兩步之間中止，已下的棋步保存於棋譜
+                if self.should_stop and self.should_stop():
+                    self.interrupted = True
+                    break
+                model_name = self.white_model if self.chess.get_current_player() == "White" else self.black_model
+                success = await self.play_turn()
+                if not success:
+                    break
+                move_count += 1
+                if self.checkpointer:
+                    with self.latency.time(model_name, "checkpoint"):
+                        await asyncio.to_thread(self.save_checkpoint)
+        finally:
+            if self.ponderer:
+                self.ponderer.cancel_all()
+
+        # 等待背景串流讀完，確保思考記錄完整
+        if hasattr(self.llm_core, "wait_for_background_streams"):
+            if asyncio.iscoroutinefunction(self.llm_core.wait_for_background_streams):
+                await self.llm_core.wait_for_background_streams()
+            else:
+                await asyncio.to_thread(self.llm_core.wait_for_background_streams)
+
+        duration = (datetime.now() - start_time).total_seconds()
+        return self._build_result(duration)
+
+    async def play_turn(self) -> bool:
+        """執行一回合，同步推理核心會在執行緒中呼叫以免阻塞事件迴圈"""
+        if self.chess.get_current_player() == "White":
+            player_color, model_name, personality = "White", self.white_model, self.white_personality
+        else:
+            player_color, model_name, personality = "Black", self.black_model, self.black_personality
+
+        with self.latency.time(model_name, "turn"):
+            return await self._play_turn(player_color, model_name, personality)
+
+    async def _play_turn(self, player_color: str, model_name: str, personality: str) -> bool:
+        """思考並執行移動，分別記錄思考與執行移動的耗時"""
+        board_state = self.chess.get_current_position()
+        with self.latency.time(model_name, "think"):
+            pondered = await self.ponderer.take(player_color, board_state) if self.ponderer else None
+
+            if pondered:
+                move, _ = pondered
+            else:
+                request = dict(
+                    model_name=model_name,
+                    board_state=board_state,
+                    legal_moves=self.chess.get_legal_moves(),
+                    move_history=list(self.chess.move_history),
+                    player_color=player_color,
+                    personality=personality,
+                    position_analysis=self.chess.get_position_analysis()
+                )
+                if asyncio.iscoroutinefunction(self.llm_core.think_and_move):
+                    move, _ = await self.llm_core.think_and_move(**request)
+                else:
+                    move, _ = await asyncio.to_thread(self.llm_core.think_and_move, **request)
+
+        with self.latency.time(model_name, "apply"):
+            applied = bool(move) and self.chess.make_move(move)
+        if applied:
+            if self.renderer:
+                self.renderer.emit(str(self.game_id), "move", player=player_color, move=move,
+                                   ply=self.chess.get_move_count())
+            # 對手思考期間預先計算己方的下一步
+            if self.ponderer and not self.chess.is_game_over():
+                self.ponderer.start(self.chess, player_color, model_name, personality)
+            return True
+
+        self.error = f"{player_color} 無效移動: {move}"
+        if self.renderer:
+            self.renderer.emit(str(self.game_id), "invalid", player=player_color, move=move,
+                               legal_moves=self.chess.get_legal_moves())
+        return False
+
+    def save_checkpoint(self, finished: bool = False, game_result: Optional[dict] = None):
+        """保存檢查點（思考記錄先寫入磁碟，再記錄其位置）"""
+        if self.checkpointer:
+            self.checkpointer.save(self.chess, getattr(self.llm_core, "log_sink", None), finished, game_result,
+                                   getattr(self.llm_core, "rng", None))
+
+    def _build_result(self, duration: float, finished: Optional[bool] = None) -> dict:
+        """建立結果摘要並保存 PGN 與思考記錄（finished 預設為未被中斷）"""
+        pgn_filename = self.pgn_filename
+        if config.PGN_STREAM_ENABLED:
+            self.chess.finalize_pgn()
+        else:
+            with open(pgn_filename, "w", encoding="utf-8") as f:
+                f.write(self.chess.export_pgn())
+
+        thinking_filename = self.thinking_filename
+        self.llm_core.save_thinking_logs(thinking_filename)
+
+        result = {
+            "game_id": self.game_id,
+            "white_model": self.white_model,
+            "black_model": self.black_model,
+            "result": self.chess.get_snapshot().result,
+            "status": self.chess.get_game_status(),
+            "move_count": self.chess.get_move_count(),
+            "duration": duration,
+            "error": self.error,
+            "interrupted": self.interrupted,
+            "ponder": self.ponderer.get_stats() if self.ponderer else None,
+            "latency": self.latency.get_stats(),
+            "usage": self.usage.get_stats(),
+            "pgn_file": pgn_filename,
+            "thinking_log_file": thinking_filename
+        }
+        # 被中斷或發生錯誤的對局保留為未完成，之後可繼續
+        self.save_checkpoint(finished=not self.interrupted if finished is None else finished, game_result=result)
+        return result
+
+
+class Tournament:
+    """錦標賽執行器，以並行上限控制同時進行的盤數"""
+
+    def __init__(self,
+                 num_games: int = config.TOURNAMENT_GAMES,
+                 concurrency: int = config.TOURNAMENT_CONCURRENCY,
+                 white_model: str = config.WHITE_MODEL,
+                 black_model: str = config.BLACK_MODEL,
+                 alternate_colors: bool = False,
+                 output_dir: Optional[str] = None,
+                 llm_core_factory: Optional[Callable[[], LLMInferenceCore]] = None,
+                 max_moves: int = config.MAX_MOVES,
+                 pool_size: int = config.LLM_POOL_SIZE,
+                 ponder: bool = config.PONDER_ENABLED,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 resume: bool = False,
+                 renderer: Optional[Renderer] = None):
+        self.num_games = num_games
+        self.concurrency = max(1, concurrency)
+        if llm_core_factory is None:
+            llm_core_factory = lambda: AsyncLLMInferenceCore(pool_size=pool_size)
+        self.white_model = white_model
+        self.black_model = black_model
+        self.alternate_colors = alternate_colors
+        self.llm_core_factory = llm_core_factory
+        self.max_moves = max_moves
+        self.ponder = ponder
+        self.should_stop = should_stop
+        self.resume = resume
+        self.renderer = renderer
+        self.budget_stop: Optional[str] = None
+
+        self.start_time = datetime.now()
+        if output_dir is None:
+            output_dir = os.path.join(config.TOURNAMENT_OUTPUT_DIR, self.start_time.strftime("%Y%m%d_%H%M%S"))
+        self.output_dir = output_dir
+        self.results: List[dict] = []
+
+    @classmethod
+    def from_directory(cls, output_dir: str, **kwargs) -> "Tournament":
+        """由輸出目錄中的 tournament.json 建立要繼續的錦標賽"""
+        with open(os.path.join(output_dir, "tournament.json"), encoding="utf-8") as f:
+            metadata = json.load(f)
+        return cls(
+            num_games=metadata["num_games"],
+            white_model=metadata["white_model"],
+            black_model=metadata["black_model"],
+            alternate_colors=metadata["alternate_colors"],
+            output_dir=output_dir,
+            max_moves=metadata["max_moves"],
+            ponder=metadata["ponder"],
+            resume=True,
+            **kwargs
+        )
+
+    def _write_metadata(self):
+        """保存錦標賽參數，供繼續執行時使用"""
+        atomic_write_json(os.path.join(self.output_dir, "tournament.json"), {
+            "num_games": self.num_games,
+            "white_model": self.white_model,
+            "black_model": self.black_model,
+            "alternate_colors": self.alternate_colors,
+            "max_moves": self.max_moves,
+            "ponder": self.ponder,
+            "start_time": self.start_time.isoformat()
+        })
+
+    def _load_checkpoints(self) -> Dict[int, dict]:
+        """讀取已保存的檢查點，並還原最後保存的設定（亂數狀態由各盤對局自行還原）"""
+        states = {state["game_id"]: state for state in find_checkpoints(os.path.join(self.output_dir, "checkpoints"))}
+        unfinished = [state for state in states.values() if not state["finished"]]
+        if unfinished:
+            apply_checkpoint_config(max(unfinished, key=lambda state: state["updated"]))
+        return states
+
+    def _create_game(self, game_id: int, resume_state: Optional[dict] = None) -> TournamentGame:
+        """建立單盤對局，必要時交換黑白方"""
+        white_model, black_model = self.white_model, self.black_model
+        white_personality, black_personality = config.WHITE_PERSONALITY, config.BLACK_PERSONALITY
+        if self.alternate_colors and game_id % 2 == 1:
+            white_model, black_model = black_model, white_model
+            white_personality, black_personality = black_personality, white_personality
+
+        return TournamentGame(
+            game_id=game_id,
+            white_model=white_model,
+            black_model=black_model,
+            white_personality=white_personality,
+            black_personality=black_personality,
+            output_dir=self.output_dir,
+            llm_core_factory=self.llm_core_factory,
+            max_moves=self.max_moves,
+            ponder=self.ponder,
+            should_stop=self._should_stop,
+            resume_state=resume_state,
+            renderer=self.renderer
+        )
+
+    def _should_stop(self) -> bool:
+        """外部停止要求，或已達用量預算（之後的對局不再下棋，檢查點保留為未完成）"""
+        if self.budget_stop is None:
+            self.budget_stop = budget_exceeded()
+            if self.budget_stop:
+                print(f"{Fore.YELLOW}{self.budget_stop}，停止錦標賽（可用 --resume 繼續）{Style.RESET_ALL}")
+        return bool(self.budget_stop) or (self.should_stop is not None and self.should_stop())
+
+    async def _run_game(self, game_id: int, semaphore: asyncio.Semaphore, resume_state: Optional[dict] = None) -> dict:
+        """在並行上限內執行單盤對局（有檢查點時從最後一步繼續）"""
+        async with semaphore:
+            game = self._create_game(game_id, resume_state)
+            try:
+                result = await game.play()
+            except Exception as e:
+                result = game._build_result(0.0, finished=False)
+                result["error"] = f"對局發生錯誤: {e}"
+
+            # 有顯示器時由顯示器彙整，不逐盤輸出
+            if self.renderer:
+                self.renderer.emit(str(game_id), "end", result=result["result"], status=result["status"],
+                                   move_count=result["move_count"])
+            else:
+                print(f"{Fore.GREEN}第 {game_id} 盤結束: {result['white_model']} vs {result['black_model']} "
+                      f"-> {result['result']} ({result['move_count']} 步){Style.RESET_ALL}")
+            return result
+
+    async def run(self) -> dict:
+        """執行所有對局並回傳彙整摘要；繼續執行時沿用已完成的對局，未完成的從檢查點繼續"""
+        os.makedirs(os.path.join(self.output_dir, "pgn"), exist_ok=True)
+        os.makedirs(os.path.join(self.output_dir, "logs"), exist_ok=True)
+        states = self._load_checkpoints() if self.resume else {}
+        if not self.resume:
+            self._write_metadata()
+        finished = [state["game_result"] for state in states.values() if state["finished"] and state["game_result"]]
+        finished_ids = {result["game_id"] for result in finished}
+
+        # 同步推理核心在執行緒中呼叫，執行緒數量與並行上限一致
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        loop.set_default_executor(executor)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            played = await asyncio.gather(*(
+                self._run_game(game_id, semaphore, states.get(game_id))
+                for game_id in range(self.num_games) if game_id not in finished_ids
+            ))
+            self.results = sorted(finished + list(played), key=lambda result: result["game_id"])
+        finally:
+            executor.shutdown(wait=False)
+            await close_shared_async_client()
+
+        summary = self.build_summary()
+        summary_filename = os.path.join(self.output_dir, "summary.json")
+        with open(summary_filename, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+    def build_summary(self) -> dict:
+        """彙整所有對局結果"""
+        standings: Dict[str, dict] = {}
+        for model in (self.white_model, self.black_model):
+            standings.setdefault(model, {"wins": 0, "losses": 0, "draws": 0, "unfinished": 0, "score": 0.0})
+
+        for result in self.results:
+            white, black = standings[result["white_model"]], standings[result["black_model"]]
+            if result["result"] == "1-0":
+                white["wins"] += 1
+                black["losses"] += 1
+                white["score"] += 1.0
+            elif result["result"] == "0-1":
+                black["wins"] += 1
+                white["losses"] += 1
+                black["score"] += 1.0
+            elif result["result"] == "1/2-1/2":
+                white["draws"] += 1
+                black["draws"] += 1
+                white["score"] += 0.5
+                black["score"] += 0.5
+            else:
+                white["unfinished"] += 1
+                black["unfinished"] += 1
+
+        ponder_stats = None
+        if self.ponder:
+            ponder_stats = {"speculative_calls": 0, "hits": 0, "misses": 0, "cancelled": 0}
+            for result in self.results:
+                for key in ponder_stats:
+                    ponder_stats[key] += (result.get("ponder") or {}).get(key, 0)
+            lookups = ponder_stats["hits"] + ponder_stats["misses"]
+            ponder_stats["hit_rate"] = ponder_stats["hits"] / lookups if lookups else 0.0
+
+        total_duration = (datetime.now() - self.start_time).total_seconds()
+        response_cache = get_default_response_cache()
+        rate_limiter = get_default_rate_limiter()
+        return {
+            "start_time": self.start_time.isoformat(),
+            "total_duration": total_duration,
+            "num_games": self.num_games,
+            "concurrency": self.concurrency,
+            "standings": standings,
+            "response_cache": response_cache.get_stats() if response_cache else None,
+            "ponder": ponder_stats,
+            "move_repairs": get_repair_stats().get_stats(),
+            "rate_limit": rate_limiter.get_stats() if rate_limiter else None,
+            "latency": get_latency_histograms().get_stats(),
+            "usage": combine_usage(result.get("usage") for result in self.results),
+            "budget_stop": self.budget_stop,
+            "games": self.results
+        }
+
+
+def print_summary(summary: dict):
+    """印出錦標賽摘要"""
+    print(f"\n{Fore.CYAN}{'='*60}")
+    print(f"                錦標賽結束")
+    print(f"{'='*60}{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}總盤數: {summary['num_games']} (並行 {summary['concurrency']})")
+    print(f"總時長: {summary['total_duration']:.1f} 秒{Style.RESET_ALL}")
+    for model, stats in summary["standings"].items():
+        print(f"  {model}: {stats['wins']} 勝 {stats['losses']} 負 {stats['draws']} 和 "
+              f"{stats['unfinished']} 未完成 (積分 {stats['score']})")
+    if summary.get("response_cache"):
+        cache_stats = summary["response_cache"]
+        print(f"  回應快取: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} "
+              f"(命中率 {cache_stats['hit_rate']:.1%})")
+    if summary.get("ponder"):
+        ponder_stats = summary["ponder"]
+        print(f"  推測思考: 推測 {ponder_stats['speculative_calls']} 次，命中 {ponder_stats['hits']} 次 "
+              f"(命中率 {ponder_stats['hit_rate']:.1%})")
+    for model, limits in (summary.get("rate_limit") or {}).items():
+        print(f"  速率限制 {model}: 排隊 {limits['delayed']}/{limits['requests']} 次請求，"
+              f"等待 p95 {limits['wait']['p95']:.2f}s (最長 {limits['max_wait']:.2f}s)，"
+              f"伺服器限流 {limits['server_throttled']} 次")
+    for model, repairs in (summary.get("move_repairs") or {}).items():
+        print(f"  移動修復 {model}: " + ", ".join(f"{kind} {count}" for kind, count in sorted(repairs.items())))
+    for line in format_latency_stats(summary.get("latency") or {}):
+        print(f"  延遲 p50/p90 {line}")
+    if summary.get("usage"):
+        print(f"  用量: {format_usage(summary['usage']['total'])}")
+        for model, row in summary["usage"]["models"].items():
+            print(f"    {model}: {format_usage(row)}")
+    if summary.get("budget_stop"):
+        print(f"  {Fore.YELLOW}{summary['budget_stop']}，錦標賽提前停止{Style.RESET_ALL}")
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Chess-LLM 錦標賽模式")
+    parser.add_argument("--games", type=int, default=config.TOURNAMENT_GAMES, help="對局總數")
+    parser.add_argument("--concurrency", type=int, default=config.TOURNAMENT_CONCURRENCY, help="同時進行的最大盤數")
+    parser.add_argument("--white", default=config.WHITE_MODEL, help="白棋模型")
+    parser.add_argument("--black", default=config.BLACK_MODEL, help="黑棋模型")
+    parser.add_argument("--alternate-colors", action="store_true", help="每盤交換黑白方")
+    parser.add_argument("--output-dir", default=None, help="輸出目錄")
+    parser.add_argument("--ponder", action="store_true", default=config.PONDER_ENABLED,
+                        help="對手思考時預先計算己方的下一步")
+    parser.add_argument("--pool-size", type=int, default=config.LLM_POOL_SIZE, help="共用 HTTP 連線池大小")
+    parser.add_argument("--progress", action="store_true",
+                        help="以節流的彙整進度取代逐盤輸出（所有對局共用一行進度）")
+    parser.add_argument("--resume", metavar="DIR", default=None,
+                        help="繼續先前中斷的錦標賽（已完成的對局沿用結果，未完成的從檢查點繼續）")
+    parser.add_argument("--budget-usd", type=float, default=config.USAGE_BUDGET_USD,
+                        help="累計費用上限（美元，依 TOKEN_PRICES 或 API 回報的費用），達到後停止（0 表示不限制）")
+    parser.add_argument("--budget-tokens", type=int, default=config.USAGE_BUDGET_TOKENS,
+                        help="累計 token 數上限，達到後停止（0 表示不限制）")
+    args = parser.parse_args()
+    config.USAGE_BUDGET_USD = args.budget_usd
+    config.USAGE_BUDGET_TOKENS = args.budget_tokens
+
+    if not config.OPENROUTER_API_KEY:
+        print(f"{Fore.RED}錯誤: 未設定 OPENROUTER_API_KEY 環境變數{Style.RESET_ALL}")
+        print("請在 .env 檔案中設定你的 OpenRouter API 金鑰")
+        exit(1)
+
+    renderer = ProgressRenderer() if args.progress else None
+    if args.resume:
+        tournament = Tournament.from_directory(args.resume, concurrency=args.concurrency, pool_size=args.pool_size,
+                                               renderer=renderer)
+    else:
+        tournament = Tournament(
+            num_games=args.games,
+            concurrency=args.concurrency,
+            white_model=args.white,
+            black_model=args.black,
+            alternate_colors=args.alternate_colors,
+            output_dir=args.output_dir,
+            pool_size=args.pool_size,
+            ponder=args.ponder,
+            renderer=renderer
+        )
+
+    exporter = start_prometheus_export()
+    try:
+        summary = asyncio.run(tournament.run())
+        if renderer:
+            renderer.close()
+        print_summary(summary)
+        print(f"\n{Fore.GREEN}錦標賽摘要已保存: {os.path.join(tournament.output_dir, 'summary.json')}{Style.RESET_ALL}")
+    except KeyboardInterrupt:
+        print(f"\n{Fore.YELLOW}錦標賽被使用者中斷{Style.RESET_ALL}")
+    finally:
+        if exporter is not None:
+            exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
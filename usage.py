@@ -0,0 +1,172 @@
+"""
+Token 用量與費用統計
+記錄每次 API 呼叫（含重試、對沖與串流）的輸入與輸出 token 數，依模型與執行方彙整，
+以設定的每個模型價格計算費用，並可在累計費用或 token 數達到預算時停止對局
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+import config
+
+# 每個 (模型, 執行方) 累計的計數
+USAGE_FIELDS = ("calls", "errors", "cache_hits", "fallbacks", "input_tokens", "output_tokens",
+                "estimated_calls", "unpriced_calls", "cost_usd", "seconds")
+
+
+def model_price(model: str) -> Optional[Dict[str, float]]:
+    """模型每百萬 token 的美元價格 {"input": ..., "output": ...}（未設定時為 None）"""
+    return config.TOKEN_PRICES.get(model, config.TOKEN_PRICES.get("*"))
+
+
+def call_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """依 TOKEN_PRICES 計算一次呼叫的費用（美元），模型未設定價格時為 None"""
+    price = model_price(model)
+    if price is None:
+        return None
+    return (input_tokens * price.get("input", 0.0) + output_tokens * price.get("output", 0.0)) / 1e6
+
+
+def response_usage(response) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+    """API 回報的 (輸入 token, 輸出 token, 費用)；未回報的項目為 None（OpenRouter 可能回報 usage.cost）"""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    cost = getattr(usage, "cost", None)
+    return (
+        prompt_tokens if isinstance(prompt_tokens, int) else None,
+        completion_tokens if isinstance(completion_tokens, int) else None,
+        float(cost) if isinstance(cost, (int, float)) and not isinstance(cost, bool) else None
+    )
+
+
+def _rollup(counts: Counter) -> dict:
+    """計數加上總 token 數與輸出速度"""
+    row = {field: counts.get(field, 0) for field in USAGE_FIELDS}
+    row["total_tokens"] = row["input_tokens"] + row["output_tokens"]
+    row["tokens_per_second"] = row["output_tokens"] / row["seconds"] if row["seconds"] else 0.0
+    return row
+
+
+class UsageTracker:
+    """
+    依模型與執行方累計的 token 用量與費用
+
+    每盤對局可建立自己的實例並以 parent 指向行程內共用的實例，記錄時同時寫入兩者：
+    對局摘要使用前者，預算檢查使用後者。
+    """
+
+    def __init__(self, parent: Optional["UsageTracker"] = None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str], Counter] = {}
+
+    def _add(self, model: str, color: Optional[str], **values):
+        with self._lock:
+            self._counts.setdefault((model, color or "Unknown"), Counter()).update(values)
+        if self.parent is not None:
+            self.parent._add(model, color, **values)
+
+    def record_call(self,
+                    model: str,
+                    color: Optional[str],
+                    input_tokens: int,
+                    output_tokens: int,
+                    seconds: float,
+                    estimated: bool = False,
+                    cost: Optional[float] = None):
+        """
+        記錄一次完成的 API 呼叫
+
+        Args:
+            estimated: token 數是否為本機估計（API 未回報用量，例如中止的串流）
+            cost: API 回報的費用（美元），未回報時依 TOKEN_PRICES 計算
+        """
+        if cost is None:
+            cost = call_cost(model, input_tokens, output_tokens)
+        unpriced = int(cost is None)
+        self._add(model, color, calls=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                  estimated_calls=int(estimated), unpriced_calls=unpriced, cost_usd=cost or 0.0, seconds=seconds)
+
+    def record_error(self, model: str, color: Optional[str]):
+        """記錄一次失敗的 API 呼叫（沒有回應，不計 token）"""
+        self._add(model, color, errors=1)
+
+    def record_cache_hit(self, model: str, color: Optional[str]):
+        """記錄一次由回應快取回答、不需呼叫 API 的推理"""
+        self._add(model, color, cache_hits=1)
+
+    def record_fallback(self, model: str, color: Optional[str]):
+        """記錄一次推理失敗改用隨機移動"""
+        self._add(model, color, fallbacks=1)
+
+    def merge(self, stats: Optional[dict]):
+        """加入另一份 get_stats() 的結果（例如其他行程或先前執行的對局）"""
+        for model, colors in ((stats or {}).get("by_model_color") or {}).items():
+            for color, row in colors.items():
+                self._add(model, color, **{field: row.get(field, 0) for field in USAGE_FIELDS})
+
+    def totals(self) -> dict:
+        """全部模型與執行方的合計"""
+        with self._lock:
+            return _rollup(sum(self._counts.values(), Counter()))
+
+    def get_stats(self) -> dict:
+        """合計，以及依模型、依執行方、依 (模型, 執行方) 彙整的用量、費用與輸出速度"""
+        with self._lock:
+            by_model: Dict[str, Counter] = {}
+            by_color: Dict[str, Counter] = {}
+            by_model_color: Dict[str, Dict[str, dict]] = {}
+            for (model, color), counts in sorted(self._counts.items()):
+                by_model.setdefault(model, Counter()).update(counts)
+                by_color.setdefault(color, Counter()).update(counts)
+                by_model_color.setdefault(model, {})[color] = _rollup(counts)
+            return {
+                "total": _rollup(sum(self._counts.values(), Counter())),
+                "models": {model: _rollup(counts) for model, counts in by_model.items()},
+                "colors": {color: _rollup(counts) for color, counts in by_color.items()},
+                "by_model_color": by_model_color
+            }
+
+
+def combine_usage(stats_list: Iterable[Optional[dict]]) -> dict:
+    """合併多份 get_stats() 的結果（例如錦標賽中每盤的用量）"""
+    tracker = UsageTracker()
+    for stats in stats_list:
+        tracker.merge(stats)
+    return tracker.get_stats()
+
+
+def budget_exceeded(totals: Optional[dict] = None) -> Optional[str]:
+    """
+    合計是否已達 USAGE_BUDGET_USD 或 USAGE_BUDGET_TOKENS，回傳說明（未達到時為 None）
+
+    totals 預設為行程內共用統計的合計。
+    """
+    if not config.USAGE_BUDGET_USD and not config.USAGE_BUDGET_TOKENS:
+        return None
+    if totals is None:
+        totals = get_usage_tracker().totals()
+    if config.USAGE_BUDGET_USD and totals["cost_usd"] >= config.USAGE_BUDGET_USD:
+        return f"費用 ${totals['cost_usd']:.4f} 已達預算 ${config.USAGE_BUDGET_USD:.4f}"
+    if config.USAGE_BUDGET_TOKENS and totals["total_tokens"] >= config.USAGE_BUDGET_TOKENS:
+        return f"用量 {totals['total_tokens']} tokens 已達預算 {config.USAGE_BUDGET_TOKENS} tokens"
+    return None
+
+
+def format_usage(row: dict) -> str:
+    """單行用量摘要（get_stats() 中的一列）"""
+    return (f"{row['calls']} 次呼叫, 輸入 {row['input_tokens']} / 輸出 {row['output_tokens']} tokens, "
+            f"${row['cost_usd']:.4f}, {row['tokens_per_second']:.1f} tokens/秒"
+            + (f", 估計 {row['estimated_calls']} 次" if row["estimated_calls"] else "")
+            + (f", 失敗 {row['errors']} 次" if row["errors"] else "")
+            + (f", 未設定價格 {row['unpriced_calls']} 次" if row["unpriced_calls"] else ""))
+
+
+_usage_tracker = UsageTracker()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """取得行程內共用的用量統計"""
+    return _usage_tracker